@@ -0,0 +1,286 @@
+import logging
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ADB_HOST = '127.0.0.1'
+ADB_PORT = 5037
+ADB_TIMEOUT = 10
+CONSOLE_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".emulator_console_auth_token")
+# shell v2 packet ids
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+SYNC_CHUNK = 64 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class AdbError(Exception):
+    pass
+
+
+def adb_client():
+    """Shared client for this process, so the device tracker connection is opened once"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AdbClient()
+        return _client
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbError("adb server closed the connection")
+        data += chunk
+    return data
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def _read_string(sock):
+    length = int(_recv_exactly(sock, 4), 16)
+    return _recv_exactly(sock, length).decode(errors="replace")
+
+
+class AdbClient:
+    """Talk to the adb server over its socket instead of starting the adb binary for every command"""
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT, timeout=ADB_TIMEOUT, console_host=ADB_HOST):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.console_host = console_host
+        self._tracker = None
+
+    def _connect(self, start_server=True):
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except ConnectionRefusedError:
+            if not start_server:
+                raise
+            # The only time the adb binary is needed: nothing is listening yet
+            logger.info("adb server not running, starting it")
+            subprocess.run(['adb', '-P', str(self.port), 'start-server'], timeout=30,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    def _request(self, sock, request):
+        data = request.encode()
+        sock.sendall(b"%04x" % len(data) + data)
+        status = _recv_exactly(sock, 4)
+        if status == b"FAIL":
+            raise AdbError(f"{request}: {_read_string(sock)}")
+        if status != b"OKAY":
+            raise AdbError(f"{request}: unexpected reply {status!r}")
+
+    def _host(self, request, reply=True):
+        with self._connect() as sock:
+            self._request(sock, request)
+            return _read_string(sock) if reply else None
+
+    def _transport(self, serial):
+        sock = self._connect()
+        try:
+            self._request(sock, f"host:transport:{serial}")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def version(self):
+        return int(self._host("host:version"), 16)
+
+    def devices(self):
+        """Return {serial: state} for every device the server knows about"""
+        return _parse_devices(self._host("host:devices"))
+
+    def kill_server(self):
+        try:
+            with self._connect(start_server=False) as sock:
+                self._request(sock, "host:kill")
+        except ConnectionRefusedError:
+            pass
+
+    def reconnect_offline(self):
+        """Ask the server to reconnect devices stuck offline, without restarting it"""
+        return self._host("host:reconnect-offline", reply=False)
+
+    def shell(self, serial, command, timeout=None):
+        """Run a shell command and return a CompletedProcess with its output and exit code"""
+        with self._transport(serial) as sock:
+            sock.settimeout(timeout or self.timeout)
+            self._request(sock, f"shell,v2,raw:{command}")
+            stdout, stderr, returncode = [], [], None
+            while True:
+                header = sock.recv(5)
+                if not header:
+                    break
+                if len(header) < 5:
+                    header += _recv_exactly(sock, 5 - len(header))
+                packet_id, length = struct.unpack("<BI", header)
+                payload = _recv_exactly(sock, length)
+                if packet_id == SHELL_STDOUT:
+                    stdout.append(payload)
+                elif packet_id == SHELL_STDERR:
+                    stderr.append(payload)
+                elif packet_id == SHELL_EXIT:
+                    returncode = payload[0]
+                    break
+        return subprocess.CompletedProcess(
+            ['adb', '-s', serial, 'shell', command], returncode,
+            b"".join(stdout).decode(errors="replace"), b"".join(stderr).decode(errors="replace"),
+        )
+
+    def exec_out(self, serial, command, timeout=None):
+        """Run a command and return its raw stdout bytes, e.g. to stream a file off the device"""
+        with self._transport(serial) as sock:
+            sock.settimeout(timeout or self.timeout)
+            self._request(sock, f"exec:{command}")
+            return _recv_all(sock)
+
+    def getprop(self, serial, name):
+        return self.shell(serial, f"getprop {name}").stdout.strip()
+
+    def root(self, serial):
+        """Restart adbd as root; returns what adbd said"""
+        with self._transport(serial) as sock:
+            self._request(sock, "root:")
+            return _recv_all(sock).decode(errors="replace").strip()
+
+    def push(self, serial, local_path, remote_path, mode=0o644):
+        with self._transport(serial) as sock, open(local_path, "rb") as f:
+            sock.settimeout(max(self.timeout, 60))
+            self._request(sock, "sync:")
+            target = f"{remote_path},{mode}".encode()
+            sock.sendall(b"SEND" + struct.pack("<I", len(target)) + target)
+            while True:
+                chunk = f.read(SYNC_CHUNK)
+                if not chunk:
+                    break
+                sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+            status, length = struct.unpack("<4sI", _recv_exactly(sock, 8))
+            if status != b"OKAY":
+                raise AdbError(f"push {remote_path}: {_recv_exactly(sock, length).decode(errors='replace')}")
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+
+    def emu(self, serial, command):
+        """Send a command to an emulator's console (what `adb emu` does) and return its reply"""
+        port = int(serial.rsplit("-", 1)[1])
+        with socket.create_connection((self.console_host, port), timeout=self.timeout) as sock:
+            console = sock.makefile("rwb")
+            _console_reply(console)  # Banner
+            try:
+                with open(CONSOLE_TOKEN_FILE) as f:
+                    token = f.read().strip()
+            except OSError:
+                token = None
+            if token:
+                console.write(f"auth {token}\r\n".encode())
+                console.flush()
+                _console_reply(console)
+            console.write(f"{command}\r\n".encode())
+            console.flush()
+            reply = _console_reply(console)
+            if command != "kill":
+                console.write(b"quit\r\n")
+                console.flush()
+            return reply
+
+    def tracker(self):
+        if self._tracker is None or not self._tracker.alive:
+            self._tracker = DeviceTracker(self)
+        return self._tracker
+
+    def wait_for(self, serial, state="device", timeout=ADB_TIMEOUT):
+        """Block until serial is in state (None for gone); the server pushes changes, so no polling"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            tracker = self.tracker()
+            if tracker.wait_for(serial, state, deadline - time.monotonic()):
+                return True
+            if tracker.alive:
+                return False
+            # The server went away (e.g. restarted), open a new tracker and keep waiting
+            time.sleep(0.1)
+        return False
+
+
+def _console_reply(console):
+    lines = []
+    while True:
+        line = console.readline()
+        if not line:
+            break
+        line = line.decode(errors="replace").rstrip("\r\n")
+        if line.startswith("OK") or line.startswith("KO"):
+            if line.startswith("KO"):
+                raise AdbError(f"Emulator console: {line}")
+            lines.append(line[3:].strip())
+            break
+        lines.append(line)
+    return "\n".join(line for line in lines if line)
+
+
+def _parse_devices(listing):
+    devices = {}
+    for line in listing.splitlines():
+        serial, _, state = line.partition("\t")
+        if serial:
+            devices[serial] = state.strip()
+    return devices
+
+
+class DeviceTracker:
+    """Keep one track-devices connection open and remember the latest device states"""
+
+    def __init__(self, client):
+        self.devices = {}
+        self.alive = True
+        self._changed = threading.Condition()
+        self._sock = client._connect()
+        client._request(self._sock, "host:track-devices")
+        self._sock.settimeout(None)
+        self._update(_read_string(self._sock))
+        threading.Thread(target=self._listen, name="adb-tracker", daemon=True).start()
+
+    def _update(self, listing):
+        with self._changed:
+            self.devices = _parse_devices(listing)
+            self._changed.notify_all()
+
+    def _listen(self):
+        try:
+            while True:
+                self._update(_read_string(self._sock))
+        except (AdbError, OSError):
+            with self._changed:
+                self.alive = False
+                self._changed.notify_all()
+
+    def wait_for(self, serial, state="device", timeout=ADB_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.devices.get(serial) != state:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.alive:
+                    return False
+                self._changed.wait(remaining)
+            return True
@@ -0,0 +1,57 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Named session tunings: capabilities go into the new-session request, settings through the live
+# settings API. Profiles combine with "+", e.g. "skip-install+short-idle".
+SESSION_PROFILES = {
+    "default": {"capabilities": {}, "settings": {}},
+    # Only safe once the UiAutomator2 server is on the device, e.g. booted from the home snapshot
+    "skip-install": {
+        "capabilities": {"appium:skipServerInstallation": True, "appium:skipDeviceInitialization": True},
+        "settings": {},
+    },
+    # The app's animations keep UiAutomator from ever seeing the UI idle, so each call waits this long at most
+    "short-idle": {"capabilities": {}, "settings": {"waitForIdleTimeout": 100}},
+    "no-animations": {"capabilities": {"appium:disableWindowAnimation": True}, "settings": {}},
+    # Layout-only views are left out of page_source, which makes each dump smaller
+    "compact": {"capabilities": {}, "settings": {"ignoreUnimportantViews": True}},
+    # Everything above; check with benchmarks/bench_profiles.py that each part helps on your machine
+    "fast": "skip-install+no-animations+short-idle+compact",
+}
+DEFAULT_SESSION_PROFILE = "default"
+
+
+def get_profile(name):
+    """Look up a profile, merging "a+b" combinations left to right"""
+    profile = {"capabilities": {}, "settings": {}}
+    for part in name.split("+"):
+        if part not in SESSION_PROFILES:
+            raise ValueError(f"Unknown Appium profile {part}, expected one of {', '.join(SESSION_PROFILES)}")
+        named = SESSION_PROFILES[part]
+        if isinstance(named, str):
+            named = get_profile(named)
+        profile["capabilities"].update(named["capabilities"])
+        profile["settings"].update(named["settings"])
+    return profile
+
+
+def apply_capabilities(options, name):
+    """Add the profile's capabilities to UiAutomator2Options before the session is created"""
+    for capability, value in get_profile(name)["capabilities"].items():
+        options.set_capability(capability, value)
+    return options
+
+
+def apply_settings(driver, name):
+    """Push the profile's settings to a live session; a server that rejects them keeps its defaults"""
+    settings = get_profile(name)["settings"]
+    if not settings:
+        return False
+    try:
+        driver.update_settings(settings)
+        logger.info(f"Applied Appium settings {settings}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not apply Appium settings {settings}: {str(e)}")
+        return False
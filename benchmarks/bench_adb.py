@@ -0,0 +1,48 @@
+import argparse
+import shutil
+import statistics
+import subprocess
+import time
+
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the in-process adb client with running the adb binary")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--port", type=int, help="Use a real adb server on this port instead of the fake one")
+    parser.add_argument("--serial", help="Device to use with --port")
+    args = parser.parse_args()
+
+    if args.port:
+        port, serial = args.port, args.serial
+    else:
+        server = FakeAdbServer().start()
+        port, serial = server.port, server.add_emulator()
+    client = AdbClient(port=port)
+    adb_binary = shutil.which("adb")
+
+    def run_adb(*command):
+        subprocess.run([adb_binary, '-P', str(port), '-s', serial, *command], capture_output=True, timeout=30)
+
+    cases = [
+        ("devices", client.devices, lambda: run_adb('devices')),
+        ("getprop", lambda: client.getprop(serial, "sys.boot_completed"),
+         lambda: run_adb('shell', 'getprop', 'sys.boot_completed')),
+        ("pm clear", lambda: client.shell(serial, "pm clear com.glofox.app"),
+         lambda: run_adb('shell', 'pm', 'clear', 'com.glofox.app')),
+    ]
+    print(f"{'command':<12} {'client ms':>10} {'adb binary ms':>14}")
+    for name, with_client, with_binary in cases:
+        binary = f"{timed(with_binary, args.repeat):>14.2f}" if adb_binary else f"{'(no adb)':>14}"
+        print(f"{name:<12} {timed(with_client, args.repeat):>10.2f} {binary}")
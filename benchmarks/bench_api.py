@@ -0,0 +1,61 @@
+import argparse
+import glob
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.fake_glofox_api import FakeGlofoxApi
+from glofox_api import GlofoxApiBooker
+from tracing import SPAN_DIR, load_spans
+
+# Spans that make up the booking itself in the app, without emulator and Appium start-up
+UI_STEPS = ["setup_driver", "handle_permission_popup", "search_studio", "log_in", "select_day", "open_slot",
+            "complete_booking"]
+
+
+def time_api_bookings(server, runs, cached_token):
+    token_file = os.path.join(tempfile.mkdtemp(), "api_token.json")
+    durations = []
+    for _ in range(runs):
+        if not cached_token and os.path.exists(token_file):
+            os.remove(token_file)
+        start = time.perf_counter()
+        booker = GlofoxApiBooker(server.email, server.password, base_url=server.url, token_file=token_file)
+        booker.book(booker.find_class("Sat", "Reformer Pilates", "07:00"))
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def ui_booking_durations(paths):
+    """Sum the booking step spans of each recorded app run"""
+    per_run = defaultdict(float)
+    for record in load_spans(paths):
+        if record["span"] in UI_STEPS:
+            per_run[record["run"]] += record["duration"]
+    return [duration for duration in per_run.values() if duration > 0]
+
+
+def summary(name, durations):
+    print(f"{name:<32} {len(durations):>5} {statistics.median(durations):>9.3f} {max(durations):>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare API booking latency with the app flow")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=30, help="Delay the fake API adds to each request")
+    parser.add_argument("--spans", nargs="*", help="Span files with app runs (default: logs/spans_*.jsonl)")
+    args = parser.parse_args()
+
+    server = FakeGlofoxApi(latency=args.latency_ms / 1000).start()
+    print(f"{'path':<32} {'runs':>5} {'median s':>9} {'max s':>9}")
+    summary("api, login every run", time_api_bookings(server, args.runs, cached_token=False))
+    summary("api, cached token", time_api_bookings(server, args.runs, cached_token=True))
+    server.shutdown()
+
+    ui = ui_booking_durations(args.spans or sorted(glob.glob(os.path.join(SPAN_DIR, "spans_*.jsonl"))))
+    if ui:
+        summary("app (recorded runs)", ui)
+    else:
+        print("No recorded app runs; run demo.py first to compare against the app flow")
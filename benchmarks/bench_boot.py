@@ -0,0 +1,55 @@
+import argparse
+import logging
+import os
+import socket
+import sys
+import tempfile
+
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+from emulator import PROFILES, EmulatorManager, boot_time_report
+from supervisor import ProcessSupervisor
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Boot-to-ready time per emulator profile, cold, from the home "
+                                                 "snapshot and reused, against a stand-in emulator binary")
+    parser.add_argument("--scale", type=float, default=0.05, help="Fraction of the scripted boot times to use")
+    parser.add_argument("--profiles", nargs="+", default=sorted(PROFILES), choices=sorted(PROFILES))
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    directory = tempfile.mkdtemp(prefix="bench_boot_")
+    os.makedirs(os.path.join(directory, "Bench_API_35.avd"))
+    adb_server = FakeAdbServer().start()
+    # Inherited by the stand-in binary, which registers with this server and reads this AVD home
+    os.environ.update(ANDROID_ADB_SERVER_PORT=str(adb_server.port), ANDROID_AVD_HOME=directory,
+                      FAKE_EMULATOR_SCALE=str(args.scale))
+    times_file = os.path.join(directory, "boot_times.jsonl")
+    supervisor = ProcessSupervisor(os.path.join(directory, "supervisor.json"), log_dir=directory)
+
+    for profile in args.profiles:
+        manager = EmulatorManager(f"emulator-{free_port()}", profile=profile, snapshot=f"home-{profile}",
+                                  command=[sys.executable, "-m", "benchmarks.fake_emulator"], avd_home=directory,
+                                  adb=AdbClient(port=adb_server.port), boot_times_file=times_file,
+                                  supervisor=supervisor)
+        assert manager.start(snapshot=False, reuse=False) == "cold"
+        manager.save_snapshot()
+        manager.stop()
+        assert manager.start() == "snapshot"
+        assert manager.start() == "reused"
+        manager.stop()
+    adb_server.stop()
+
+    print(f"boot times at {args.scale:g}x the stand-in's scripted durations")
+    print(f"{'profile':<18} {'mode':<9} {'median s':>9}")
+    for profile, mode, _, median, _ in boot_time_report(times_file):
+        print(f"{profile:<18} {mode:<9} {median:>9.2f}")
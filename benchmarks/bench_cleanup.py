@@ -0,0 +1,59 @@
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from readiness import wait_for_appium
+from supervisor import ProcessSupervisor, pid_alive
+
+# The fixed sleeps the old cleanup paid on every run: demo.bat's 5 s after taskkill, stop_appium's 2 s
+OLD_CLEANUP_SLEEPS = 5 + 2
+# Stand-in for a process that takes a moment to shut down, like the emulator saving state
+SLOW_EXIT = ("import signal, sys, time\n"
+             "signal.signal(signal.SIGTERM, lambda *_: (time.sleep({delay}), sys.exit(0)))\n"
+             "time.sleep(3600)\n")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_appium(port):
+    return [sys.executable, "-m", "benchmarks.fake_appium", "--port", str(port)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to clean up after a run with the supervisor, against the "
+                                                 "fixed sleeps of the old taskkill cleanup")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--exit-delay", type=float, default=0.2, help="How long the slow stand-in takes to exit")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    directory = tempfile.mkdtemp(prefix="bench_cleanup_")
+    supervisor = ProcessSupervisor(os.path.join(directory, "supervisor.json"), log_dir=directory)
+    # Someone else's Appium on the same host, which the old cleanup would have killed too
+    bystander_port = free_port()
+    bystander = subprocess.Popen(fake_appium(bystander_port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_appium(bystander_port)
+
+    print(f"{'run':>4} {'stop s':>8} {'old sleeps s':>13}")
+    for run in range(1, args.runs + 1):
+        port = free_port()
+        supervisor.start(f"appium-{port}", fake_appium(port), port=port)
+        supervisor.start("slow-exit", [sys.executable, "-c", SLOW_EXIT.format(delay=args.exit_delay)])
+        wait_for_appium(port)
+        start = time.perf_counter()
+        supervisor.stop_all()
+        print(f"{run:>4} {time.perf_counter() - start:>8.3f} {OLD_CLEANUP_SLEEPS:>13}")
+
+    print(f"bystander Appium still running: {pid_alive(bystander.pid)}")
+    bystander.terminate()
+    bystander.wait()
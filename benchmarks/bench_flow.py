@@ -0,0 +1,108 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+import tracing
+from benchmarks.fake_appium import FakeAppium
+from demo import GlofoxBooker
+from slot_finder import SlotFinder
+
+
+def run_once(server, slot_cache, **job):
+    options = UiAutomator2Options()
+    options.platform_name = 'Android'
+    options.automation_name = 'UiAutomator2'
+    run_id = tracing.new_run()
+    start = time.perf_counter()
+    with tracing.span("bench run"):
+        booker = GlofoxBooker(driver=webdriver.Remote(server.url, options=options), check_wifi=False,
+                              reuse_session=False, **job)
+        # Share one offsets file across runs so the first run is cold and the rest are warm
+        booker.slot_finder = SlotFinder(booker.driver, booker.snapshots, cache_file=slot_cache)
+        ok = booker.run_booking_flow()
+    return run_id, time.perf_counter() - start, ok
+
+
+def step_table(spans, run_ids):
+    """Wall time and Appium calls per step, averaged over runs"""
+    durations = defaultdict(list)
+    rpcs = defaultdict(int)
+    for record in spans:
+        if record["run"] not in run_ids:
+            continue
+        if record["span"].startswith("rpc:"):
+            parent = record["parent"]
+            rpcs["(screenshot thread)" if parent is None else "(outside steps)" if parent == "bench run"
+                 else parent] += 1
+        elif record["span"] != "bench run":
+            durations[record["span"]].append(record["duration"])
+    steps = {}
+    for name in set(durations) | set(rpcs):
+        values = durations.get(name, [])
+        steps[name] = {
+            "calls": len(values) / len(run_ids),
+            "median_s": statistics.median(values) if values else 0.0,
+            "rpcs": rpcs.get(name, 0) / len(run_ids),
+        }
+    return steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the full booking flow against a fake Appium server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay the fake server adds to every call")
+    parser.add_argument("--dump-ms", type=float, default=50, help="Extra delay for page source and XPath")
+    parser.add_argument("--load-ms", type=float, default=300, help="How long each new screen takes to show")
+    parser.add_argument("--day", default="Sat")
+    parser.add_argument("--skip", type=int, default=0)
+    parser.add_argument("--slot", type=int, default=3)
+    parser.add_argument("--class-name", help="Find the slot by name, e.g. 'Yoga Flow'")
+    parser.add_argument("--start-time", help="Start time of the class, e.g. 15:00")
+    parser.add_argument("--json", help="Also write the results here, for comparing runs in CI")
+    parser.add_argument("--verbose", action="store_true", help="Show the booker's own log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        # The screenshot thread shares the driver, so urllib3 warns each time both talk to Appium at once
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="bench_flow_")
+    tracing.SPAN_DIR = work_dir
+    server = FakeAppium(latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                        load_time=args.load_ms / 1000).start()
+
+    results = []
+    for _ in range(args.runs):
+        results.append(run_once(
+            server, os.path.join(work_dir, "slot_offsets.json"), day_of_week=args.day,
+            categories_to_skip=args.skip, slot_number=args.slot, class_name=args.class_name,
+            start_time=args.start_time,
+        ))
+    server.shutdown()
+
+    run_ids = {run_id for run_id, _, _ in results}
+    spans = tracing.load_spans([tracing.span_file()])
+    steps = step_table(spans, run_ids)
+    walls = [wall for _, wall, _ in results]
+    total_rpcs = sum(step["rpcs"] for step in steps.values())
+
+    print(f"{'step':<32} {'calls':>6} {'median s':>9} {'rpcs':>7}")
+    for name, step in sorted(steps.items(), key=lambda item: -item[1]["median_s"] * item[1]["calls"]):
+        print(f"{name:<32} {step['calls']:>6.1f} {step['median_s']:>9.3f} {step['rpcs']:>7.1f}")
+    print(f"\n{sum(ok for _, _, ok in results)}/{len(results)} bookings completed, "
+          f"median {statistics.median(walls):.2f}s wall (first run {walls[0]:.2f}s), "
+          f"{total_rpcs:.0f} Appium calls per run")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": len(results), "completed": sum(ok for _, _, ok in results),
+                       "median_wall_s": statistics.median(walls), "rpcs_per_run": round(total_rpcs, 1),
+                       "steps": steps}, f, indent=2)
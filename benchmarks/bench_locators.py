@@ -0,0 +1,118 @@
+import argparse
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from appium.webdriver.common.appiumby import AppiumBy
+
+from locators import _parse_xpath, compile_locator
+from snapshot import PageSnapshot
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "schedule_hierarchy.xml")
+
+# The XPath locators GlofoxBooker resolves on the schedule screen
+LOCATORS = [
+    (AppiumBy.XPATH, "//android.widget.TextView[@text='Sat']"),
+    (AppiumBy.XPATH, "//android.widget.Button[@content-desc='Tap here to boo']/android.view.View"),
+    (AppiumBy.XPATH, "//*[@scrollable='true']"),
+    (AppiumBy.XPATH, "//android.view.View[@bounds='[100,210][980,770]']"),
+]
+
+
+def _matches(element, class_name, attribute, value):
+    if class_name != "*" and element.attrib.get("class") != class_name:
+        return False
+    return attribute is None or element.attrib.get(attribute) == value
+
+
+def xpath_lookup(root, xpath):
+    """What UiAutomator2 does for XPath: serialise the whole hierarchy, parse it and evaluate"""
+    dump = ET.fromstring(ET.tostring(root))
+    return dump.findall("." + xpath)
+
+
+def uiselector_lookup(root, xpath):
+    """What a UiSelector does: walk the live tree matching attributes, no serialisation"""
+    candidates = [root]
+    for class_name, attribute, value in _parse_xpath(xpath):
+        candidates = [
+            element
+            for parent in candidates
+            for element in parent.iter()
+            if element is not parent and _matches(element, class_name, attribute, value)
+        ]
+        if not candidates:
+            break
+    return candidates[:1]
+
+
+def accessibility_lookup(root, description):
+    """What accessibility id does: stop at the first node with that content-desc"""
+    for element in root.iter():
+        if element.attrib.get("content-desc") == description:
+            return [element]
+    return []
+
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run_offline(repeat):
+    with open(FIXTURE, encoding="utf-8") as f:
+        xml = f.read()
+    root = ET.fromstring(xml)
+    snapshot_parse_ms = time_call(lambda: PageSnapshot(xml), repeat)
+    snapshot = PageSnapshot(xml)
+
+    print(f"Recorded hierarchy: {len(list(root.iter()))} nodes, {len(xml) // 1024} KiB")
+    print(f"Snapshot parse (once per screen): {snapshot_parse_ms:.3f} ms\n")
+    print(f"{'locator':<70} {'xpath ms':>9} {'compiled':>9} {'snapshot':>9}  strategy")
+    for locator in LOCATORS:
+        compiled = compile_locator(locator)
+        xpath_ms = time_call(lambda: xpath_lookup(root, locator[1]), repeat)
+        if not compiled.native:
+            compiled_ms = float("nan")
+        elif compiled.by == AppiumBy.ACCESSIBILITY_ID:
+            compiled_ms = time_call(lambda: accessibility_lookup(root, compiled.value), repeat)
+        else:
+            compiled_ms = time_call(lambda: uiselector_lookup(root, locator[1]), repeat)
+        snapshot_ms = time_call(lambda: snapshot.find(*locator), repeat)
+        strategy = compiled.by if compiled.native else "snapshot only"
+        print(f"{locator[1][:68]:<70} {xpath_ms:>9.3f} {compiled_ms:>9.3f} {snapshot_ms:>9.3f}  {strategy}")
+
+
+def run_live(server, repeat):
+    """Time the real find_elements round trip for each original and compiled locator"""
+    from appium import webdriver
+    from appium.options.android import UiAutomator2Options
+
+    options = UiAutomator2Options()
+    options.no_reset = True
+    driver = webdriver.Remote(server, options=options)
+    try:
+        print(f"{'locator':<70} {'original ms':>11} {'compiled':>10}  strategy")
+        for locator in LOCATORS:
+            compiled = compile_locator(locator)
+            original_ms = time_call(lambda: driver.find_elements(*locator), repeat)
+            compiled_ms = time_call(lambda: driver.find_elements(*compiled.locator), repeat) if compiled.native \
+                else time_call(lambda: PageSnapshot(driver.page_source).find(*locator), repeat)
+            strategy = compiled.by if compiled.native else "page_source + snapshot"
+            print(f"{locator[1][:68]:<70} {original_ms:>11.1f} {compiled_ms:>10.1f}  {strategy}")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare locator lookup latency per strategy")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--server", help="Appium server URL to time real lookups on the current screen")
+    args = parser.parse_args()
+
+    if args.server:
+        run_live(args.server, args.repeat)
+    else:
+        run_offline(args.repeat)
@@ -0,0 +1,63 @@
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import log_setup
+
+
+def time_calls(logger, count):
+    """Caller-side cost of logger.info, which is what a tap waits for"""
+    durations = []
+    for i in range(count):
+        start = time.perf_counter()
+        logger.info(f"Tapped on coordinates {(516, 1003)} ({i})")
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return statistics.median(durations) * 1e6, durations[int(len(durations) * 0.99)] * 1e6, durations[-1] * 1e6
+
+
+def slow_down(handler, delay):
+    """Make every flush take delay seconds, like a busy disk or an antivirus scan on Windows"""
+    flush = handler.flush
+
+    def slow_flush():
+        time.sleep(delay)
+        flush()
+    handler.flush = slow_flush
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the old synchronous file logging with the queued pipeline")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--slow-disk-ms", type=float, default=0, help="Extra time each write to disk takes")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_logging_")
+    logger = logging.getLogger("bench")
+    # Console output would dominate both, so only the files are compared
+    reset_root()
+    logging.basicConfig(level=logging.INFO, format=log_setup.CONSOLE_FORMAT,
+                        handlers=[logging.FileHandler(os.path.join(directory, "sync.txt"))])
+    slow_down(logging.getLogger().handlers[0], args.slow_disk_ms / 1000)
+    sync = time_calls(logger, args.count)
+
+    reset_root()
+    log_setup.setup_logging(directory=directory)
+    log_setup._listener.handlers = log_setup._listener.handlers[:1]
+    slow_down(log_setup._listener.handlers[0], args.slow_disk_ms / 1000)
+    queued = time_calls(logger, args.count)
+    log_setup.stop_logging()
+
+    print(f"{'pipeline':<10} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for name, (p50, p99, worst) in (("sync file", sync), ("queued", queued)):
+        print(f"{name:<10} {p50:>8.1f} {p99:>8.1f} {worst:>8.1f}")
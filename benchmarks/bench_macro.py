@@ -0,0 +1,69 @@
+import argparse
+import logging
+import tempfile
+import time
+
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+import tracing
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+from benchmarks.fake_appium import FakeAppium
+from booking_flow import BookingFlow
+from demo import EMAIL, PASSWORD, Device, GlofoxBooker
+from macro import MacroStore, run_with_macro
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recording a booking with replaying it as a macro")
+    parser.add_argument("--replays", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--dump-ms", type=float, default=50)
+    parser.add_argument("--load-ms", type=float, default=300)
+    parser.add_argument("--day", default="Sat")
+    parser.add_argument("--skip", type=int, default=0)
+    parser.add_argument("--slot", type=int, default=3)
+    parser.add_argument("--class-name")
+    parser.add_argument("--start-time")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    tracing.SPAN_DIR = tempfile.mkdtemp(prefix="bench_macro_")
+    store = MacroStore(tracing.SPAN_DIR)
+    adb_server = FakeAdbServer().start()
+    serial = adb_server.add_emulator()
+    adb = AdbClient(port=adb_server.port)
+
+    runs = []
+    for run in range(args.replays + 2):
+        # A fresh app per run, with adb input going to it like on a real device
+        server = FakeAppium(latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                            load_time=args.load_ms / 1000).start()
+        adb_server.devices[serial].on_input = server.device_input
+        options = UiAutomator2Options()
+        options.platform_name = 'Android'
+        options.automation_name = 'UiAutomator2'
+        booker = GlofoxBooker(driver=webdriver.Remote(server.url, options=options), device=Device(serial),
+                              check_wifi=False, reuse_session=False, day_of_week=args.day,
+                              categories_to_skip=args.skip, slot_number=args.slot, class_name=args.class_name,
+                              start_time=args.start_time)
+        calls = server.calls
+        start = time.perf_counter()
+        if run == 0:
+            BookingFlow(booker).run()
+        else:
+            run_with_macro(booker, secrets={"{EMAIL}": EMAIL, "{PASSWORD}": PASSWORD}, store=store, adb=adb)
+        elapsed = time.perf_counter() - start
+        booked = next(iter(server.sessions.values()))["state"].screen == "booked"
+        runs.append((["flow", "record"][run] if run < 2 else "replay", elapsed, server.calls - calls, booked))
+        booker.end_session()
+        server.shutdown()
+    adb_server.stop()
+
+    print(f"{'run':<8} {'wall s':>7} {'appium':>7} {'booked':>7}")
+    for name, elapsed, calls, booked in runs:
+        print(f"{name:<8} {elapsed:>7.2f} {calls:>7} {str(booked):>7}")
@@ -0,0 +1,46 @@
+import argparse
+import os
+import time
+
+from device_pool import make_devices, run_pool
+
+# Rough shape of a real flow: mostly waiting on the device, with some client-side work per step
+FAKE_STEPS = ["permission", "search", "login", "day", "scroll", "slot", "book", "confirm"]
+
+
+class FakeBooker:
+    """Stands in for GlofoxBooker with a device that answers after a fixed latency"""
+
+    def __init__(self, day_of_week, categories_to_skip, slot_number, device, step_latency=0.05, cpu_work=20000):
+        self.device = device
+        self.step_latency = step_latency
+        self.cpu_work = cpu_work
+
+    def run_booking_flow(self):
+        for _ in FAKE_STEPS:
+            time.sleep(self.step_latency)
+            sum(i * i for i in range(self.cpu_work))
+        return True
+
+
+def bookings_per_minute(device_count, job_count):
+    jobs = [{"day_of_week": "Sat", "categories_to_skip": 0, "slot_number": 1}] * job_count
+    start = time.perf_counter()
+    results = run_pool(jobs, make_devices(device_count), booker_factory=FakeBooker, prepare_devices=False)
+    elapsed = time.perf_counter() - start
+    assert all(result["ok"] for result in results)
+    return len(results) / elapsed * 60, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure device pool throughput against fake devices")
+    parser.add_argument("--jobs", type=int, default=32)
+    parser.add_argument("--max-devices", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'devices':>8} {'seconds':>8} {'bookings/min':>13}")
+    device_count = 1
+    while device_count <= args.max_devices:
+        rate, elapsed = bookings_per_minute(device_count, args.jobs)
+        print(f"{device_count:>8} {elapsed:>8.2f} {rate:>13.1f}")
+        device_count *= 2
@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from environment import Environment
+
+# What each probe costs on the Windows host: netsh and `emulator -list-avds` are new processes
+PROBE_COSTS = {"wifi": 0.35, "avds": 0.8, "devices": 0.001, "appium": 0.03}
+# The checks main() made per attempt before probes were shared: emulator start, Appium, then the
+# booker's two WiFi checks
+ATTEMPT = [("devices",), ("avds",), ("appium",), ("wifi",), ("wifi",)]
+
+
+def fake_probe(name, cost):
+    def probe(*args):
+        time.sleep(cost)
+        return True
+    return probe
+
+
+def run(attempts, cached):
+    env = Environment()
+    env.probes = {name: fake_probe(name, cost) for name, cost in PROBE_COSTS.items()}
+    start = time.perf_counter()
+    if cached:
+        env.prefetch(*{request for request in ATTEMPT})
+    for attempt in range(attempts):
+        for request in ATTEMPT:
+            env.get(*request, fresh=not cached)
+        if cached:
+            env.invalidate("devices", "appium")
+    return time.perf_counter() - start, sum(env.probe_counts.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time spent on environment checks over a run and its retries")
+    parser.add_argument("--attempts", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'checks':<24} {'seconds':>8} {'probes':>7}")
+    for name, cached in (("every call probes", False), ("shared, with TTLs", True)):
+        elapsed, probes = run(args.attempts, cached)
+        print(f"{name:<24} {elapsed:>8.2f} {probes:>7}")
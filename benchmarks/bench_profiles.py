@@ -0,0 +1,104 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from appium import webdriver
+
+import tracing
+from appium_profiles import SESSION_PROFILES, get_profile
+from benchmarks.bench_flow import step_table
+from benchmarks.fake_appium import FakeAppium
+from demo import APP_PACKAGE, GlofoxBooker
+from slot_finder import SlotFinder
+
+SESSION_SPAN = "session create"
+
+
+def run_once(url, profile, slot_cache, clear, **job):
+    run_id = tracing.new_run()
+    start = time.perf_counter()
+    with tracing.span("bench run", profile=profile):
+        booker = GlofoxBooker(connect=False, check_wifi=False, reuse_session=False, appium_profile=profile, **job)
+        if clear:
+            booker.device.shell(f'pm clear {APP_PACKAGE}')
+        with tracing.span(SESSION_SPAN):
+            booker.attach_driver(webdriver.Remote(url, options=booker.driver_options()))
+        booker.slot_finder = SlotFinder(booker.driver, booker.snapshots, cache_file=slot_cache)
+        ok = booker.run_booking_flow()
+    return run_id, time.perf_counter() - start, ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the booking flow under each Appium session profile and "
+                                                 "compare session creation and per-step latency")
+    parser.add_argument("--profiles", nargs="+", default=list(SESSION_PROFILES),
+                        help="Profiles to compare; combine several with +, e.g. skip-install+compact")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per profile")
+    parser.add_argument("--server", help="A real Appium server to compare on instead of the fake one")
+    parser.add_argument("--clear", action="store_true", help="Clear the app's data before each run on --server")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--dump-ms", type=float, default=50)
+    parser.add_argument("--load-ms", type=float, default=300)
+    parser.add_argument("--install-ms", type=float, default=1500, help="Fake server APK checks at session start")
+    parser.add_argument("--init-ms", type=float, default=600, help="Fake device initialization at session start")
+    parser.add_argument("--window-animation-ms", type=float, default=250)
+    parser.add_argument("--idle-animation-ms", type=float, default=1200,
+                        help="How long animated screens keep the fake UI from going idle")
+    parser.add_argument("--day", default="Sat")
+    parser.add_argument("--skip", type=int, default=0)
+    parser.add_argument("--slot", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results here")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        get_profile(profile)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="bench_profiles_")
+    tracing.SPAN_DIR = work_dir
+    job = {"day_of_week": args.day, "categories_to_skip": args.skip, "slot_number": args.slot}
+
+    runs = {}
+    for profile in args.profiles:
+        runs[profile] = []
+        for _ in range(args.runs):
+            server = None
+            if args.server is None:
+                # A fresh fake per run, so every run starts from the permission popup
+                server = FakeAppium(latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                                    load_time=args.load_ms / 1000, install_time=args.install_ms / 1000,
+                                    init_time=args.init_ms / 1000, window_animation=args.window_animation_ms / 1000,
+                                    idle_animation=args.idle_animation_ms / 1000).start()
+            url = args.server or server.url
+            runs[profile].append(run_once(url, profile, os.path.join(work_dir, "slot_offsets.json"),
+                                          args.clear, **job))
+            if server is not None:
+                server.shutdown()
+
+    spans = tracing.load_spans([tracing.span_file()])
+    tables = {profile: step_table(spans, {run_id for run_id, _, _ in results}) for profile, results in runs.items()}
+    steps = sorted({name for table in tables.values() for name, step in table.items() if step["calls"]},
+                   key=lambda name: (name != SESSION_SPAN, -tables[args.profiles[0]].get(name, {}).get("median_s", 0)))
+
+    width = max(10, max(len(profile) for profile in args.profiles) + 1)
+    print(f"median seconds over {args.runs} runs per profile")
+    print(f"{'step':<28}" + "".join(f"{profile:>{width}}" for profile in args.profiles))
+    for name in steps:
+        print(f"{name:<28}" + "".join(f"{tables[profile].get(name, {}).get('median_s', 0):>{width}.3f}"
+                                      for profile in args.profiles))
+    print(f"{'whole run':<28}" + "".join(f"{statistics.median(wall for _, wall, _ in runs[profile]):>{width}.3f}"
+                                         for profile in args.profiles))
+    print(f"{'booked':<28}" + "".join(f"{sum(ok for _, _, ok in runs[profile]):>{width - 2}}/{args.runs}"
+                                      for profile in args.profiles))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({profile: {"median_wall_s": statistics.median(wall for _, wall, _ in runs[profile]),
+                                 "completed": sum(ok for _, _, ok in runs[profile]), "steps": tables[profile]}
+                       for profile in args.profiles}, f, indent=2)
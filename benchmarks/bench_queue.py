@@ -0,0 +1,67 @@
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+import tracing
+from benchmarks.fake_appium import FakeAppium
+from booking_queue import parse_job, run_queue
+from demo import GlofoxBooker
+
+DEFAULT_JOBS = ["Sat:Yoga Flow:15:00", "Sun:0:3", "Mon:Yoga Flow:15:00"]
+
+
+def new_booker(server):
+    options = UiAutomator2Options()
+    options.platform_name = 'Android'
+    options.automation_name = 'UiAutomator2'
+    return GlofoxBooker(driver=webdriver.Remote(server.url, options=options), check_wifi=False,
+                        reuse_session=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare one cold run per booking with a queue in one session")
+    parser.add_argument("jobs", nargs="*", default=DEFAULT_JOBS)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--dump-ms", type=float, default=50)
+    parser.add_argument("--load-ms", type=float, default=300)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    tracing.SPAN_DIR = tempfile.mkdtemp(prefix="bench_queue_")
+    jobs = [parse_job(job) for job in args.jobs]
+
+    def fake_appium():
+        # A fresh server per session, so every cold run starts from the permission popup
+        return FakeAppium(latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                          load_time=args.load_ms / 1000).start()
+
+    cold = []
+    for job in jobs:
+        server = fake_appium()
+        start = time.perf_counter()
+        booker = new_booker(server)
+        booker.set_job(**job)
+        ok = booker.run_booking_flow()
+        cold.append((time.perf_counter() - start, ok))
+        server.shutdown()
+
+    server = fake_appium()
+    start = time.perf_counter()
+    queued = run_queue(new_booker(server), jobs)
+    queue_total = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"{'job':<36} {'cold s':>7} {'queued s':>9}")
+    for job, (wall, _), result in zip(args.jobs, cold, queued):
+        print(f"{job:<36} {wall:>7.2f} {result['elapsed']:>9.2f}")
+    print(f"\ncold: {sum(ok for _, ok in cold)}/{len(jobs)} booked in {sum(wall for wall, _ in cold):.2f}s; "
+          f"queue: {sum(r['ok'] for r in queued)}/{len(jobs)} booked in {queue_total:.2f}s "
+          f"(extra bookings median {statistics.median([r['elapsed'] for r in queued[1:]] or [0]):.2f}s)")
@@ -0,0 +1,54 @@
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+
+import tracing
+from adb_client import AdbClient
+from benchmarks.bench_flow import run_once
+from benchmarks.fake_adb import FakeAdbServer
+from benchmarks.fake_appium import FakeAppium
+from resources import ResourceSampler, format_summary
+from supervisor import ProcessSupervisor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the resource sampler on the booking flow, and its "
+                                                 "per-step summary, against fake Appium and adb servers")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.1, help="Host sample interval, shorter than a real run's "
+                                                                   "so the cost shows")
+    parser.add_argument("--device-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="bench_resources_")
+    tracing.SPAN_DIR = work_dir
+    server = FakeAppium().start()
+    adb_server = FakeAdbServer().start()
+    serial = adb_server.add_emulator()
+    slot_cache = os.path.join(work_dir, "slot_offsets.json")
+
+    walls = {}
+    for sampled in (False, True, False, True):
+        sampler = ResourceSampler(serial, package="com.glofox.app", interval=args.interval,
+                                  device_interval=args.device_interval, adb=AdbClient(port=adb_server.port),
+                                  supervisor=ProcessSupervisor(os.path.join(work_dir, "supervisor.json"), work_dir))
+        if sampled:
+            sampler.start()
+        walls.setdefault(sampled, []).extend(
+            run_once(server, slot_cache, day_of_week="Sat", categories_to_skip=0, slot_number=3)[1]
+            for _ in range(args.runs))
+        if sampled:
+            sampler.stop()
+            summary = sampler.summary(tracing.load_spans([tracing.span_file()]))
+    server.shutdown()
+    adb_server.stop()
+
+    off, on = statistics.median(walls[False]), statistics.median(walls[True])
+    print(f"median run {off:.2f}s without sampling, {on:.2f}s with ({(on - off) * 1000:+.0f} ms)")
+    print(f"{summary['samples']['host']} host and {summary['samples']['device']} device samples "
+          f"in {summary['duration']}s, sampler used {summary['sampler_cpu_s']}s CPU")
+    print("\n".join(format_summary(summary)))
@@ -0,0 +1,81 @@
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+import tracing
+from benchmarks.fake_appium import FakeAppium
+from demo import GlofoxBooker
+from slot_finder import SlotFinder
+from watcher import AvailabilityWatcher
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="How fast the watcher books a freed spot, and what watching costs")
+    parser.add_argument("--watch-s", type=float, default=20, help="How long the class stays full")
+    parser.add_argument("--poll-ms", type=float, default=500)
+    parser.add_argument("--refresh-s", type=float, default=60, help="How often the day is reloaded")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--dump-ms", type=float, default=50)
+    parser.add_argument("--load-ms", type=float, default=300)
+    parser.add_argument("--class-name", default="Yoga Flow")
+    parser.add_argument("--start-time", default="11:00", help="A class that is full in the fixture")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+    tracing.SPAN_DIR = tempfile.mkdtemp(prefix="bench_watch_")
+    server = FakeAppium(latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                        load_time=args.load_ms / 1000).start()
+    options = UiAutomator2Options()
+    options.platform_name = 'Android'
+    options.automation_name = 'UiAutomator2'
+    booker = GlofoxBooker(driver=webdriver.Remote(server.url, options=options), check_wifi=False,
+                          reuse_session=False, day_of_week="Sat", class_name=args.class_name,
+                          start_time=args.start_time)
+    booker.slot_finder = SlotFinder(booker.driver, booker.snapshots,
+                                    cache_file=os.path.join(tracing.SPAN_DIR, "slot_offsets.json"))
+    watcher = AvailabilityWatcher(booker, poll_interval=args.poll_ms / 1000, refresh_interval=args.refresh_s)
+
+    # Time from the spot opening to complete_booking starting
+    marks = {}
+    complete_booking = booker.complete_booking
+
+    def timed_complete_booking():
+        marks["booking"] = time.perf_counter()
+        return complete_booking()
+    booker.complete_booking = timed_complete_booking
+
+    original_go_to_slot = watcher.go_to_slot
+
+    def timed_go_to_slot():
+        original_go_to_slot()
+        marks.setdefault("watching", (time.perf_counter(), time.process_time(), server.calls))
+    watcher.go_to_slot = timed_go_to_slot
+
+    def free_a_spot():
+        while "watching" not in marks:
+            time.sleep(0.05)
+        time.sleep(args.watch_s)
+        marks["open"] = (time.perf_counter(), time.process_time(), server.calls)
+        server.set_badge(args.class_name, args.start_time, "1 spot left")
+    threading.Thread(target=free_a_spot, daemon=True).start()
+
+    booked = watcher.watch(max_duration=args.watch_s + 60)
+    server.shutdown()
+
+    watch_wall = marks["open"][0] - marks["watching"][0]
+    minutes = watch_wall / 60
+    print(f"booked: {booked}")
+    print(f"reaction: {(marks['booking'] - marks['open'][0]) * 1000:.0f} ms from the spot opening to "
+          f"complete_booking")
+    print(f"while watching {watch_wall:.0f}s: {(marks['open'][2] - marks['watching'][2]) / minutes:.0f} "
+          f"Appium calls/min, {(marks['open'][1] - marks['watching'][1]) / watch_wall * 100:.1f}% CPU, "
+          f"{watcher.polls} polls, {watcher.changes} screen changes")
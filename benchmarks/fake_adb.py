@@ -0,0 +1,287 @@
+import argparse
+import shlex
+import socketserver
+import struct
+import threading
+import time
+
+DEFAULT_PROPS = {"sys.boot_completed": "1", "init.svc.bootanim": "stopped"}
+# Trimmed output of a busy emulator, enough for the resource sampler's parsers
+CPUINFO = """Load: 3.42 / 2.87 / 2.51
+CPU usage from 5012ms to 12ms ago (2026-10-18 07:00:01.100 to 2026-10-18 07:00:06.100):
+  31% 2874/com.glofox.app: 24% user + 7% kernel / faults: 1200 minor
+  12% 2201/app_process: 9% user + 3% kernel
+58% TOTAL: 40% user + 15% kernel + 1.2% iowait + 1.8% softirq
+"""
+MEMINFO = """time,1792310000,1792310000
+oom,-1000,native,0
+ram,2014556,612880,1324032
+lostram,77644
+"""
+
+
+class FakeDevice:
+    def __init__(self, serial, props=None):
+        self.serial = serial
+        self.state = "device"
+        self.props = dict(DEFAULT_PROPS, **(props or {}))
+        self.files = {}  # Pushed files, path -> bytes
+        self.console = None
+        self.on_input = None  # Called with the arguments of each `input` command, e.g. ["tap", "500", "650"]
+
+    def run(self, command):
+        """Answer a shell command the way the emulator would; returns (stdout, exit code)"""
+        output = []
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=";")
+        lexer.whitespace_split = True
+        parts = [[]]
+        for token in lexer:
+            if token == ";":
+                parts.append([])
+            else:
+                parts[-1].append(token)
+        for words in parts:
+            if not words:
+                continue
+            if words[0] == "getprop" and len(words) == 2:
+                output.append(self.props.get(words[1], "") + "\n")
+            elif words[0] == "pm" and words[1:2] == ["clear"]:
+                output.append("Success\n")
+            elif words[:2] == ["id", "-u"]:
+                output.append("0\n")
+            elif words[:2] == ["dumpsys", "cpuinfo"]:
+                output.append(CPUINFO)
+            elif words[:2] == ["dumpsys", "meminfo"]:
+                output.append(MEMINFO)
+            elif words[0] == "echo":
+                output.append(" ".join(words[1:]) + "\n")
+            elif words[0] == "input" and self.on_input is not None:
+                self.on_input(words[1:])
+            elif words[0] == "sleep":
+                time.sleep(float(words[1]))
+            elif words[0] == "false":
+                return "".join(output), 1
+        return "".join(output), 0
+
+
+class _ConsoleHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"Android Console: type 'help' for a list of commands\r\nOK\r\n")
+        for line in self.rfile:
+            command = line.decode().strip()
+            if command == "kill":
+                self.wfile.write(b"OK: killing emulator, bye bye\r\n")
+                self.server.adb.remove_device(self.server.serial)
+                return
+            if command == "quit":
+                return
+            self.wfile.write(b"OK\r\n")
+
+
+class _ConsoleServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _string(text):
+    data = text.encode()
+    return b"%04x" % len(data) + data
+
+
+def _listing(devices):
+    return "".join(f"{serial}\t{device.state}\n" for serial, device in devices.items())
+
+
+class _AdbHandler(socketserver.BaseRequestHandler):
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client went away")
+            data += chunk
+        return data
+
+    def _read_request(self):
+        return self._read(int(self._read(4), 16)).decode()
+
+    def _fail(self, message):
+        self.request.sendall(b"FAIL" + _string(message))
+
+    def handle(self):
+        adb = self.server.adb
+        try:
+            request = self._read_request()
+        except ConnectionError:
+            return
+        time.sleep(adb.latency)
+        adb.requests += 1
+
+        if request == "host:version":
+            self.request.sendall(b"OKAY" + _string("0029"))
+        elif request == "host:devices":
+            self.request.sendall(b"OKAY" + _string(_listing(adb.devices)))
+        elif request == "host:reconnect-offline":
+            self.request.sendall(b"OKAY")
+        elif request == "host:kill":
+            self.request.sendall(b"OKAY")
+            threading.Thread(target=adb.stop, daemon=True).start()
+        elif request == "host:track-devices":
+            self._track(adb)
+        elif request.startswith("host:emulator:"):
+            # Sent by a starting emulator; it stays attached for as long as it keeps this connection open
+            serial = adb.attach_emulator(int(request.rsplit(":", 1)[1]))
+            self.request.sendall(b"OKAY")
+            try:
+                while self.request.recv(1024):
+                    pass
+            except OSError:
+                pass
+            adb.remove_device(serial)
+        elif request.startswith("host:transport:"):
+            device = adb.devices.get(request.split(":", 2)[2])
+            if device is None:
+                return self._fail(f"device '{request.split(':', 2)[2]}' not found")
+            self.request.sendall(b"OKAY")
+            self._device_service(device, self._read_request())
+        else:
+            self._fail(f"unknown host service {request}")
+
+    def _track(self, adb):
+        sent = None
+        with adb.changed:
+            while adb.running:
+                listing = _listing(adb.devices)
+                if listing != sent:
+                    try:
+                        self.request.sendall((b"OKAY" if sent is None else b"") + _string(listing))
+                    except OSError:
+                        return
+                    sent = listing
+                adb.changed.wait(0.5)
+
+    def _device_service(self, device, service):
+        if service.startswith("shell,v2,raw:"):
+            stdout, code = device.run(service.split(":", 1)[1])
+            self.request.sendall(b"OKAY")
+            if stdout:
+                self.request.sendall(struct.pack("<BI", 1, len(stdout.encode())) + stdout.encode())
+            self.request.sendall(struct.pack("<BI", 3, 1) + bytes([code]))
+        elif service.startswith("exec:"):
+            command = service.split(":", 1)[1]
+            self.request.sendall(b"OKAY")
+            if command.startswith("tar -cf -"):
+                self.request.sendall(b"fake tar archive" * 64)
+            else:
+                self.request.sendall(device.run(command)[0].encode())
+        elif service == "root:":
+            self.request.sendall(b"OKAY" + b"adbd is already running as root\n")
+        elif service == "sync:":
+            self.request.sendall(b"OKAY")
+            self._sync(device)
+        else:
+            self._fail(f"unknown service {service}")
+
+    def _sync(self, device):
+        path, data = None, b""
+        while True:
+            command, length = struct.unpack("<4sI", self._read(8))
+            if command == b"SEND":
+                path = self._read(length).decode().rsplit(",", 1)[0]
+            elif command == b"DATA":
+                data += self._read(length)
+            elif command == b"DONE":
+                device.files[path] = data
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                return
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """Local stand-in for the adb server with emulators whose consoles also answer"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        super().__init__((host, port), _AdbHandler)
+        self.adb = self
+        self.latency = latency
+        self.devices = {}
+        self.requests = 0
+        self.running = True
+        self.changed = threading.Condition()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+        for device in self.devices.values():
+            if device.console is not None:
+                device.console.shutdown()
+        self.shutdown()
+        self.server_close()
+
+    def add_emulator(self, boot_time=0.0, props=None):
+        """Start an emulator console on a free port; the serial is emulator-<port> like the real one"""
+        console = _ConsoleServer(("127.0.0.1", 0), _ConsoleHandler)
+        serial = f"emulator-{console.server_address[1]}"
+        console.adb, console.serial = self, serial
+        threading.Thread(target=console.serve_forever, daemon=True).start()
+
+        device = FakeDevice(serial, props)
+        device.console = console
+        if boot_time:
+            # Shows up offline first, then boots, like an emulator that was just launched
+            device.state = "offline"
+            device.props["sys.boot_completed"] = ""
+            device.props["init.svc.bootanim"] = "running"
+            threading.Timer(boot_time / 2, self._set_state, (serial, "device")).start()
+            threading.Timer(boot_time, device.props.update,
+                            ({"sys.boot_completed": "1", "init.svc.bootanim": "stopped"},)).start()
+        with self.changed:
+            self.devices[serial] = device
+            self.changed.notify_all()
+        return serial
+
+    def attach_emulator(self, console_port):
+        """Attach an emulator running elsewhere (e.g. benchmarks/fake_emulator.py) that serves its own console"""
+        serial = f"emulator-{console_port}"
+        with self.changed:
+            self.devices[serial] = FakeDevice(serial)
+            self.changed.notify_all()
+        return serial
+
+    def _set_state(self, serial, state):
+        with self.changed:
+            if serial in self.devices:
+                self.devices[serial].state = state
+                self.changed.notify_all()
+
+    def remove_device(self, serial):
+        with self.changed:
+            device = self.devices.pop(serial, None)
+            self.changed.notify_all()
+        if device is not None and device.console is not None:
+            threading.Thread(target=device.console.shutdown, daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake adb server with one emulator attached")
+    parser.add_argument("--port", type=int, default=5037)
+    parser.add_argument("--emulators", type=int, default=1)
+    args = parser.parse_args()
+
+    server = FakeAdbServer(port=args.port)
+    for _ in range(args.emulators):
+        print(f"Attached {server.add_emulator()}")
+    print(f"Fake adb server on port {server.port}")
+    server.serve_forever()
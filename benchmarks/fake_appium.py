@@ -0,0 +1,596 @@
+import argparse
+import base64
+import json
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "schedule_hierarchy.xml")
+STUDIO_NAME = "[YOUR STUDIO NAME]"
+SCREEN_WIDTH, SCREEN_HEIGHT = 1080, 2400
+BOUNDS_PATTERN = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+BADGES = ("Full", "Waitlist")
+# Screens whose animations never let UiAutomator see the UI idle until they stop
+ANIMATED_SCREENS = ("home", "schedule")
+DEFAULT_IDLE_TIMEOUT_MS = 10000
+# How much cheaper page_source gets with ignoreUnimportantViews
+COMPACT_DUMP_FACTOR = 0.5
+
+
+def _node(class_name, bounds, text="", desc="", resource_id="", clickable=False, scrollable=False,
+          children=()):
+    element = ET.Element(class_name, {
+        "class": class_name, "package": "com.glofox.app", "text": text, "content-desc": desc,
+        "resource-id": resource_id, "clickable": str(clickable).lower(), "enabled": "true",
+        "scrollable": str(scrollable).lower(), "bounds": "[%d,%d][%d,%d]" % bounds, "displayed": "true",
+    })
+    element.extend(children)
+    return element
+
+
+def _screen(*children):
+    root = ET.Element("hierarchy", {"class": "hierarchy", "rotation": "0", "width": str(SCREEN_WIDTH),
+                                    "height": str(SCREEN_HEIGHT)})
+    root.append(_node("android.widget.FrameLayout", (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT), children=children))
+    return root
+
+
+def build_screens():
+    """The app's screens in the order the booking walks through them"""
+    text_view = "android.widget.TextView"
+    edit_text = "android.widget.EditText"
+    button = "android.widget.Button"
+    view = "android.view.View"
+    search_box = (60, 200, 1020, 320)
+    return {
+        "loading": _screen(_node("android.widget.ProgressBar", (490, 1150, 590, 1250))),
+        "permission": _screen(_node(
+            "android.widget.LinearLayout", (90, 900, 990, 1500),
+            resource_id="com.android.permissioncontroller:id/grant_dialog",
+            children=[
+                _node(text_view, (140, 950, 940, 1100), text="Allow Glofox to send you notifications?"),
+                _node(button, (140, 1200, 940, 1320), text="Allow", clickable=True,
+                      resource_id="com.android.permissioncontroller:id/permission_allow_button"),
+                _node(button, (140, 1340, 940, 1460), text="Don't allow", clickable=True,
+                      resource_id="com.android.permissioncontroller:id/permission_deny_button"),
+            ])),
+        "search": _screen(
+            _node(edit_text, search_box, text="Find your studio or gym", clickable=True),
+        ),
+        "search input": _screen(_node(edit_text, search_box, clickable=True)),
+        "results": _screen(
+            _node(edit_text, search_box, text=STUDIO_NAME, clickable=True),
+            _node(text_view, (60, 380, 1020, 460), text=STUDIO_NAME, clickable=True),
+        ),
+        "login": _screen(
+            _node(edit_text, (60, 800, 1020, 920), desc="Enter your email address", clickable=True),
+            _node(edit_text, (60, 960, 1020, 1080), desc="Enter your password", clickable=True),
+            _node(button, (60, 1160, 1020, 1280), desc="Tap here to Login to continue", clickable=True),
+        ),
+        "home": _screen(
+            _node(view, (100, 210, 980, 770), clickable=True, children=[
+                _node(text_view, (140, 400, 940, 480), text="Book a class"),
+            ]),
+            _node(button, (0, 2260, 270, 2400), desc="Tap here to Home", clickable=True),
+            _node(button, (270, 2260, 540, 2400), desc="Tap here to Schedule", clickable=True),
+        ),
+        "schedule": ET.parse(FIXTURE).getroot(),
+        "class": _screen(
+            _node(text_view, (60, 300, 1020, 400), text="Reformer Pilates"),
+            _node(button, (60, 2000, 1020, 2140), desc="Tap here to undefined", clickable=True),
+        ),
+        "confirm": _screen(
+            _node(text_view, (60, 900, 1020, 1000), text="Confirm your booking"),
+            _node(button, (60, 1600, 1020, 1740), desc="Tap here to boo", clickable=True, children=[
+                _node(view, (80, 1620, 1000, 1720)),
+            ]),
+        ),
+        "booked": _screen(_node(text_view, (60, 900, 1020, 1000), text="You're booked in!")),
+    }
+
+
+def _has(attribute, value):
+    return lambda element, state: element.get(attribute) == value
+
+
+def _class_card(element, state):
+    """A slot card or its book button on the schedule list"""
+    return element.get("clickable") == "true" and state.inside_list(element)
+
+
+def _day_tab(element, state):
+    return element.get("clickable") == "true" and any(child.get("text") in DAYS for child in element)
+
+
+# What tapping an element (or anything inside it) leads to, per screen
+TRANSITIONS = {
+    "permission": [(_has("resource-id", "com.android.permissioncontroller:id/permission_allow_button"),
+                    "search")],
+    "search": [(_has("class", "android.widget.EditText"), "search input")],
+    "results": [(_has("text", STUDIO_NAME), "login")],
+    "login": [(_has("content-desc", "Tap here to Login to continue"), "home")],
+    "home": [(_has("bounds", "[100,210][980,770]"), "schedule")],
+    "schedule": [(_day_tab, "schedule"), (_class_card, "class")],
+    "class": [(_has("content-desc", "Tap here to undefined"), "confirm")],
+    "confirm": [(_has("content-desc", "Tap here to boo"), "booked")],
+}
+
+
+def parse_bounds(value):
+    match = BOUNDS_PATTERN.fullmatch(value or "")
+    return tuple(map(int, match.groups())) if match else None
+
+
+def _blank_png(width=108, height=240):
+    raw = b"".join(b"\x00" + b"\x80" * width * 3 for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+SCREENSHOT = base64.b64encode(_blank_png()).decode()
+
+
+class WebDriverError(Exception):
+    def __init__(self, error, message=""):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+
+
+class DeviceState:
+    """One session's view of the app: current screen, scroll position and typed text"""
+
+    def __init__(self, load_time, start_screen="permission", transition_time=0.0, idle_animation=0.0):
+        self.templates = build_screens()
+        self.load_time = load_time
+        self.transition_time = transition_time  # Window animation between screens
+        self.idle_animation = idle_animation  # How long an animated screen keeps moving once shown
+        self.animated_until = 0
+        self.history = []  # (screen, scroll offset) to go back to
+        self.generation = 0
+        self.screen = None
+        self.ready_at = 0
+        self.offset = 0
+        self.logged_in = False
+        self.focused = None  # Template of the text field last tapped, which adb `input text` types into
+        self._rendered = None
+        self.go(start_screen, remember=False)
+
+    def go(self, screen, remember=True):
+        if remember and self.screen is not None:
+            self.history.append((self.screen, self.offset))
+        if screen == "home":
+            self.logged_in = True
+        # Like the app, the list keeps its scroll position when a day tab reloads the same screen
+        if screen != self.screen:
+            self.offset = 0
+        self.screen = screen
+        self.ready_at = time.monotonic() + self.load_time + self.transition_time
+        self.animated_until = self.ready_at + self.idle_animation if screen in ANIMATED_SCREENS else 0
+        self.changed()
+
+    def changed(self):
+        self.generation += 1
+        self._rendered = None
+
+    def current_screen(self):
+        return self.screen if time.monotonic() >= self.ready_at else "loading"
+
+    def _list_viewport(self, template):
+        scrollable = next((e for e in template.iter() if e.get("scrollable") == "true"), None)
+        if scrollable is None:
+            return None, None, 0
+        bounds = parse_bounds(scrollable.get("bounds"))
+        content_bottom = max(parse_bounds(e.get("bounds"))[3] for e in scrollable.iter())
+        return scrollable, bounds, max(0, content_bottom - bounds[3])
+
+    def render(self):
+        """Return the hierarchy as UiAutomator would dump it: list scrolled and clipped to the viewport"""
+        if self._rendered is not None and self._rendered[0] == self.current_screen():
+            return self._rendered[1]
+        screen = self.current_screen()
+        template = self.templates[screen]
+        scrollable, viewport, _ = self._list_viewport(template)
+        self.sources = {}
+
+        def copy_node(element, in_list):
+            node = ET.Element(element.tag, dict(element.attrib))
+            self.sources[id(node)] = element
+            for child in element:
+                child_node = copy_node(child, in_list or element is scrollable)
+                if child_node is not None:
+                    node.append(child_node)
+            if in_list:
+                left, top, right, bottom = parse_bounds(element.get("bounds"))
+                top, bottom = top - self.offset, bottom - self.offset
+                # Containers stay while anything inside them is visible
+                if (bottom <= viewport[1] or top >= viewport[3]) and len(node) == 0:
+                    return None
+                node.set("bounds", "[%d,%d][%d,%d]" % (left, min(max(top, viewport[1]), viewport[3]), right,
+                                                       max(min(bottom, viewport[3]), viewport[1])))
+            return node
+
+        rendered = copy_node(template, False)
+        self.parents = {child: parent for parent in rendered.iter() for child in parent}
+        self.list_nodes = set()
+        list_node = next((e for e in rendered.iter() if e.get("scrollable") == "true"), None)
+        if list_node is not None:
+            self.list_nodes = {id(e) for e in list_node.iter() if e is not list_node}
+        self._rendered = (screen, rendered)
+        return rendered
+
+    def wait_for_idle(self, timeout):
+        """What UiAutomator does before each query and action: wait for animations, up to timeout"""
+        remaining = self.animated_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(remaining, timeout))
+
+    def inside_list(self, element):
+        return id(element) in self.list_nodes
+
+    def source(self):
+        return ET.tostring(self.render(), encoding="unicode")
+
+    def scroll(self, direction="down", percent=1.0):
+        """Scroll the list, returning whether it can scroll further in that direction"""
+        template = self.templates[self.current_screen()]
+        _, viewport, max_offset = self._list_viewport(template)
+        if viewport is None:
+            raise WebDriverError("no such element", "Nothing scrollable on screen")
+        distance = int((viewport[3] - viewport[1]) * percent)
+        before = self.offset
+        if direction == "down":
+            self.offset = min(max_offset, self.offset + distance)
+        else:
+            self.offset = max(0, self.offset - distance)
+        if self.offset != before:
+            self.changed()
+        return self.offset < max_offset if direction == "down" else self.offset > 0
+
+    def tap_element(self, element):
+        screen = self.current_screen()
+        source = self.sources.get(id(element))
+        if source is not None and source.get("class") == "android.widget.EditText":
+            self.focused = source
+        node = element
+        while node is not None:
+            for matches, target in TRANSITIONS.get(screen, []):
+                if matches(node, self):
+                    self.go(target)
+                    return
+            node = self.parents.get(node)
+
+    def tap_point(self, x, y):
+        hit = None
+        for element in self.render().iter():
+            bounds = parse_bounds(element.get("bounds"))
+            if bounds and bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]:
+                hit = element  # iter() is depth first, so the last hit is the innermost
+        if hit is not None:
+            self.tap_element(hit)
+
+    def type_text(self, element, text):
+        self.sources[id(element)].set("text", text)
+        self.changed()
+        if self.current_screen() == "search input":
+            self.go("results", remember=False)
+
+    def type_focused(self, text):
+        """Type into the focused field; a screen opened for typing focuses its first field itself"""
+        fields = [e for e in self.templates[self.screen].iter() if e.get("class") == "android.widget.EditText"]
+        if self.focused not in fields:
+            self.focused = fields[0] if fields else None
+        if self.focused is None:
+            return
+        self.focused.set("text", text)
+        self.changed()
+        if self.current_screen() == "search input":
+            self.go("results", remember=False)
+
+    def back(self):
+        if self.history:
+            self.screen, self.offset = self.history.pop()
+            self.changed()
+
+    def relaunch(self):
+        self.history = []
+        self.go("home" if self.logged_in else "search", remember=False)
+
+
+def _selector_matches(element, calls):
+    for method, argument in calls:
+        if method == "className" and element.get("class") != argument:
+            return False
+        if method == "text" and element.get("text") != argument:
+            return False
+        if method == "textStartsWith" and not element.get("text", "").startswith(argument):
+            return False
+        if method == "description" and element.get("content-desc") != argument:
+            return False
+        if method == "resourceId" and element.get("resource-id") != argument:
+            return False
+        if method == "scrollable" and element.get("scrollable") != argument:
+            return False
+    return True
+
+
+SELECTOR_CALL = re.compile(r'\.(\w+)\(("(?:[^"\\]|\\.)*"|true|false)?')
+
+
+def _selector_calls(expression):
+    calls = []
+    for method, argument in SELECTOR_CALL.findall(expression):
+        if argument.startswith('"'):
+            argument = json.loads(argument)
+        calls.append((method, argument))
+    return calls
+
+
+class FakeAppium(ThreadingHTTPServer):
+    """Local stand-in for an Appium UiAutomator2 server driving the Glofox app"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.02, dump_latency=0.05, load_time=0.3,
+                 start_screen="permission", install_time=0.0, init_time=0.0, window_animation=0.0,
+                 idle_animation=0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.dump_latency = dump_latency  # Extra cost of serialising the hierarchy (page source, XPath)
+        self.load_time = load_time
+        self.start_screen = start_screen
+        # Costs the session profiles in appium_profiles.py avoid; all off unless a benchmark sets them
+        self.install_time = install_time  # Checking and installing the UiAutomator2 server APKs
+        self.init_time = init_time  # Device initialization (settings app, unlock, locale)
+        self.window_animation = window_animation
+        self.idle_animation = idle_animation
+        self.sessions = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def set_badge(self, class_name, start_time, text):
+        """Change the availability badge of a class in every open session, e.g. when a spot frees up"""
+        with self.lock:
+            for session in self.sessions.values():
+                state = session["state"]
+                for card in state.templates["schedule"].iter():
+                    texts = [element.get("text") for element in card]
+                    if class_name in texts and any(t.startswith(start_time) for t in texts if t):
+                        badge = next(element for element in card.iter() if element.get("text") in BADGES
+                                     or element.get("text", "").endswith(" left"))
+                        badge.set("text", text)
+                state.changed()
+
+    def device_input(self, args):
+        """Apply an adb `input` command, e.g. ["tap", "500", "650"], to every open session"""
+        with self.lock:
+            for session in self.sessions.values():
+                state = session["state"]
+                if args[0] == "tap":
+                    state.tap_point(int(float(args[1])), int(float(args[2])))
+                elif args[0] == "text":
+                    state.type_focused(args[1].replace("%s", " "))
+                elif args[0] == "keyevent" and args[1] in ("4", "KEYCODE_BACK"):
+                    state.back()
+
+    def handle(self, method, path, body):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            return self._dispatch(method, path.rstrip("/"), body)
+
+    def _dispatch(self, method, path, body):
+        if path == "/status":
+            return {"ready": True, "message": "fake"}
+        if method == "POST" and path == "/session":
+            session_id = uuid.uuid4().hex
+            capabilities = body.get("capabilities", {}).get("alwaysMatch", {})
+            time.sleep((0 if capabilities.get("appium:skipServerInstallation") else self.install_time) +
+                       (0 if capabilities.get("appium:skipDeviceInitialization") else self.init_time))
+            transition = 0 if capabilities.get("appium:disableWindowAnimation") else self.window_animation
+            state = DeviceState(self.load_time, self.start_screen, transition, self.idle_animation)
+            self.sessions[session_id] = {"state": state, "elements": {}}
+            return {"sessionId": session_id, "capabilities": capabilities}
+
+        match = re.fullmatch(r"/session/([^/]+)(/.*)?", path)
+        if not match or match.group(1) not in self.sessions:
+            raise WebDriverError("invalid session id", "No such session")
+        session = self.sessions[match.group(1)]
+        state = session["state"]
+        route = match.group(2) or ""
+
+        if method == "DELETE" and route == "":
+            del self.sessions[match.group(1)]
+            return None
+        settings = session.get("settings", {})
+        if route in ("/source", "/element", "/elements", "/execute/sync") or route.endswith(("/click", "/value")):
+            state.wait_for_idle(settings.get("waitForIdleTimeout", DEFAULT_IDLE_TIMEOUT_MS) / 1000)
+        if route == "/source":
+            time.sleep(self.dump_latency * (COMPACT_DUMP_FACTOR if settings.get("ignoreUnimportantViews") else 1))
+            return state.source()
+        if route == "/screenshot":
+            return SCREENSHOT
+        if route == "/appium/settings":
+            if method == "POST":
+                session["settings"] = dict(session.get("settings", {}), **body.get("settings", {}))
+                return None
+            return session.get("settings", {})
+        if route == "/back":
+            state.back()
+            return None
+        if route in ("/element", "/elements"):
+            found = self._find(state, body["using"], body["value"])
+            if route == "/element":
+                if not found:
+                    raise WebDriverError("no such element", f"{body['using']}={body['value']}")
+                return self._reference(session, found[0])
+            return [self._reference(session, element) for element in found]
+        if route == "/execute/sync":
+            return self._execute(state, body["script"], (body.get("args") or [{}])[0], session)
+
+        element_match = re.fullmatch(r"/element/([^/]+)/(\w+)", route)
+        if element_match:
+            element = self._element(session, element_match.group(1))
+            action = element_match.group(2)
+            if action == "click":
+                state.tap_element(element)
+                return None
+            if action == "value":
+                state.type_text(element, body.get("text") or "".join(body.get("value", [])))
+                return None
+            if action in ("displayed", "enabled"):
+                return element.get(action, "true") == "true"
+            if action == "text":
+                return element.get("text", "")
+            if action == "rect":
+                left, top, right, bottom = parse_bounds(element.get("bounds"))
+                return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+        raise WebDriverError("unknown command", f"{method} {path}")
+
+    def _reference(self, session, element):
+        element_id = uuid.uuid4().hex
+        session["elements"][element_id] = (session["state"].generation, element)
+        return {ELEMENT_KEY: element_id}
+
+    def _element(self, session, element_id):
+        generation, element = session["elements"].get(element_id, (None, None))
+        if generation != session["state"].generation:
+            raise WebDriverError("stale element reference", "The element is no longer on screen")
+        return element
+
+    def _find(self, state, using, value):
+        root = state.render()
+        if using == "accessibility id":
+            return [e for e in root.iter() if e.get("content-desc") == value]
+        if using == "id" or using == "css selector" and value.startswith("[id="):
+            value = value[5:-2] if using == "css selector" else value
+            return [e for e in root.iter() if e.get("resource-id") == value]
+        if using == "class name":
+            return [e for e in root.iter() if e.get("class") == value]
+        if using == "xpath":
+            time.sleep(self.dump_latency)
+            return root.findall("." + value)
+        if using == "-android uiautomator":
+            return self._uiautomator(state, value)
+        raise WebDriverError("invalid selector", f"Unsupported locator strategy {using}")
+
+    def _uiautomator(self, state, expression):
+        root = state.render()
+        if expression.startswith("new UiScrollable"):
+            scrollables = [e for e in root.iter() if e.get("scrollable") == "true"]
+            if ".scrollIntoView(" in expression:
+                target = expression.split(".scrollIntoView(", 1)[1][:-1]
+                found = self._uiautomator(state, target)
+                while not found:
+                    before = state.offset
+                    state.scroll("down", 0.5)
+                    if state.offset == before:
+                        break
+                    found = self._uiautomator(state, target)
+                return found
+            if expression.endswith(".scrollForward()"):
+                state.scroll("down", 0.8)
+            elif expression.endswith(".scrollBackward()"):
+                state.scroll("up", 0.8)
+            return scrollables[:1]
+
+        if ".fromParent(" in expression:
+            outer, inner = expression.split(".fromParent(", 1)
+            parents = [state.parents.get(e) for e in self._uiautomator(state, outer)]
+            inner_calls = _selector_calls(inner)
+            return [child for parent in parents if parent is not None for child in parent
+                    if _selector_matches(child, inner_calls)]
+
+        steps = expression.split(".childSelector(")
+        candidates = [root]
+        for step in steps:
+            calls = _selector_calls(step)
+            candidates = [e for parent in candidates for e in parent.iter()
+                          if e is not parent and _selector_matches(e, calls)]
+        return candidates
+
+    def _execute(self, state, script, args, session):
+        if script == "mobile: clickGesture":
+            if "elementId" in args:
+                state.tap_element(self._element(session, args["elementId"]))
+            else:
+                state.tap_point(args["x"], args["y"])
+            return None
+        if script == "mobile: scrollGesture":
+            return state.scroll(args.get("direction", "down"), float(args.get("percent", 1.0)))
+        if script == "mobile: getCurrentPackage":
+            return "com.glofox.app"
+        if script == "mobile: getCurrentActivity":
+            return ".MainActivity"
+        if script == "mobile: terminateApp":
+            state.go("loading", remember=False)
+            return True
+        if script == "mobile: activateApp":
+            state.relaunch()
+            return None
+        raise WebDriverError("unknown command", f"Unsupported script {script}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        try:
+            status, reply = 200, {"value": self.server.handle(method, self.path, body)}
+        except WebDriverError as e:
+            status, reply = 404, {"value": {"error": e.error, "message": e.message, "stacktrace": ""}}
+        data = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Appium server with the Glofox app's screens")
+    parser.add_argument("--port", type=int, default=4723)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay added to every call")
+    parser.add_argument("--dump-ms", type=float, default=50, help="Extra delay for page source and XPath")
+    parser.add_argument("--load-ms", type=float, default=300, help="How long each new screen takes to show")
+    args = parser.parse_args()
+
+    server = FakeAppium(port=args.port, latency=args.latency_ms / 1000, dump_latency=args.dump_ms / 1000,
+                        load_time=args.load_ms / 1000)
+    print(f"Fake Appium on {server.url}")
+    server.serve_forever()
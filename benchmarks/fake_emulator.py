@@ -0,0 +1,107 @@
+import argparse
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+# Scripted boot times in seconds, shaped like a desktop emulator's: a quickboot snapshot skips Android's
+# boot, a window and audio cost setup time, and the boot animation holds a cold boot back
+COLD_BOOT = 30.0
+SNAPSHOT_BOOT = 6.0
+WINDOW_COST = 3.0
+AUDIO_COST = 0.5
+BOOT_ANIMATION_COST = 4.0
+SOFTWARE_GPU_COST = 2.0
+
+
+def avd_home():
+    return os.environ.get("ANDROID_AVD_HOME", os.path.join(os.path.expanduser("~"), ".android", "avd"))
+
+
+def boot_time(args):
+    """How long this boot takes, scaled by FAKE_EMULATOR_SCALE so benchmarks run in seconds"""
+    snapshot_dir = os.path.join(avd_home(), f"{args.avd}.avd", "snapshots", args.snapshot or "default_boot")
+    from_snapshot = not args.no_snapshot_load and os.path.isdir(snapshot_dir)
+    seconds = SNAPSHOT_BOOT if from_snapshot else COLD_BOOT
+    if not args.no_window:
+        seconds += WINDOW_COST
+    if not args.no_audio:
+        seconds += AUDIO_COST
+    if not from_snapshot and not args.no_boot_anim:
+        seconds += BOOT_ANIMATION_COST
+    if args.gpu in ("swiftshader_indirect", "guest") and not from_snapshot:
+        seconds += SOFTWARE_GPU_COST
+    return seconds * float(os.environ.get("FAKE_EMULATOR_SCALE", "1"))
+
+
+class _ConsoleHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        emulator = self.server.emulator
+        self.wfile.write(b"Android Console: type 'help' for a list of commands\r\nOK\r\n")
+        for line in self.rfile:
+            command = line.decode().strip()
+            if command == "kill":
+                self.wfile.write(b"OK: killing emulator, bye bye\r\n")
+                self.wfile.flush()
+                # Leaving the process closes the adb registration, which detaches the device
+                os._exit(0)
+            if command == "quit":
+                return
+            if command == "avd name":
+                self.wfile.write(f"{emulator.avd}\r\nOK\r\n".encode())
+            elif command.startswith("avd snapshot save "):
+                name = command.rsplit(" ", 1)[1]
+                os.makedirs(os.path.join(avd_home(), f"{emulator.avd}.avd", "snapshots", name), exist_ok=True)
+                self.wfile.write(b"OK\r\n")
+            elif command == "avd snapshot list":
+                snapshots = os.path.join(avd_home(), f"{emulator.avd}.avd", "snapshots")
+                names = sorted(os.listdir(snapshots)) if os.path.isdir(snapshots) else []
+                self.wfile.write("".join(f"{name}\r\n" for name in names).encode() + b"OK\r\n")
+            else:
+                self.wfile.write(b"OK\r\n")
+
+
+class _ConsoleServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def register_with_adb(console_port):
+    """Tell the adb server about this emulator the way the real one does, keeping the connection open"""
+    adb = socket.create_connection(("127.0.0.1", int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))))
+    request = f"host:emulator:{console_port}".encode()
+    adb.sendall(b"%04x" % len(request) + request)
+    if adb.recv(4) != b"OKAY":
+        raise SystemExit("adb server refused the emulator")
+    return adb
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for the Android emulator binary with scripted boot times")
+    parser.add_argument("-list-avds", action="store_true")
+    parser.add_argument("-avd")
+    parser.add_argument("-port", type=int, default=5554)
+    parser.add_argument("-no-window", action="store_true")
+    parser.add_argument("-no-audio", action="store_true")
+    parser.add_argument("-no-boot-anim", action="store_true")
+    parser.add_argument("-gpu", default="auto")
+    parser.add_argument("-snapshot")
+    parser.add_argument("-no-snapshot-load", action="store_true")
+    parser.add_argument("-no-snapshot-save", action="store_true")
+    args = parser.parse_args()
+
+    if args.list_avds:
+        home = avd_home()
+        names = sorted(name[:-4] for name in os.listdir(home) if name.endswith(".avd")) if os.path.isdir(home) else []
+        print("\n".join(names))
+        sys.exit(0)
+
+    console = _ConsoleServer(("127.0.0.1", args.port), _ConsoleHandler)
+    console.emulator = args
+    threading.Thread(target=console.serve_forever, daemon=True).start()
+    time.sleep(boot_time(args))
+    registration = register_with_adb(args.port)
+    while True:
+        time.sleep(3600)
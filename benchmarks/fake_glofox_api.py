@@ -0,0 +1,123 @@
+import argparse
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# One day's timetable, repeated for every day asked for
+SCHEDULE = [
+    ("07:00", "Reformer Pilates"),
+    ("08:00", "Mat Pilates"),
+    ("09:30", "Reformer Pilates"),
+    ("12:00", "Barre"),
+    ("18:00", "Reformer Pilates"),
+    ("19:00", "Stretch"),
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open like the real API
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _authorised(self):
+        return self.headers.get("Authorization") == f"Bearer {self.server.token}"
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+        path = urlparse(self.path).path
+        if path == "/2.0/login":
+            body = self._body()
+            if body.get("login") != self.server.email or body.get("password") != self.server.password:
+                return self._reply(401, {"success": False, "message": "Invalid credentials"})
+            self.server.token = uuid.uuid4().hex
+            return self._reply(200, {"success": True, "token": self.server.token})
+        if path == "/2.0/bookings":
+            if not self._authorised():
+                return self._reply(401, {"success": False, "message": "Unauthorised"})
+            class_id = self._body().get("model_id")
+            if self.server.booking_status < 400 or self.server.books_on_error:
+                self.server.bookings.append(class_id)
+            if self.server.booking_status >= 400:
+                return self._reply(self.server.booking_status, {"success": False, "message": "Bad gateway"})
+            return self._reply(200, {"success": True, "booking": {"_id": uuid.uuid4().hex, "event_id": class_id}})
+        self._reply(404, {"success": False})
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+        url = urlparse(self.path)
+        if url.path not in ("/2.0/events", "/2.0/bookings"):
+            return self._reply(404, {"success": False})
+        if not self._authorised():
+            return self._reply(401, {"success": False, "message": "Unauthorised"})
+        if url.path == "/2.0/bookings":
+            class_id = parse_qs(url.query).get("model_id", [None])[0]
+            return self._reply(200, {"success": True, "data": [{"event_id": booked} for booked in self.server.bookings
+                                                               if class_id is None or booked == class_id]})
+        day = datetime.fromtimestamp(int(parse_qs(url.query)["start"][0]))
+        events = []
+        for start, name in SCHEDULE:
+            hour, minute = map(int, start.split(":"))
+            begins = day + timedelta(hours=hour, minutes=minute)
+            events.append({"_id": f"{day:%Y%m%d}-{start.replace(':', '')}", "name": name,
+                           "time_start": int(begins.timestamp())})
+        self._reply(200, {"success": True, "data": events})
+
+
+class FakeGlofoxApi(ThreadingHTTPServer):
+    """Local stand-in for the Glofox API with a fixed timetable and a configurable delay per request"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.03, email="[EMAIL]", password="[PASSWORD]"):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.email = email
+        self.password = password
+        self.token = None
+        self.requests = 0
+        self.bookings = []
+        # Status for booking requests; with books_on_error a failing request still books, like a lost reply
+        self.booking_status = 200
+        self.books_on_error = False
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def expire_token(self):
+        self.token = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Glofox API for trying the API booker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    server = FakeGlofoxApi(port=args.port, latency=args.latency_ms / 1000)
+    print(f"Fake Glofox API on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,134 @@
+import logging
+import time
+from collections import defaultdict
+
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints in the order the flow reaches them
+START = "start"
+PERMISSION = "permission"
+SEARCHED = "searched"
+LOGGED_IN = "logged in"
+DAY_SELECTED = "day selected"
+SLOT_OPENED = "slot opened"
+BOOKED = "booked"
+
+# (checkpoint reached when the step succeeds, booker method that runs the step)
+STEPS = [
+    (PERMISSION, "handle_permission_popup"),
+    (SEARCHED, "search_studio"),
+    (LOGGED_IN, "log_in"),
+    (DAY_SELECTED, "select_day"),
+    (SLOT_OPENED, "open_slot"),
+    (BOOKED, "complete_booking"),
+]
+CHECKPOINTS = [START] + [checkpoint for checkpoint, _ in STEPS]
+
+# Which checkpoint each screen the booker can recognise puts the flow at
+SCREEN_CHECKPOINTS = {
+    "permission": START,
+    "search": PERMISSION,
+    "login": SEARCHED,
+    "home": LOGGED_IN,
+    # The day is picked again, which is one tap, so the right day is always showing
+    "schedule": LOGGED_IN,
+}
+
+# Cheapest first; a step that keeps failing moves further down the list
+RECOVERY_ACTIONS = ["refind", "back", "relaunch", "reset"]
+MAX_RECOVERIES = 8
+DETECT_TIMEOUT = 5
+# Errors that mean the Appium session itself is gone, which only a reset can fix
+SESSION_GONE_MESSAGES = ("invalid session id", "session is either terminated", "instrumentation process is not running")
+
+
+class BookingFlow:
+    """Run the booking as checkpointed steps and resume from the last good one after a failure"""
+
+    def __init__(self, booker, max_recoveries=MAX_RECOVERIES):
+        self.booker = booker
+        self.max_recoveries = max_recoveries
+        self.checkpoint = START
+        self.history = []  # (checkpoint, seconds since the flow started)
+        self.failures = defaultdict(int)
+        self.recoveries = 0
+        self.started = None
+
+    def run(self, until=BOOKED, resume=None):
+        """Work through the steps until the until checkpoint is reached, recovering on the way"""
+        # resume is the checkpoint to carry on from when the screen on show is not one the flow knows, e.g. a
+        # class screen left by a replayed macro; whoever passes it has already waited for the screen to settle
+        self.started = time.monotonic()
+        checkpoint = self.detect(timeout=0 if resume else None)
+        if checkpoint is None and resume is not None:
+            logger.info(f"Screen not recognised, resuming after checkpoint '{resume}'")
+            checkpoint = resume
+        if checkpoint is None:
+            # Somewhere unfamiliar, e.g. a class screen left over from an earlier job
+            self.recover(STEPS[0][1], first_action="back")
+        else:
+            self.reach(checkpoint)
+
+        target = CHECKPOINTS.index(until)
+        while CHECKPOINTS.index(self.checkpoint) < target:
+            checkpoint, method = STEPS[CHECKPOINTS.index(self.checkpoint)]
+            try:
+                getattr(self.booker, method)()
+            except Exception as e:
+                logger.warning(f"Step {method} failed after checkpoint '{self.checkpoint}': {str(e)}")
+                self.recover(method)
+                continue
+            self.failures.pop(method, None)
+            self.reach(checkpoint)
+        return self.history
+
+    def reach(self, checkpoint):
+        self.checkpoint = checkpoint
+        elapsed = time.monotonic() - self.started
+        self.history.append((checkpoint, round(elapsed, 3)))
+        logger.info(f"Checkpoint '{checkpoint}' at {elapsed:.2f}s")
+
+    def detect(self, timeout=None):
+        """Return the checkpoint matching the screen on show, or None if it is not one the flow knows"""
+        screen = self.booker.detect_screen(timeout=timeout)
+        return SCREEN_CHECKPOINTS.get(screen)
+
+    def recover(self, method, first_action=None):
+        """Try recovery actions from the cheapest that has not already failed for this step"""
+        self.recoveries += 1
+        if self.recoveries > self.max_recoveries:
+            raise Exception(f"Giving up after {self.max_recoveries} recoveries (last good checkpoint "
+                            f"'{self.checkpoint}')")
+
+        self.failures[method] += 1
+        start = RECOVERY_ACTIONS.index(first_action) if first_action else self.failures[method] - 1
+        actions = RECOVERY_ACTIONS[min(start, len(RECOVERY_ACTIONS) - 1):]
+        while actions:
+            action = actions.pop(0)
+            try:
+                with span(f"recover {action}", step=method):
+                    getattr(self.booker, f"recover_{action}")()
+                    # After a reset the permission popup can take a while, so give it the full wait
+                    checkpoint = self.detect(timeout=None if action == "reset" else DETECT_TIMEOUT)
+            except WebDriverException as e:
+                logger.warning(f"Recovery by {action} failed: {str(e)}")
+                if session_gone(e) and "reset" in actions:
+                    logger.warning("Appium session is gone, going straight to a reset")
+                    actions = ["reset"]
+                continue
+            if checkpoint is not None:
+                logger.info(f"Recovered with {action}, resuming after checkpoint '{checkpoint}'")
+                self.reach(checkpoint)
+                return
+            logger.warning(f"Recovery by {action} did not reach a known screen")
+        raise Exception(f"Could not recover from failed {method} step")
+
+
+def session_gone(error):
+    """Whether a WebDriver error means the session died rather than the screen being unexpected"""
+    message = (error.msg or "").lower()
+    return isinstance(error, InvalidSessionIdException) or any(text in message for text in SESSION_GONE_MESSAGES)
@@ -0,0 +1,58 @@
+import json
+import logging
+import time
+
+from booking_flow import BookingFlow
+from tracing import new_run, span
+
+logger = logging.getLogger(__name__)
+
+
+def parse_job(text):
+    """Turn 'Sat:0:3' (day, categories to skip, slot), 'Sat:Yoga Flow:15:00' (day, class, time) or
+    'Sat:Yoga Flow' (day, first class of that name) into a job"""
+    day_of_week, first, *rest = text.split(":", 2)
+    if first.isdigit():
+        return {"day_of_week": day_of_week, "categories_to_skip": int(first), "slot_number": int(rest[0])}
+    return {"day_of_week": day_of_week, "categories_to_skip": 0, "slot_number": 1,
+            "class_name": first, "start_time": rest[0] if rest else None}
+
+
+def load_jobs(path):
+    """Read jobs from a JSON list of job objects, or a text file with one job per line as for parse_job"""
+    with open(path) as f:
+        if path.endswith(".json"):
+            return [dict({"categories_to_skip": 0, "slot_number": 1}, **job) for job in json.load(f)]
+        return [parse_job(line.strip()) for line in f if line.strip() and not line.startswith("#")]
+
+
+def run_queue(booker, jobs):
+    """Book each job in order on the booker's session, going back to the schedule in between"""
+    results = []
+    try:
+        for number, job in enumerate(jobs, 1):
+            result = {"job": job, "ok": False, "error": None}
+            start = time.monotonic()
+            new_run()
+            with span("queue job", number=number, day=job["day_of_week"]):
+                booker.set_job(**job)
+                # Backing out of the finished booking is a couple of taps; relaunching would cost a cold start
+                if number > 1 and not booker.return_to_schedule():
+                    logger.warning("Could not get back to the schedule, the flow will recover from here")
+                try:
+                    BookingFlow(booker).run()
+                    result["ok"] = True
+                except Exception as e:
+                    result["error"] = str(e)
+                    logger.error(f"Job {number} failed: {str(e)}")
+                    booker.screenshots.persist(f"job{number}-failure")
+            result["elapsed"] = time.monotonic() - start
+            status = "booked" if result["ok"] else f"failed ({result['error']})"
+            logger.info(f"Job {number}/{len(jobs)} {job} {status} in {result['elapsed']:.1f}s")
+            results.append(result)
+    finally:
+        booker.end_session()
+
+    booked = sum(1 for result in results if result["ok"])
+    logger.info(f"Booked {booked}/{len(results)} classes in one session")
+    return results
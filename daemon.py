@@ -0,0 +1,214 @@
+import argparse
+import json
+import socket
+import socketserver
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from booking_flow import LOGGED_IN, BookingFlow
+from demo import (
+    APP_PACKAGE,
+    GlofoxBooker,
+    is_appium_running,
+    is_emulator_running,
+    logger,
+    start_android_emulator,
+    start_appium,
+    wake_up_screen,
+)
+from readiness import wait_for_emulator
+from tracing import new_run, span
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 4780
+# Appium drops sessions idle for newCommandTimeout (60s by default), so check well inside that
+HEALTH_CHECK_INTERVAL = 30
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """Read one JSON request per connection and write back one JSON reply"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+        except ValueError:
+            reply = {"ok": False, "error": "Request is not valid JSON"}
+        else:
+            reply = self.server.booking_daemon.handle_request(request)
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class _DaemonServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+class BookingDaemon:
+    """Keep a logged-in Appium session warm and run booking jobs sent over a local socket"""
+
+    def __init__(self, host=DAEMON_HOST, port=DAEMON_PORT):
+        self.host = host
+        self.port = port
+        self.booker = None
+        self.running = False
+        self.last_health_check = 0
+
+    def start_environment(self):
+        """Bring up the emulator and Appium only if they are not already running"""
+        if not is_emulator_running():
+            if not start_android_emulator():
+                raise Exception("Could not start Android Emulator")
+            wake_up_screen()
+            if wait_for_emulator() is None:
+                raise Exception("Emulator did not come back after wake up")
+
+        if not is_appium_running():
+            if not start_appium():
+                raise Exception("Could not start Appium server")
+
+    def connect(self):
+        """Open a new Appium session, keeping the app data so an existing login survives"""
+        if self.booker is None:
+            self.booker = GlofoxBooker(connect=False)
+        else:
+            try:
+                self.booker.driver.quit()
+            except Exception:
+                logger.info("Previous session already ended")
+        self.booker.setup_driver(clear_app_data=False)
+        self.ensure_logged_in()
+        # The session stays open for later jobs, so a fresh login is saved now rather than when it ends
+        self.booker.save_session()
+        self.last_health_check = time.monotonic()
+
+    def ensure_logged_in(self):
+        """Log in only if the app is not already on its home screen"""
+        flow = BookingFlow(self.booker)
+        flow.run(until=LOGGED_IN)
+        logger.info(f"Session ready (started from checkpoint '{flow.history[0][0]}')")
+
+    def health_check(self):
+        """Reconnect only when the session is gone; bring the app forward if it is not in front"""
+        self.last_health_check = time.monotonic()
+        try:
+            package = self.booker.driver.current_package
+        except WebDriverException as e:
+            logger.warning(f"Session health check failed, reconnecting: {str(e)}")
+            if not is_appium_running():
+                self.start_environment()
+            self.connect()
+            return
+
+        if package != APP_PACKAGE:
+            logger.warning(f"App not in foreground ({package}), activating it")
+            self.booker.driver.activate_app(APP_PACKAGE)
+
+    def book(self, day_of_week, categories_to_skip, slot_number, class_name=None, start_time=None):
+        """Run one booking on the warm session and return how long it took"""
+        start = time.monotonic()
+        new_run()
+        with span("daemon job", day=day_of_week):
+            self.health_check()
+            self.booker.set_job(day_of_week, categories_to_skip, slot_number, class_name, start_time)
+            try:
+                # Resumes from whatever screen the last job left behind, logging in again if needed
+                BookingFlow(self.booker).run()
+            except Exception:
+                self.booker.screenshots.persist("daemon-failure")
+                raise
+            finally:
+                self.booker.save_session()
+        elapsed = time.monotonic() - start
+        logger.info(f"Booked {day_of_week} slot {slot_number} in {elapsed:.2f}s from trigger")
+        return elapsed
+
+    def handle_request(self, request):
+        command = request.get("cmd", "book")
+        if command == "ping":
+            return {"ok": True}
+        if command == "shutdown":
+            self.running = False
+            return {"ok": True}
+        if command != "book":
+            return {"ok": False, "error": f"Unknown command: {command}"}
+
+        try:
+            elapsed = self.book(
+                day_of_week=request["day_of_week"],
+                categories_to_skip=int(request.get("categories_to_skip", 0)),
+                slot_number=int(request.get("slot_number", 1)),
+                class_name=request.get("class_name"),
+                start_time=request.get("start_time"),
+            )
+            return {"ok": True, "elapsed": elapsed}
+        except (KeyError, ValueError) as e:
+            return {"ok": False, "error": f"Bad booking request: {str(e)}"}
+        except Exception as e:
+            logger.error(f"Booking job failed: {str(e)}")
+            return {"ok": False, "error": str(e)}
+
+    def serve_forever(self):
+        self.start_environment()
+        self.connect()
+        self.running = True
+        with _DaemonServer((self.host, self.port), _JobHandler) as server:
+            server.booking_daemon = self
+            server.timeout = 1
+            logger.info(f"Booking daemon listening on {self.host}:{self.port}")
+            while self.running:
+                server.handle_request()
+                if time.monotonic() - self.last_health_check >= HEALTH_CHECK_INTERVAL:
+                    try:
+                        self.health_check()
+                    except Exception as e:
+                        logger.error(f"Error during health check: {str(e)}")
+
+        self.booker.end_session()
+        logger.info("Booking daemon stopped")
+
+
+def send_request(request, host=DAEMON_HOST, port=DAEMON_PORT, timeout=300):
+    """Send one request to a running daemon and return its reply"""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(request) + "\n").encode())
+        with sock.makefile() as reply:
+            return json.loads(reply.readline())
+
+
+def submit_job(day_of_week, categories_to_skip=0, slot_number=1, class_name=None, start_time=None,
+               host=DAEMON_HOST, port=DAEMON_PORT):
+    """Ask a running daemon to book a class"""
+    return send_request({
+        "cmd": "book",
+        "day_of_week": day_of_week,
+        "categories_to_skip": categories_to_skip,
+        "slot_number": slot_number,
+        "class_name": class_name,
+        "start_time": start_time,
+    }, host=host, port=port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-session booking daemon")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("serve", help="Start the daemon")
+    book_parser = subparsers.add_parser("book", help="Send a booking job to the daemon")
+    book_parser.add_argument("--day", default="Sat")
+    book_parser.add_argument("--skip", type=int, default=0, help="Categories to scroll past")
+    book_parser.add_argument("--slot", type=int, default=1)
+    book_parser.add_argument("--class-name", help="Find the slot by class name instead of --skip/--slot")
+    book_parser.add_argument("--start-time", help="Start time of the class, e.g. 07:00")
+    subparsers.add_parser("ping", help="Check the daemon is up")
+    subparsers.add_parser("stop", help="Stop the daemon")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        BookingDaemon(port=args.port).serve_forever()
+    elif args.command == "book":
+        print(submit_job(args.day, args.skip, args.slot, args.class_name, args.start_time, port=args.port))
+    elif args.command == "ping":
+        print(send_request({"cmd": "ping"}, port=args.port))
+    elif args.command == "stop":
+        print(send_request({"cmd": "shutdown"}, port=args.port))
@@ -1,207 +1,158 @@
 from appium import webdriver
 from appium.webdriver.common.appiumby import AppiumBy
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from appium.options.android import UiAutomator2Options
 from selenium.common.exceptions import TimeoutException
+import argparse
+import json
+import os
 import time
 import subprocess
 import sys
 import ctypes
-import time
 
 import logging
 from datetime import datetime
 
-# Set up logging with both file and console output
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'logs/booking_log_{datetime.now().strftime("%Y%m%d")}.txt'),
-        logging.StreamHandler()
-    ]
-)
+from adb_client import AdbError, adb_client
+from appium_profiles import (DEFAULT_SESSION_PROFILE, SESSION_PROFILES, apply_capabilities, apply_settings,
+                             get_profile)
+from booking_flow import BookingFlow
+from booking_queue import load_jobs, parse_job, run_queue
+from emulator import DEFAULT_PROFILE, EMULATOR_COMMAND, PROFILES, EmulatorManager
+from environment import environment
+from glofox_api import book_via_api
+from locators import ElementFinder
+from log_setup import set_device, setup_logging
+from macro import run_with_macro
+from readiness import wait_for_appium, wait_for_emulator
+from resources import SAMPLE_INTERVAL, ResourceSampler
+from screenshots import ScreenshotBuffer
+from session_cache import SessionCache
+from slot_finder import SlotFinder
+from snapshot import SnapshotCache
+from supervisor import supervisor
+from timed_trigger import fire_at
+from tracing import trace_driver, traced
+from watcher import watch_availability
+from waits import StepWaiter
+
+# Console and JSON log file output, written on a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Conda environment Appium is installed in
+APPIUM_CONDA_ENV = "ds"
+# Whole runs, as demo.bat used to retry them, and the pause between them
+MAX_RUNS = 3
+RETRY_DELAY = 30
+
+
+def appium_command(port):
+    if os.name == "nt":
+        return ["cmd.exe", "/c", f"conda activate {APPIUM_CONDA_ENV} && appium --port {port}"]
+    return ["appium", "--port", str(port)]
+
+
+def appium_name(port):
+    """Name the supervisor tracks the Appium server on port under"""
+    return f"appium-{port}"
 
-def is_appium_running():
+
+def is_appium_running(port=4723):
     """Check if Appium server is running"""
     try:
-        import requests
-        from requests.exceptions import ConnectionError
-        try:
-            response = requests.get('http://127.0.0.1:4723/status', timeout=5)
-            return response.status_code == 200
-        except ConnectionError:
-            logger.info("Appium is not running (connection refused)")
-            return False
-        except Exception as e:
-            logger.error(f"Error checking Appium status: {str(e)}")
-            return False
+        if environment().get("appium", port):
+            return True
+        logger.info("Appium is not running (connection refused)")
+        return False
     except Exception as e:
-        logger.error(f"Error in is_appium_running: {str(e)}")
+        logger.error(f"Error checking Appium status: {str(e)}")
         return False
 
-def start_appium():
-    """Start Appium server"""
+@traced("appium start")
+def start_appium(port=4723):
+    """Start Appium server as a tracked child process"""
     try:
-        logger.info("Starting Appium server...")
-        
-        # Use start command to open new command window and run Appium
-        start_command = 'start cmd.exe /c "conda activate ds && appium"'
-        subprocess.run(start_command, shell=True)
+        logger.info(f"Starting Appium server on port {port}...")
+        name = appium_name(port)
+        if supervisor().is_running(name):
+            # Ours from an earlier run but not answering, so it would only hold on to the port
+            logger.warning(f"Appium started earlier on port {port} is not responding, stopping it")
+            supervisor().stop(name)
+        supervisor().start(name, appium_command(port), port=port)
         
         # Wait for Appium to start
         logger.info("Waiting for Appium to start...")
-        attempts = 10  # Increase attempts to 10
-        for i in range(attempts):
-            if is_appium_running():
-                logger.info("Appium server started successfully")
-                return True
-            logger.info(f"Appium start attempt {i+1}/{attempts}")
-            time.sleep(5)
+        started = wait_for_appium(port) is not None
+        environment().invalidate("appium")
+        if started:
+            logger.info("Appium server started successfully")
+            return True
         
-        logger.error("Failed to start Appium server after multiple attempts")
+        logger.error("Failed to start Appium server")
+        supervisor().stop(name)
         return False
     except Exception as e:
         logger.error(f"Error starting Appium: {str(e)}")
         return False
 
-def get_avd_name():
+@traced("emulator boot")
+def start_android_emulator(profile=DEFAULT_PROFILE):
+    """Start Android Emulator from the home snapshot, or keep the running one if it is healthy"""
+    # Returns how it came up ("reused", "snapshot" or "cold"), or None if it did not
     try:
-        result = subprocess.run([r"emulator.exe", "-list-avds"], 
-                              capture_output=True, text=True)
-        if result.stdout:
-            avd_names = result.stdout.strip().split('\n')
-            logger.info(f"Found AVDs: {avd_names}")
-            return avd_names[0]  # Return first AVD name
-        else:
-            logger.error("No AVDs found")
-            return None
+        logger.info(f"Starting Android Emulator ({profile})...")
+        return EmulatorManager(profile=profile).start()
     except Exception as e:
-        logger.error(f"Error getting AVD name: {str(e)}")
+        logger.error(f"Error starting emulator: {str(e)}")
         return None
 
 
-def start_android_emulator():
-    """Start Android Emulator"""
+def is_emulator_running(serial='emulator-5554'):
+    """Check if the emulator is already online"""
     try:
-        logger.info("Starting Android Emulator...")
-        print("start android")
-        
-        # Kill processes more thoroughly
-        try:
-            subprocess.run(['adb', 'emu', 'kill'], 
-                          stdout=subprocess.DEVNULL, 
-                          stderr=subprocess.DEVNULL)
-            time.sleep(5)  # Wait for emulator to fully shut down
-            
-            # Kill any remaining processes
-            subprocess.run(['taskkill', '/F', '/IM', 'qemu-system-x86_64.exe', '/T'], 
-                          stdout=subprocess.DEVNULL, 
-                          stderr=subprocess.DEVNULL)
-            subprocess.run(['taskkill', '/F', '/IM', 'emulator.exe', '/T'], 
-                          stdout=subprocess.DEVNULL, 
-                          stderr=subprocess.DEVNULL)
-            subprocess.run(['adb', 'kill-server'], 
-                          stdout=subprocess.DEVNULL, 
-                          stderr=subprocess.DEVNULL)
-            
-            time.sleep(5)  # Wait for all processes to be killed
-        except Exception as e:
-            logger.error(f"Error killing processes: {str(e)}")
-        
-        # Delete lock files with a different approach
-        import glob
-        import os
-        lock_files = glob.glob(r"..\android\avd\Medium_Phone_API_35.avd\*.lock")
-        for file in lock_files:
-            try:
-                if os.path.exists(file):
-                    os.chmod(file, 0o777)  # Give full permissions
-                    os.remove(file)
-                    logger.info(f"Removed lock file: {file}")
-            except Exception as e:
-                logger.error(f"Error removing lock file {file}: {str(e)}")
-                # If we can't delete, try to empty the file
-                try:
-                    with open(file, 'w') as f:
-                        pass
-                except Exception as e2:
-                    logger.error(f"Error emptying lock file: {str(e2)}")
-        
-        time.sleep(5)  # Wait after deleting lock files
-        
-        # Restart ADB server
-        subprocess.run(['adb', 'start-server'])
-        time.sleep(2)
-        
-        # Path to emulator
-        emulator_path = r"emulator.exe"
-        
-        # Get AVD name
-        avd_name = get_avd_name()
-        if not avd_name:
-            raise Exception("No AVD found")
-            
-        logger.info(f"Starting emulator with AVD: {avd_name}")
-        # Remove -wipe-data flag and add -no-window for Task Scheduler
-        start_command = f'"{emulator_path}" -avd {avd_name}'
-        
-        subprocess.Popen(start_command, shell=True)
-        
-        # Wait for emulator to start
-        logger.info("Waiting for emulator to start...")
-        # Use adb to check if device is online
-        for i in range(12):  # Try for 60 seconds
-            try:
-                result = subprocess.run(['adb', 'devices'], capture_output=True, text=True)
-                if 'emulator-5554' in result.stdout and 'device' in result.stdout:
-                    logger.info("Emulator started successfully")
-                    return True
-            except Exception:
-                pass
-            logger.info(f"Waiting for emulator... Attempt {i+1}/12")
-            time.sleep(5)
-        
-        logger.error("Failed to start emulator")
-        return False
-            
+        return environment().get("devices").get(serial) == "device"
     except Exception as e:
-        logger.error(f"Error starting emulator: {str(e)}")
+        logger.error(f"Error checking emulator status: {str(e)}")
         return False
 
 
+@traced("adb restart")
 def restart_adb():
-    """Restart ADB server"""
+    """Reconnect offline devices, restarting the ADB server only if it does not answer"""
     try:
-        logger.info("Restarting ADB server...")
-        subprocess.run(['adb', 'kill-server'])
-        time.sleep(2)
-        subprocess.run(['adb', 'start-server'])
-        time.sleep(3)
+        adb = adb_client()
+        environment().invalidate("devices")
+        try:
+            adb.version()
+            adb.reconnect_offline()
+            logger.info("ADB server responding, reconnected offline devices")
+            return
+        except (AdbError, OSError) as e:
+            logger.warning(f"ADB server not responding ({str(e)}), restarting it...")
+        adb.kill_server()
+        adb.version()  # Connecting starts a new server
         logger.info("ADB server restarted")
     except Exception as e:
         logger.error(f"Error restarting ADB server: {str(e)}")
 
 
+@traced("wake screen")
 def wake_up_screen():
     """Wake up the screen if it's in sleep mode"""
     try:
         ctypes.windll.kernel32.SetThreadExecutionState(0x80000000 | 0x00000001 | 0x00000002)
         logger.info("Waking up screen...")
-        time.sleep(5)  # Increased wait time
+        # No pause here: callers wait for the device to answer again, which is when it is actually usable
         restart_adb()  # Restart ADB after wake
     except Exception as e:
         logger.error(f"Error waking up screen: {str(e)}")
 
-def check_wifi_connection():
+def check_wifi_connection(fresh=False):
     """Check if connected to WiFi"""
     try:
-        result = subprocess.run(['netsh', 'wlan', 'show', 'interfaces'], 
-                              capture_output=True, text=True)
-        if "State                  : connected" in result.stdout:
+        if environment().get("wifi", fresh=fresh):
             logger.info("WiFi connected")
             return True
         logger.warning("WiFi not connected")
@@ -217,7 +168,7 @@ def connect_to_wifi(ssid="Sharon_Home(5GHz)", password="simei167"):
             connect_command = f'netsh wlan connect name="{ssid}"'
             subprocess.run(connect_command, shell=True)
             time.sleep(5)  # Wait for connection
-            if check_wifi_connection():
+            if check_wifi_connection(fresh=True):
                 print(f"Successfully connected to {ssid}")
                 logger.info("Successfully connected to wifi")
                 return True
@@ -238,9 +189,42 @@ APP_PACKAGE = '[YOUR APP PACKAGE]'
 APP_ACTIVITY = '[YOUR APP ACTIVITY]'
 DEVICE_NAME = '[YOUR DEVICE NAME]'
 WAIT_TIME = 10
+SEARCH_TIMEOUT = 30  # Studio search results come back over the network
+FINAL_CONFIRM_TIMEOUT = 1
+APPIUM_PROFILE = DEFAULT_SESSION_PROFILE
+# Between queued bookings: class and confirmation screens are at most a few back presses deep
+MAX_BACK_PRESSES = 4
+BACK_SETTLE_TIMEOUT = 3
+# How long a setup_driver retry waits for the device and Appium to come back after an adb restart
+RETRY_READY_TIMEOUT = 30
 EMAIL = "[EMAIL]"
 PASSWORD = "[PASSWORD]"
 
+
+class Device:
+    """One emulator and the Appium server that drives it"""
+
+    def __init__(self, serial='emulator-5554', appium_port=4723, system_port=8200, udid=None, avd=None):
+        self.serial = serial
+        self.appium_port = appium_port
+        self.system_port = system_port  # UiAutomator2 server port on the host, unique per device
+        self.udid = udid or serial
+        self.avd = avd  # AVD booted at this serial if it is not running; None for the first one there is
+
+    @property
+    def appium_server(self):
+        return f'http://127.0.0.1:{self.appium_port}'
+
+    def shell(self, command):
+        """Run a shell command on this device through the ADB server"""
+        return adb_client().shell(self.serial, command)
+
+    def __repr__(self):
+        return f"Device({self.serial}, appium={self.appium_port}, systemPort={self.system_port})"
+
+
+DEFAULT_DEVICE = Device()
+
 # Slot coordinates mapping
 SLOT_COORDINATES = {
     1: (500, 650),   # 1st slot
@@ -251,58 +235,116 @@ SLOT_COORDINATES = {
     6: (386, 2154)
 }
 
+# Locators for the screens the flow starts from
+PERMISSION_DIALOG = (AppiumBy.ID, "com.android.permissioncontroller:id/grant_dialog")
+PERMISSION_ALLOW = (AppiumBy.ID, "com.android.permissioncontroller:id/permission_allow_button")
+SEARCH_FIELD = (AppiumBy.XPATH, "//android.widget.EditText[@text='Find your studio or gym']")
+EMAIL_FIELD = (AppiumBy.ACCESSIBILITY_ID, "Enter your email address")
+# Home screen tile that opens the class schedule
+BOOKING_VIEW = (AppiumBy.XPATH, "//android.view.View[@bounds='[100,210][980,770]']")
+
 class GlofoxBooker:
-    def __init__(self, day_of_week="Sun", tap_coordinates=(516, 1003), categories_to_skip=6, slot_number=1):
-        # Check WiFi connection
-        if check_wifi_connection():
+    def __init__(self, day_of_week="Sun", tap_coordinates=(516, 1003), categories_to_skip=6, slot_number=1,
+                 driver=None, connect=True, device=None,
+                 release_at=None, release_lead=0.0, clock_offset=0.0, class_name=None, start_time=None,
+                 save_screenshots=False, reuse_session=True, check_wifi=True, use_macros=False, clear_app_data=True,
+                 appium_profile=APPIUM_PROFILE):
+        # Check WiFi connection (off when driving a local test server)
+        if check_wifi and check_wifi_connection():
             logger.info("Connected to wifi, will proceed")
-        if not check_wifi_connection():
+        elif check_wifi:
             logger.error("No WiFi connection detected, attempting to connect...")
             if not connect_to_wifi():
                 logger.error("Failed to connect to WiFi")
                 raise Exception("Could not establish WiFi connection")
 
 
-        self.day_of_week = day_of_week
         self.tap_coordinates = tap_coordinates
+        self.set_job(day_of_week, categories_to_skip, slot_number, class_name, start_time)
+        self.device = device or DEFAULT_DEVICE
+        set_device(self.device.serial)
+        # When set, the flow runs early and parks on the book button until this wall-clock time
+        self.release_at = release_at
+        self.release_lead = release_lead
+        self.clock_offset = clock_offset
+        # Screenshots stay in memory and are only written on failure unless this is set
+        self.save_screenshots = save_screenshots
+        # Restore the last login instead of clearing the app, so the flow starts on the home screen
+        self.session_cache = SessionCache(self.device.serial, APP_PACKAGE) if reuse_session else None
+        self.session_restored = False
+        # Set by a fresh login; the session is saved once the Appium session is over, off the booking's hot path
+        self.session_to_save = False
+        # Replay the inputs of an earlier clean run of the same job through adb, recording one if there is none
+        self.use_macros = use_macros
+        # Capabilities and settings for each Appium session, see appium_profiles.SESSION_PROFILES
+        get_profile(appium_profile)
+        self.appium_profile = appium_profile
+        self.driver = None
+        self.screenshots = None
+        if driver is not None:
+            self.attach_driver(driver)
+        elif connect:
+            # Off when the emulator booted from a snapshot with the app already logged in
+            self.setup_driver(clear_app_data=clear_app_data)
+
+    def set_job(self, day_of_week, categories_to_skip, slot_number, class_name=None, start_time=None):
+        """Choose which class the next booking goes for"""
+        self.day_of_week = day_of_week
         self.slot_number = slot_number
         self.categories_to_skip = categories_to_skip
         self.tap_coordinates = SLOT_COORDINATES.get(slot_number, (516, 1003))  # Default to 2nd slot if invalid
-        self.driver = None
-        self.setup_driver()
-
-    def restart_process(self):
-        logger.error("Email field not found, restarting process...")
-        try:
-            self.driver.quit()
-        except:
-            print("Driver already closed")
-        time.sleep(2)
-        self.__init__(
-            day_of_week=self.day_of_week,
-            categories_to_skip=self.categories_to_skip,
-            slot_number=self.slot_number
-        )
-        self.run_booking_flow()
-
-    def setup_driver(self, max_retries=3):
+        # With a class name and start time the slot is found on screen instead of by coordinates
+        self.class_name = class_name
+        self.start_time = start_time
+
+    def attach_driver(self, driver):
+        """Use an existing Appium session instead of creating a new one"""
+        if self.screenshots is not None:
+            self.screenshots.close()
+        self.driver = trace_driver(driver)
+        self.screenshots = ScreenshotBuffer(self.driver)
+        self.waiter = StepWaiter(self.driver, default_timeout=WAIT_TIME)
+        self.snapshots = SnapshotCache(self.driver)
+        self.finder = ElementFinder(self.driver, self.snapshots)
+        self.slot_finder = SlotFinder(self.driver, self.snapshots)
+        apply_settings(self.driver, self.appium_profile)
+
+    def driver_options(self):
+        """Capabilities for a new session on this booker's device, with the Appium profile applied"""
+        options = UiAutomator2Options()
+        options.platform_name = 'Android'
+        options.device_name = DEVICE_NAME
+        options.udid = self.device.udid
+        options.system_port = self.device.system_port
+        options.automation_name = 'UiAutomator2'
+        options.app_package = APP_PACKAGE
+        options.app_activity = APP_ACTIVITY
+        options.no_reset = True
+        return apply_capabilities(options, self.appium_profile)
+
+    @traced("setup_driver")
+    def setup_driver(self, max_retries=3, clear_app_data=True):
         for attempt in range(max_retries):
             try:
-                options = UiAutomator2Options()
-                options.platform_name = 'Android'
-                options.device_name = DEVICE_NAME
-                options.automation_name = 'UiAutomator2'
-                options.app_package = APP_PACKAGE
-                options.app_activity = APP_ACTIVITY
-                options.no_reset = True
-                
-                # Clear app state and connect to Appium
-                subprocess.run(['adb', 'shell', 'pm', 'clear', APP_PACKAGE])
-                logger.info("Cleared app state")
-                time.sleep(10)
-
-                
-                self.driver = webdriver.Remote(APPIUM_SERVER, options=options)
+                options = self.driver_options()
+
+                # Rooting restarts adbd, so it has to happen before there is a session for it to break
+                if self.session_cache is not None and not self.session_cache.ensure_root():
+                    logger.warning("adb root not available, the login session will not be saved or restored")
+
+                # Reset app state and connect to Appium
+                if clear_app_data:
+                    # The login a pending save was for is about to be replaced
+                    self.session_to_save = False
+                    self.session_restored = self.session_cache is not None and self.session_cache.restore()
+                    if not self.session_restored:
+                        # pm clear returns once the data is gone; the app is launched by the session below
+                        result = self.device.shell(f'pm clear {APP_PACKAGE}')
+                        if "Success" not in result.stdout:
+                            raise Exception(f"pm clear failed: {result.stdout.strip() or result.stderr.strip()}")
+                        logger.info("Cleared app state")
+
+                self.attach_driver(webdriver.Remote(self.device.appium_server, options=options))
                 logger.info("Connected to Appium server")
                 return True
             except Exception as e:
@@ -310,285 +352,431 @@ class GlofoxBooker:
                 if attempt < max_retries - 1:
                     logger.info("Restarting ADB and retrying...")
                     restart_adb()
-                    time.sleep(5)
+                    # Retry as soon as the device and Appium answer again rather than after a fixed pause
+                    wait_for_emulator(self.device.serial, timeout=RETRY_READY_TIMEOUT)
+                    wait_for_appium(self.device.appium_port, timeout=RETRY_READY_TIMEOUT)
                 else:
                     raise Exception("Failed to setup driver after multiple attempts")
 
+    @traced("handle_permission_popup")
     def handle_permission_popup(self):
         try:
-            permission_dialog = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((
-                    AppiumBy.ID,
-                    "com.android.permissioncontroller:id/grant_dialog"
-                ))
+            # The popup appears once the app has loaded, so this also covers app start-up
+            self.waiter.until(
+                self.snapshots.located(PERMISSION_DIALOG),
+                step="permission dialog"
             )
-            allow_button = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((
-                    AppiumBy.ID,
-                    "com.android.permissioncontroller:id/permission_allow_button"
-                ))
+            # The allow button is normally in the same snapshot as the dialog
+            allow_button = self.snapshots.snapshot().find(*PERMISSION_ALLOW) or self.waiter.until(
+                self.snapshots.located(PERMISSION_ALLOW),
+                step="permission allow button",
+                timeout=5
             )
-            allow_button.click()
+            self.snapshots.tap(allow_button)
             logger.info("Handled permission popup")
 
         except TimeoutException:
-            logger.error("No permission popup found, restarting process...")
-            self.restart_process()
-            return  # Add return to prevent continuing with the process
+            logger.error("No permission popup found")
+            raise
+
+    def screen_of(self, snapshot):
+        """Name the known screen a snapshot shows, or None"""
+        screens = {
+            "home": BOOKING_VIEW,
+            "permission": PERMISSION_DIALOG,
+            "search": SEARCH_FIELD,
+            "login": EMAIL_FIELD,
+            "schedule": self.day_locator(),
+        }
+        for name, locator in screens.items():
+            if snapshot.find(*locator) is not None:
+                return name
+        return None
 
+    def detect_screen(self, timeout=None):
+        """Return which known screen the app is showing, or None if none shows up within timeout"""
+        def condition(driver):
+            # One page_source fetch per poll answers all the checks
+            return self.screen_of(self.snapshots.snapshot(refresh=True))
 
-    def search_and_login(self):
+        try:
+            return self.waiter.until(condition, step="detect screen", timeout=timeout)
+        except TimeoutException:
+            return None
+
+    @traced("search_studio")
+    def search_studio(self):
         # Find and interact with search
-        search_field = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.XPATH,
-                "//android.widget.EditText[@text='Find your studio or gym']"
-            ))
+        search_field = self.waiter.until(
+            self.finder.located(SEARCH_FIELD),
+            step="search field"
         )
-        search_field.click()
-        time.sleep(15)
+        self.finder.tap(search_field)
         
-        search_field = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
+        search_field = self.waiter.until(
+            EC.element_to_be_clickable((
                 AppiumBy.CLASS_NAME,
                 "android.widget.EditText"
-            ))
+            )),
+            step="search input"
         )
         search_field.send_keys("[YOUR STUDIO NAME]")
-        time.sleep(15)
-        
 
         # Click search result
         try:
-            result = WebDriverWait(self.driver, WAIT_TIME).until(
-                EC.presence_of_element_located((
+            result = self.waiter.until(
+                self.finder.located((
                     AppiumBy.XPATH,
                     "//android.widget.TextView[@text='[YOUR STUDIO NAME]']"
-                ))
+                )),
+                step="search result",
+                timeout=SEARCH_TIMEOUT
             )
-            result.click()
+            self.finder.tap(result)
             logger.info("Found")
-            time.sleep(5)
         except TimeoutException:
-            logger.error("Not found in search results, restarting process...")
-            self.restart_process()
-            return  # Add return to prevent continuing with the rest of the method
-        
-        # Check for email field and restart if not found
-        try:
-            email_field = WebDriverWait(self.driver, 5).until(  # Shorter timeout for quick check
-                EC.presence_of_element_located((
-                    AppiumBy.ACCESSIBILITY_ID,
-                    "Enter your email address"
-                ))
-            )
-            # If email field is found, proceed with login
-            self.enter_credentials()
-            self.click_login_button()
-        except TimeoutException:
-            self.restart_process()
+            logger.error("Not found in search results")
+            raise
+
+    @traced("log_in")
+    def log_in(self):
+        self.waiter.until(
+            self.finder.located(EMAIL_FIELD),
+            step="email field"
+        )
+        if self.session_restored:
+            logger.info("Restored login session was not accepted, logging in again")
+            self.session_cache.invalidate()
+            self.session_restored = False
+        self.enter_credentials()
+        self.click_login_button()
+        self.session_to_save = self.session_cache is not None
 
+    def search_and_login(self):
+        self.search_studio()
+        self.log_in()
+
+    @traced("enter_credentials")
     def enter_credentials(self):
-        email_field = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.ACCESSIBILITY_ID,
-                "Enter your email address"
-            ))
+        email_field = self.waiter.until(
+            EC.presence_of_element_located(EMAIL_FIELD),
+            step="email input"
         )
         email_field.click()
         email_field.send_keys(EMAIL)
         
-        password_field = WebDriverWait(self.driver, WAIT_TIME).until(
+        password_field = self.waiter.until(
             EC.presence_of_element_located((
                 AppiumBy.ACCESSIBILITY_ID,
                 "Enter your password"
-            ))
+            )),
+            step="password input"
         )
         password_field.click()
         password_field.send_keys(PASSWORD)
         
 
+    @traced("click_login_button")
     def click_login_button(self):
-        login_button = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.ACCESSIBILITY_ID,
-                "Tap here to Login to continue"
-            ))
+        login_locator = (AppiumBy.ACCESSIBILITY_ID, "Tap here to Login to continue")
+        login_button = self.waiter.until(
+            EC.element_to_be_clickable(login_locator),
+            step="login button"
         )
         login_button.click()
-        logger.info(f"Clicked login button")
-
-        time.sleep(3)
+        logger.info("Clicked login button")
 
-    def book_class(self):
-        # Click booking view
-        booking_view = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.XPATH,
-                "//android.view.View[@bounds='[100,210][980,770]']"
-            ))
+        # Login is done once the login screen has gone away
+        self.waiter.until(
+            self.finder.absent(login_locator),
+            step="login"
         )
-        booking_view.click()
-        logger.error(f"Clicked booking view")
+
+    def day_locator(self):
+        return (AppiumBy.XPATH, f"//android.widget.TextView[@text='{self.day_of_week}']")
+
+    @traced("select_day")
+    def select_day(self):
+        # Click booking view, unless the schedule is already open after a recovery
+        if self.snapshots.snapshot(refresh=True).find(*self.day_locator()) is None:
+            booking_view = self.waiter.until(
+                self.finder.located(BOOKING_VIEW),
+                step="booking view"
+            )
+            self.finder.tap(booking_view)
+            logger.info("Clicked booking view")
 
         # Select day
-        day_button = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.XPATH,
-                f"//android.widget.TextView[@text='{self.day_of_week}']"
-            ))
+        day_button = self.waiter.until(
+            self.finder.located(self.day_locator()),
+            step="day button"
         )
-        day_button.click()
+        self.finder.tap(day_button)
         logger.info(f"Clicked on {self.day_of_week}")
 
-        time.sleep(3)
-
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        screenshot_name = f"screenshots/booking_confirmation_{timestamp}.png"
-        self.driver.save_screenshot(screenshot_name)
-        logger.info(f"saved pre-scrolling screenshot as {screenshot_name}")
-        time.sleep(1)
+        # Schedule for the day is loaded once its list is scrollable
+        self.waiter.until(
+            self.finder.located((AppiumBy.XPATH, "//*[@scrollable='true']")),
+            step="schedule list"
+        )
 
-        # Scroll
-        try:
-            for _ in range(self.categories_to_skip):
-                scroll_command = (
-                    'new UiScrollable(new UiSelector().scrollable(true)).setAsVerticalList()'
-                    '.scrollForward()'
-                )
-                self.driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, scroll_command)
-                time.sleep(0.5)
-            logger.info("Performed scroll")
-        except Exception as e:
-            logger.error(f"Scroll error: {str(e)}")
+    @traced("open_slot")
+    def open_slot(self):
+        self.screenshots.capture("pre-scroll")
 
-        time.sleep(2)
+        if self.class_name:
+            # Find the slot by what it says rather than where it used to be
+            slot = self.slot_finder.find(self.day_of_week, self.class_name, self.start_time)
+        else:
+            # Scroll
+            try:
+                # The categories are counted from the top, and the list keeps its position between bookings
+                self.slot_finder.scroll_to_top()
+                for _ in range(self.categories_to_skip):
+                    scroll_command = (
+                        'new UiScrollable(new UiSelector().scrollable(true)).setAsVerticalList()'
+                        '.scrollForward()'
+                    )
+                    # UiScrollable returns once the scroll has finished, no need to sleep
+                    self.driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, scroll_command)
+                logger.info("Performed scroll")
+            except Exception as e:
+                logger.error(f"Scroll error: {str(e)}")
 
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        screenshot_name = f"screenshots/booking_confirmation_{timestamp}.png"
-        self.driver.save_screenshot(screenshot_name)
-        logger.info(f"saved post-scrolling screenshot as {screenshot_name}")
+        self.screenshots.capture("post-scroll")
 
-        # Tap coordinates
-        self.driver.execute_script('mobile: clickGesture', 
-                                {'x': self.tap_coordinates[0], 
-                                'y': self.tap_coordinates[1]})
-        logger.info(f"Tapped on coordinates {self.tap_coordinates}")
+        if self.class_name:
+            self.finder.tap(slot)
+            logger.info(f"Tapped {self.class_name} at {self.start_time}")
+        else:
+            # Tap coordinates
+            self.driver.execute_script('mobile: clickGesture', 
+                                    {'x': self.tap_coordinates[0], 
+                                    'y': self.tap_coordinates[1]})
+            logger.info(f"Tapped on coordinates {self.tap_coordinates}")
 
-        # Complete booking process
+    def book_class(self):
+        self.select_day()
+        self.open_slot()
         self.complete_booking()
-                
+
+    @traced("complete_booking")
     def complete_booking(self):
-        book_button = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.ACCESSIBILITY_ID,
-                "Tap here to undefined"
-            ))
-        )
-        time.sleep(2)
-        book_button.click()
+        book_locator = (AppiumBy.ACCESSIBILITY_ID, "Tap here to undefined")
+        if self.release_at is None:
+            book_button = self.waiter.until(
+                EC.element_to_be_clickable(book_locator),
+                step="book button"
+            )
+            book_button.click()
+        else:
+            # Park on the class screen with the button already found and tap it at release time
+            # The handle stays cached in the finder, so the tap itself is the only RPC at release time
+            self.waiter.until(
+                self.finder.located(book_locator),
+                step="book button"
+            )
+            fire_at(
+                self.release_at,
+                lambda: self.finder.tap_locator(book_locator),
+                clock_offset=self.clock_offset,
+                lead=self.release_lead,
+                keepalive=lambda: self.driver.current_activity
+            )
         logger.info("Clicked booking button")
-        time.sleep(2)
 
-        final_button = WebDriverWait(self.driver, WAIT_TIME).until(
-            EC.presence_of_element_located((
-                AppiumBy.XPATH,
-                "//android.widget.Button[@content-desc='Tap here to boo']/android.view.View"
-            ))
+        final_locator = (
+            AppiumBy.XPATH,
+            "//android.widget.Button[@content-desc='Tap here to boo']/android.view.View"
         )
-        final_button.click()
-        time.sleep(1)
-        final_button.click()
+        final_button = self.waiter.until(
+            self.finder.located(final_locator),
+            step="final booking button"
+        )
+        self.finder.tap(final_button)
+
+        # The first tap does not always register, tap again only if the button is still there
+        try:
+            self.waiter.until(
+                self.finder.absent(final_locator),
+                step="booking confirmation",
+                timeout=FINAL_CONFIRM_TIMEOUT
+            )
+        except TimeoutException:
+            self.finder.tap_locator(final_locator)
         logger.info("Completed final booking step")
 
+    def recover_refind(self):
+        """Drop cached elements and page snapshots so the step looks everything up again"""
+        self.finder.invalidate()
+        self.snapshots.invalidate()
+
+    def recover_back(self):
+        self.driver.back()
+        self.recover_refind()
+
+    def recover_relaunch(self):
+        """Restart the app's activity; app data and the login are kept"""
+        self.driver.terminate_app(APP_PACKAGE)
+        self.driver.activate_app(APP_PACKAGE)
+        self.recover_refind()
+
+    def recover_reset(self):
+        """Last resort: clear the app data and open a new session, as a fresh run would"""
+        self.screenshots.persist("reset")
+        try:
+            self.driver.quit()
+        except Exception:
+            logger.info("Session already ended")
+        self.setup_driver()
+
+    def return_to_schedule(self, max_presses=MAX_BACK_PRESSES):
+        """Press back until the schedule or home screen shows; return whether it got there"""
+        def arrived(snapshot):
+            return self.screen_of(snapshot) in ("schedule", "home")
+
+        snapshot = self.snapshots.snapshot(refresh=True)
+        for _ in range(max_presses):
+            if arrived(snapshot):
+                return True
+            self.recover_back()
+            # Other screens are only judged once they stop changing, so a half-loaded schedule is not backed out of
+            try:
+                snapshot = self.waiter.until(self.snapshots.settled(snapshot.xml_hash, expected=arrived),
+                                             step="screen after back", timeout=BACK_SETTLE_TIMEOUT)
+            except TimeoutException:
+                snapshot = self.snapshots.snapshot(refresh=True)
+        return arrived(snapshot)
+
+    def end_session(self):
+        self.waiter.log_summary()
+        self.screenshots.close()
+        try:
+            self.driver.quit()
+            logger.info("Session ended successfully")
+        except:
+            logger.info("Session already ended")
+        self.save_session()
+
+    def save_session(self):
+        """Save a login made during this session, if there was one; call it between bookings, not during one"""
+        if self.session_to_save:
+            self.session_to_save = False
+            self.session_cache.save()
+
     def run_booking_flow(self):
+        """Run the whole booking and return whether it finished without errors"""
         try:
-            time.sleep(5)  # Initial wait for app load
-            self.handle_permission_popup()
-            self.search_and_login()
-            self.book_class()
+            if self.use_macros and self.release_at is None:
+                run_with_macro(self, secrets={"{EMAIL}": EMAIL, "{PASSWORD}": PASSWORD})
+            else:
+                BookingFlow(self).run()
+            if self.save_screenshots:
+                self.screenshots.persist("success")
+            return True
         except Exception as e:
             logger.error(f"An error occurred: {str(e)}")
+            self.screenshots.persist("failure")
+            return False
         finally:
-            try:
-                self.driver.quit()
-                logger.info("Session ended successfully")
-            except:
-                logger.info("Session already ended")
+            self.end_session()
 
 def stop_emulator():
     """Stop Android Emulator"""
     try:
         logger.info("Stopping Android Emulator...")
-        subprocess.run(['adb', 'emu', 'kill'])
-        time.sleep(2)
-        logger.info("Emulator stopped")
+        EmulatorManager().stop()
     except Exception as e:
         logger.error(f"Error stopping emulator: {str(e)}")
 
-def stop_appium():
-    """Stop Appium server"""
+def stop_appium(port=4723):
+    """Stop the Appium server if this or an earlier run started it"""
     try:
         logger.info("Stopping Appium server...")
-        subprocess.run(['taskkill', '/F', '/IM', 'node.exe'], 
-                     stdout=subprocess.DEVNULL, 
-                     stderr=subprocess.DEVNULL)
-        time.sleep(2)
-        logger.info("Appium server stopped")
+        if supervisor().stop(appium_name(port)):
+            logger.info("Appium server stopped")
+        else:
+            logger.info("Appium server was not started by us, leaving it running")
+        environment().invalidate("appium")
     except Exception as e:
         logger.error(f"Error stopping Appium: {str(e)}")
 
 
-if __name__ == "__main__":
+@traced("run")
+def main(day_of_week="Sat", categories_to_skip=0, slot_number=3, use_api=False, jobs=None, watch_for=None,
+         emulator_profile=DEFAULT_PROFILE, keep_emulator=False, **booker_options):
+    """Bring up the emulator and Appium, book one class (or each of jobs in one session), then shut everything down"""
+    # With watch_for (seconds, 0 for no limit) the class is watched until a spot frees up, then booked.
+    # keep_emulator leaves the emulator running so the next run can reuse it
+    results = None
     try:
         start_time = datetime.now()
         logger.info(f"====== Starting booking script at {start_time} ======")
+        # Independent checks the run needs soon; they run side by side while the rest starts up
+        probes = [("appium", 4723), ("devices",), ("avds", tuple(EMULATOR_COMMAND))]
+        if booker_options.get("check_wifi", True):
+            probes.append(("wifi",))
+        environment().prefetch(*probes)
+
+        # The API needs the class by name; the app is still used if anything about it fails
+        if use_api and not jobs and watch_for is None and booker_options.get("class_name"):
+            api_options = {key: booker_options[key] for key in ("release_at", "clock_offset", "release_lead")
+                           if key in booker_options}
+            if book_via_api(EMAIL, PASSWORD, day_of_week, booker_options["class_name"],
+                            booker_options.get("start_time"), **api_options):
+                logger.info(f"====== Booked through the API in {datetime.now() - start_time} ======")
+                return True
         
         # Start Android Emulator first
-        if not start_android_emulator():
+        boot = start_android_emulator(emulator_profile)
+        if not boot:
             raise Exception("Could not start Android Emulator")
+        if boot == "snapshot":
+            # The snapshot has the app logged in on its home screen; clearing it would throw that away
+            booker_options.setdefault("clear_app_data", False)
             
-        # Give emulator time to fully boot up
-        logger.info("Waiting for emulator to fully boot...")
-        time.sleep(30)  # Wait longer for emulator to fully boot
-        
         # Check Appium status
         if not is_appium_running():
             logger.info("Appium not running, attempting to start...")
             if not start_appium():
                 raise Exception("Could not start Appium server")
-            time.sleep(10)  # Wait for Appium to fully initialize
         
         wake_up_screen()
-        time.sleep(10)  # Additional wait after wake up
+        # Waking can leave the device offline for a moment, so wait for it to come back
+        if wait_for_emulator('emulator-5554') is None:
+            raise Exception("Emulator did not come back after wake up")
         
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 booker = GlofoxBooker(
-                    day_of_week="Sat",
-                    categories_to_skip=0, # 6th
-                    slot_number=3
+                    day_of_week=day_of_week,
+                    categories_to_skip=categories_to_skip,
+                    slot_number=slot_number,
+                    **booker_options
                 )
-                booker.run_booking_flow()
+                if watch_for is not None:
+                    results = watch_availability(booker, max_duration=watch_for or None)
+                elif jobs:
+                    results = run_queue(booker, jobs)
+                else:
+                    results = booker.run_booking_flow()
                 break  # If successful, exit the retry loop
             except Exception as e:
                 logger.error(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+                # Whatever failed may have taken the device or Appium with it; WiFi and AVDs keep their answers
+                environment().invalidate("devices", "appium")
                 if attempt < max_retries - 1:
                     logger.info("Restarting and retrying...")
                     restart_adb()
                     
                     # Check emulator and Appium again before retry
-                    if not start_android_emulator():
+                    if not start_android_emulator(emulator_profile):
                         raise Exception("Could not restart Android Emulator")
-                    time.sleep(30)  # Wait for emulator
                     
                     if not is_appium_running():
                         if not start_appium():
                             raise Exception("Could not restart Appium server")
-                        time.sleep(10)
-                    
-                    time.sleep(5)
                 else:
                     raise  # Re-raise the last exception if all retries failed
 
@@ -601,8 +789,89 @@ if __name__ == "__main__":
         logger.error(f"====== Script failed with error: {str(e)} ======", exc_info=True)
     finally:
         try:
-            stop_emulator()  # Stop the emulator
+            if not keep_emulator:
+                stop_emulator()  # Stop the emulator
             stop_appium()    # Stop the Appium server
             logger.info("====== Script execution ended ======\n")
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error during cleanup: {str(e)}")
+    return results
+
+
+def run_with_retries(max_runs=MAX_RUNS, retry_delay=RETRY_DELAY, jobs=None, **options):
+    """Run main() again after a failed run; of a job queue, only the jobs that did not book are run again"""
+    outcomes = {}
+    remaining = jobs
+    for run in range(1, max_runs + 1):
+        logger.info(f"Run {run} of {max_runs}")
+        results = main(jobs=remaining, **options)
+        if jobs and results is not None:
+            outcomes.update((id(result["job"]), result) for result in results)
+            remaining = [result["job"] for result in results if not result["ok"]]
+            ok = not remaining
+        else:
+            ok = bool(results)
+        if ok or run == max_runs:
+            break
+        # Everything this run started has exited by now; the pause is for whatever made it fail to pass
+        logger.info(f"Run {run} failed, retrying in {retry_delay}s...")
+        time.sleep(retry_delay)
+    if jobs:
+        return ok, [outcomes[id(job)] for job in jobs if id(job) in outcomes]
+    return ok, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book a class, or several in one session")
+    parser.add_argument("jobs", nargs="*", help="Jobs as day:categories_to_skip:slot, day:class name:start time or "
+                                                "day:class name, e.g. Sat:0:3 or 'Sat:Yoga Flow:15:00'")
+    parser.add_argument("--jobs-file", help="JSON list of jobs, or a text file with one job per line")
+    parser.add_argument("--results", help="Write the per-job results to this JSON file")
+    parser.add_argument("--watch", metavar="JOB", help="Wait for a spot in a full class and book it, "
+                                                       "e.g. 'Sat:Yoga Flow:11:00'")
+    parser.add_argument("--watch-hours", type=float, default=0, help="Stop watching after this long (0: no limit)")
+    parser.add_argument("--api", action="store_true", help="Book a single job by class name over the Glofox API, "
+                                                           "using the app only if that fails")
+    parser.add_argument("--macros", action="store_true", help="Replay a recorded run of the job through adb when "
+                                                              "there is one")
+    parser.add_argument("--emulator-profile", default=DEFAULT_PROFILE, choices=sorted(PROFILES),
+                        help="Emulator flags to boot with, e.g. headless for scheduled runs")
+    parser.add_argument("--keep-emulator", action="store_true", help="Leave the emulator running for the next run")
+    parser.add_argument("--appium-profile", default=APPIUM_PROFILE,
+                        help=f"Appium capabilities and settings: {', '.join(SESSION_PROFILES)}, "
+                             f"or several joined with +")
+    parser.add_argument("--runs", type=int, default=MAX_RUNS, help="Run again after a failure, up to this many runs")
+    parser.add_argument("--retry-delay", type=float, default=RETRY_DELAY, help="Seconds to wait between runs")
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL,
+                        help="Seconds between host resource samples (0: do not sample)")
+    args = parser.parse_args()
+    options = {"emulator_profile": args.emulator_profile, "keep_emulator": args.keep_emulator,
+               "appium_profile": args.appium_profile}
+    if args.macros:
+        options["use_macros"] = True
+    jobs = [parse_job(job) for job in args.jobs]
+    if args.jobs_file:
+        jobs += load_jobs(args.jobs_file)
+    if args.api:
+        # The API path books one class by name; a queue or a watch keeps using the app
+        if args.watch or len(jobs) != 1 or not jobs[0].get("class_name"):
+            parser.error("--api needs exactly one job given by class name, e.g. 'Sat:Yoga Flow:15:00'")
+        options.update(jobs.pop(), use_api=True)
+
+    # CPU, memory and I/O of the host, Appium, the emulator and the device, summarised per step at the end
+    sampler = ResourceSampler(package=APP_PACKAGE, interval=args.sample_interval or SAMPLE_INTERVAL)
+    if args.sample_interval > 0:
+        sampler.start()
+    try:
+        if args.watch:
+            ok = main(watch_for=args.watch_hours * 3600, **parse_job(args.watch), **options)
+        else:
+            ok, results = run_with_retries(args.runs, args.retry_delay, jobs=jobs or None, **options)
+            if args.results and jobs:
+                with open(args.results, "w") as f:
+                    json.dump(results, f, indent=2)
+    finally:
+        if sampler.started:
+            sampler.stop()
+            sampler.dump()
+    sys.exit(0 if ok else 1)
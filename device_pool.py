@@ -0,0 +1,114 @@
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from booking_queue import parse_job
+from demo import Device, GlofoxBooker, appium_name, is_appium_running, logger, start_appium
+from emulator import EmulatorManager
+from supervisor import supervisor
+from tracing import flush_spans, new_run
+
+# Emulators take even console ports from 5554; Appium and UiAutomator2 ports just count up
+FIRST_EMULATOR_PORT = 5554
+FIRST_APPIUM_PORT = 4723
+FIRST_SYSTEM_PORT = 8200
+
+# Set in each worker process by _claim_device
+_worker_device = None
+
+
+def make_devices(count, avds=None):
+    """Build a pool of devices with their own serials and ports, and their own AVDs if given"""
+    # An AVD can only run once at a time, so each device needs its own to boot one that is not running
+    avds = list(avds or [])
+    return [
+        Device(
+            serial=f"emulator-{FIRST_EMULATOR_PORT + 2 * i}",
+            appium_port=FIRST_APPIUM_PORT + i,
+            system_port=FIRST_SYSTEM_PORT + i,
+            avd=avds[i] if i < len(avds) else None,
+        )
+        for i in range(count)
+    ]
+
+
+def _claim_device(devices):
+    """Give this worker process a device of its own for its whole lifetime"""
+    global _worker_device
+    _worker_device = devices.get()
+
+
+def _prepare_device(device):
+    """Boot the device's emulator (or reuse it) and start its Appium; return the Appium server it started, if any"""
+    if EmulatorManager(device.serial, avd=device.avd).start() is None:
+        raise Exception(f"Could not start {device.serial}")
+    if is_appium_running(device.appium_port):
+        return None
+    if not start_appium(device.appium_port):
+        raise Exception(f"Could not start Appium on port {device.appium_port}")
+    return appium_name(device.appium_port)
+
+
+def _run_job(job, booker_factory, prepare_devices):
+    device = _worker_device
+    result = {"job": job, "device": device.serial, "ok": False, "error": None, "started": None}
+    start = time.monotonic()
+    new_run()
+    try:
+        if prepare_devices:
+            result["started"] = _prepare_device(device)
+        booker = booker_factory(device=device, **job)
+        result["ok"] = bool(booker.run_booking_flow())
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.monotonic() - start
+    # Pool workers leave through os._exit, which skips atexit, so write this job's spans out now
+    flush_spans()
+    return result
+
+
+def run_pool(jobs, devices, booker_factory=GlofoxBooker, prepare_devices=True, max_workers=None):
+    """Run booking jobs in parallel, one worker process per device, and collect the results"""
+    # Workers spend most of their time waiting on their device, so one per device even on few cores
+    workers = min(len(devices), max_workers or len(devices))
+    free_devices = multiprocessing.Queue()
+    for device in devices[:workers]:
+        free_devices.put(device)
+
+    logger.info(f"Running {len(jobs)} booking jobs on {workers} devices")
+    results = []
+    started = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_claim_device,
+                                 initargs=(free_devices,)) as executor:
+            futures = [executor.submit(_run_job, job, booker_factory, prepare_devices) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                if result["started"]:
+                    started.append(result["started"])
+                status = "booked" if result["ok"] else f"failed ({result['error']})"
+                logger.info(f"{result['device']}: {result['job']} {status} in {result['elapsed']:.1f}s")
+                results.append(result)
+    finally:
+        # Workers record what they start in the supervisor's state file, so it can be stopped from here
+        for name in started:
+            supervisor().stop(name)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book several classes at once across a pool of emulators")
+    parser.add_argument("jobs", nargs="+", help="Jobs as day:skip:slot or day:class name:start time, e.g. Sat:0:3")
+    parser.add_argument("--devices", type=int, default=2, help="Number of emulators in the pool")
+    parser.add_argument("--avds", nargs="+", help="AVD to boot for each device that is not already running")
+    parser.add_argument("--results", help="Write the collected results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_pool([parse_job(job) for job in args.jobs], make_devices(args.devices, args.avds))
+    booked = sum(1 for result in results if result["ok"])
+    logger.info(f"Booked {booked}/{len(results)} classes")
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(results, f, indent=2)
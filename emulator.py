@@ -0,0 +1,234 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+from adb_client import AdbError, adb_client
+from environment import environment
+from log_setup import setup_logging
+from readiness import EMULATOR_BOOT_TIMEOUT, wait_for_emulator
+from supervisor import supervisor as process_supervisor
+
+logger = logging.getLogger(__name__)
+
+EMULATOR_COMMAND = ["emulator.exe"]
+AVD_HOME = os.environ.get("ANDROID_AVD_HOME", os.path.join(os.path.expanduser("~"), ".android", "avd"))
+# Quickboot snapshot saved with the app logged in and on its home screen
+HOME_SNAPSHOT = "booking_home"
+BOOT_TIMES_FILE = os.path.join("logs", "boot_times.jsonl")
+STOP_TIMEOUT = 10
+
+# Emulator flags per boot profile; the headless ones suit Task Scheduler runs with nobody watching
+PROFILES = {
+    "window": [],
+    "headless": ["-no-window", "-no-audio", "-no-boot-anim", "-gpu", "swiftshader_indirect"],
+    "headless-host-gpu": ["-no-window", "-no-audio", "-no-boot-anim", "-gpu", "host"],
+}
+DEFAULT_PROFILE = "window"
+
+
+def record_boot_time(avd, profile, mode, seconds, path=BOOT_TIMES_FILE):
+    """Append one boot-to-ready time, so profiles can be compared across runs"""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps({"time": time.time(), "avd": avd, "profile": profile, "mode": mode,
+                                "seconds": round(seconds, 2)}) + "\n")
+    except OSError as e:
+        logger.error(f"Error recording boot time: {str(e)}")
+
+
+def boot_time_report(path=BOOT_TIMES_FILE):
+    """Boot times grouped by profile and how the emulator came up: [(profile, mode, count, median, best)]"""
+    times = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                times.setdefault((entry["profile"], entry["mode"]), []).append(entry["seconds"])
+    except FileNotFoundError:
+        return []
+    return [(profile, mode, len(seconds), statistics.median(seconds), min(seconds))
+            for (profile, mode), seconds in sorted(times.items())]
+
+
+class EmulatorManager:
+    """Start, reuse and stop one emulator instance, booting from a quickboot snapshot when there is one"""
+
+    def __init__(self, serial="emulator-5554", avd=None, profile=DEFAULT_PROFILE, snapshot=HOME_SNAPSHOT,
+                 command=None, avd_home=None, adb=None, boot_times_file=BOOT_TIMES_FILE, supervisor=None):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown emulator profile {profile}, expected one of {', '.join(PROFILES)}")
+        self.serial = serial
+        self.port = int(serial.rsplit("-", 1)[1])
+        self.avd = avd
+        self.profile = profile
+        self.snapshot = snapshot
+        self.command = command or EMULATOR_COMMAND
+        self.avd_home = avd_home or AVD_HOME
+        self.adb = adb or adb_client()
+        self.boot_times_file = boot_times_file
+        self.supervisor = supervisor or process_supervisor()
+
+    def list_avds(self):
+        avds = environment().get("avds", tuple(self.command))
+        logger.info(f"Found AVDs: {avds}")
+        return avds
+
+    def avd_name(self):
+        if self.avd is None:
+            avds = self.list_avds()
+            if not avds:
+                raise Exception("No AVD found")
+            self.avd = avds[0]
+        return self.avd
+
+    def avd_dir(self):
+        return os.path.join(self.avd_home, f"{self.avd_name()}.avd")
+
+    def has_snapshot(self, name=None):
+        name = name or self.snapshot
+        return bool(name) and os.path.isdir(os.path.join(self.avd_dir(), "snapshots", name))
+
+    def is_healthy(self):
+        """Whether a running instance is online, booted, answering and running our AVD"""
+        try:
+            if self.adb.devices().get(self.serial) != "device":
+                return False
+            if self.adb.shell(self.serial, "getprop sys.boot_completed", timeout=3).stdout.strip() != "1":
+                logger.info(f"{self.serial} is attached but has not finished booting")
+                return False
+            running = self.adb.emu(self.serial, "avd name").splitlines()
+            if self.avd is not None and self.avd not in running:
+                logger.info(f"{self.serial} is running {running[:1]}, not {self.avd}")
+                return False
+            return True
+        except (AdbError, OSError) as e:
+            logger.warning(f"Health check of {self.serial} failed: {str(e)}")
+            return False
+
+    def boot_command(self, snapshot=True):
+        command = self.command + ["-avd", self.avd_name(), "-port", str(self.port)] + PROFILES[self.profile]
+        if snapshot and self.has_snapshot():
+            # Never save over the snapshot on exit, so every run starts from the same home screen
+            command += ["-snapshot", self.snapshot, "-no-snapshot-save"]
+        elif not snapshot:
+            command += ["-no-snapshot-load"]
+        return command
+
+    def _clear_stale_locks(self):
+        """A killed emulator leaves its .lock files behind, which stops the AVD from starting again"""
+        for path in glob.glob(os.path.join(self.avd_dir(), "*.lock")):
+            try:
+                if os.path.isdir(path):
+                    for inner in glob.glob(os.path.join(path, "*")):
+                        os.remove(inner)
+                    os.rmdir(path)
+                else:
+                    os.remove(path)
+                logger.info(f"Removed lock file: {path}")
+            except OSError as e:
+                logger.error(f"Error removing lock file {path}: {str(e)}")
+
+    def start(self, snapshot=True, reuse=True, timeout=EMULATOR_BOOT_TIMEOUT):
+        """Bring the emulator up; return how it came up ("reused", "snapshot" or "cold") or None if it did not boot"""
+        start = time.monotonic()
+        if reuse and self.is_healthy():
+            logger.info(f"Reusing the running emulator {self.serial}")
+            record_boot_time(self.avd or "", self.profile, "reused", time.monotonic() - start, self.boot_times_file)
+            return "reused"
+
+        if not self.stop():
+            # A healthy one would have been reused above, so this one is still booting, runs another AVD or
+            # was not to be reused; killing it is not ours to do, and a second one cannot take its port
+            raise Exception(f"{self.serial} is taken by an emulator this script did not start and cannot use; "
+                            f"stop it or pick another serial")
+        self._clear_stale_locks()
+        # Make sure the ADB server is up (started if needed, kept if already running)
+        self.adb.version()
+        command = self.boot_command(snapshot)
+        mode = "snapshot" if "-snapshot" in command else "cold"
+        logger.info(f"Starting emulator: {' '.join(command)}")
+        self.supervisor.start(self.serial, command, port=self.port)
+        environment().invalidate("devices")
+
+        if wait_for_emulator(self.serial, timeout, adb=self.adb) is None:
+            logger.error("Failed to start emulator")
+            return None
+        elapsed = time.monotonic() - start
+        logger.info(f"Emulator {self.avd} ({self.profile}, {mode}) ready in {elapsed:.1f}s")
+        record_boot_time(self.avd, self.profile, mode, elapsed, self.boot_times_file)
+        return mode
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Shut down the instance at our serial if we started it; return whether nothing is left running there"""
+        if not self.supervisor.is_running(self.serial):
+            try:
+                if self.serial in self.adb.devices():
+                    logger.warning(f"Emulator {self.serial} was not started by us, leaving it running")
+                    return False
+            except (AdbError, OSError) as e:
+                logger.warning(f"Could not list devices: {str(e)}")
+            # Drops a record whose process already exited
+            self.supervisor.stop(self.serial, timeout)
+            return True
+        try:
+            if self.serial in self.adb.devices():
+                self.adb.emu(self.serial, "kill")
+                # The server drops the device from its list once the emulator has shut down
+                if self.adb.wait_for(self.serial, None, timeout=timeout):
+                    logger.info(f"Emulator {self.serial} stopped")
+        except (AdbError, OSError) as e:
+            logger.warning(f"Console kill of {self.serial} failed: {str(e)}")
+        # Usually already gone after the console kill; otherwise terminated, then killed, with its qemu child
+        self.supervisor.stop(self.serial, timeout)
+        environment().invalidate("devices")
+        return True
+
+    def save_snapshot(self, name=None):
+        """Save the running emulator's state as a quickboot snapshot to boot from later"""
+        name = name or self.snapshot
+        reply = self.adb.emu(self.serial, f"avd snapshot save {name}")
+        if "KO" in reply:
+            raise Exception(f"Saving snapshot {name} failed: {reply.strip()}")
+        logger.info(f"Saved snapshot {name} of {self.serial}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the booking emulator and its quickboot snapshot")
+    parser.add_argument("command", choices=["start", "stop", "snapshot", "times"])
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=sorted(PROFILES))
+    parser.add_argument("--avd")
+    parser.add_argument("--serial", default="emulator-5554")
+    parser.add_argument("--cold", action="store_true", help="Ignore the snapshot and boot from scratch")
+    args = parser.parse_args()
+
+    if args.command == "times":
+        print(f"{'profile':<18} {'mode':<9} {'runs':>5} {'median s':>9} {'best s':>7}")
+        for profile, mode, count, median, best in boot_time_report():
+            print(f"{profile:<18} {mode:<9} {count:>5} {median:>9.1f} {best:>7.1f}")
+        sys.exit(0)
+
+    setup_logging()
+    manager = EmulatorManager(args.serial, avd=args.avd, profile=args.profile)
+    if args.command == "start":
+        sys.exit(0 if manager.start(snapshot=not args.cold) else 1)
+    elif args.command == "stop":
+        manager.stop()
+    else:
+        # Boot, let the flow log in and reach the app's home screen, then save that state
+        from booking_flow import LOGGED_IN, BookingFlow
+        from demo import Device, GlofoxBooker, is_appium_running, start_appium
+
+        if not manager.start(snapshot=False, reuse=False):
+            sys.exit("Could not start the emulator")
+        if not is_appium_running() and not start_appium():
+            sys.exit("Could not start Appium server")
+        booker = GlofoxBooker(device=Device(args.serial), reuse_session=False)
+        BookingFlow(booker).run(until=LOGGED_IN)
+        booker.end_session()
+        manager.save_snapshot()
@@ -0,0 +1,139 @@
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adb_client import adb_client
+from readiness import appium_status
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds each probe's answer stays good for; the AVD list only changes when someone creates an AVD
+PROBE_TTLS = {
+    "wifi": 60,
+    "avds": 3600,
+    "devices": 2,
+    "appium": 5,
+}
+
+_environment = None
+_environment_lock = threading.Lock()
+
+
+def environment():
+    """Process-wide environment state, so retries share the answers of earlier probes"""
+    global _environment
+    with _environment_lock:
+        if _environment is None:
+            _environment = Environment()
+        return _environment
+
+
+def probe_wifi():
+    result = subprocess.run(['netsh', 'wlan', 'show', 'interfaces'], capture_output=True, text=True)
+    return "State                  : connected" in result.stdout
+
+
+def probe_avds(command):
+    result = subprocess.run(list(command) + ["-list-avds"], capture_output=True, text=True)
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+
+def probe_devices():
+    return adb_client().devices()
+
+
+def probe_appium(port):
+    from requests.exceptions import ConnectionError
+    try:
+        return appium_status(port)
+    except ConnectionError:
+        return False
+
+
+class Environment:
+    """Cached answers to environment probes, each kept for its own TTL and dropped when it may be wrong"""
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(PROBE_TTLS, **(ttls or {}))
+        self.probes = {"wifi": probe_wifi, "avds": probe_avds, "devices": probe_devices, "appium": probe_appium}
+        self.probe_counts = {}
+        self._cache = {}  # (name, args) -> (value, expires at)
+        self._inflight = {}  # (name, args) -> Event set when that probe finishes
+        self._generations = {}  # name -> times invalidated, so a probe that overlapped one is not cached
+        self._lock = threading.Lock()
+
+    def _claim(self, key, fresh, wait=True):
+        """Return (True, answer) if there is a good one, else (False, event) once this caller should probe"""
+        while True:
+            with self._lock:
+                cached = self._cache.get(key)
+                if not fresh and cached is not None and cached[1] > time.monotonic():
+                    return True, cached[0]
+                running = self._inflight.get(key)
+                if running is None:
+                    running = self._inflight[key] = threading.Event()
+                    return False, running
+            if not wait:
+                return True, None
+            # Someone else is already asking the same question; their answer is as fresh as ours would be
+            running.wait()
+            fresh = False
+
+    def _run(self, key, running):
+        name, args = key
+        generation = self._generations.get(name, 0)
+        try:
+            with span(f"probe {name}"):
+                value = self.probes[name](*args)
+            with self._lock:
+                if self._generations.get(name, 0) == generation:
+                    self._cache[key] = (value, time.monotonic() + self.ttls[name])
+                self.probe_counts[name] = self.probe_counts.get(name, 0) + 1
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            running.set()
+
+    def get(self, name, *args, fresh=False):
+        """Return the probe's answer, running it only if the cached one expired or fresh is set"""
+        done, result = self._claim((name, args), fresh)
+        return result if done else self._run((name, args), result)
+
+    def gather(self, *requests):
+        """Run independent probes at once, e.g. gather(("wifi",), ("appium", 4723)); returns their answers"""
+        with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            futures = [executor.submit(self.get, *request) for request in requests]
+        results = []
+        for request, future in zip(requests, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Probe {request[0]} failed: {str(e)}")
+                results.append(None)
+        return results
+
+    def prefetch(self, *requests):
+        """Start probes in the background; later get() calls find them done or wait for them"""
+        for name, *args in requests:
+            done, running = self._claim((name, tuple(args)), False, wait=False)
+            if not done:
+                threading.Thread(target=self._prefetch, args=((name, tuple(args)), running), daemon=True).start()
+
+    def _prefetch(self, key, running):
+        try:
+            self._run(key, running)
+        except Exception as e:
+            logger.warning(f"Probe {key[0]} failed: {str(e)}")
+
+    def invalidate(self, *names):
+        """Forget the answers of these probes (all of them if none given), e.g. after a restart or a failure"""
+        with self._lock:
+            for name in names or self.probes:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            for key in list(self._cache):
+                if not names or key[0] in names:
+                    del self._cache[key]
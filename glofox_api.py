@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = '[YOUR GLOFOX API URL]'
+BRANCH_ID = '[YOUR BRANCH ID]'
+TOKEN_FILE = os.path.join("cache", "api_token.json")
+# Tokens are refreshed after this long even if the server has not rejected them yet
+TOKEN_MAX_AGE = 12 * 3600
+REQUEST_TIMEOUT = 10
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+class ApiError(Exception):
+    pass
+
+
+class GlofoxApiBooker:
+    """Book a class through the Glofox HTTP API instead of driving the app"""
+
+    def __init__(self, email, password, base_url=API_BASE_URL, branch_id=BRANCH_ID, token_file=TOKEN_FILE):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.email = email
+        self.password = password
+        self.base_url = base_url.rstrip("/")
+        self.branch_id = branch_id
+        self.token_file = token_file
+        # One keep-alive connection is reused for login, listing and booking
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.token = self._load_token()
+
+    def _load_token(self):
+        try:
+            with open(self.token_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("email") != self.email or time.time() - cached.get("saved_at", 0) > TOKEN_MAX_AGE:
+            return None
+        return cached.get("token")
+
+    def _save_token(self):
+        try:
+            os.makedirs(os.path.dirname(self.token_file) or ".", exist_ok=True)
+            with open(self.token_file, "w") as f:
+                json.dump({"email": self.email, "token": self.token, "saved_at": time.time()}, f)
+        except OSError as e:
+            logger.error(f"Error saving API token: {str(e)}")
+
+    def _request(self, method, path, retry_login=True, **kwargs):
+        if self.token is None:
+            self.login()
+        headers = {"Authorization": f"Bearer {self.token}"}
+        with span(f"api:{method} {path}"):
+            response = self.session.request(method, self.base_url + path, headers=headers,
+                                            timeout=REQUEST_TIMEOUT, **kwargs)
+        if response.status_code == 401 and retry_login:
+            logger.info("API token rejected, logging in again")
+            self.token = None
+            return self._request(method, path, retry_login=False, **kwargs)
+        if response.status_code >= 400:
+            raise ApiError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    @traced("api login")
+    def login(self):
+        with span("api:POST /2.0/login"):
+            response = self.session.post(
+                f"{self.base_url}/2.0/login",
+                json={"branch_id": self.branch_id, "login": self.email, "password": self.password},
+                timeout=REQUEST_TIMEOUT,
+            )
+        if response.status_code >= 400:
+            raise ApiError(f"Login returned {response.status_code}: {response.text[:200]}")
+        token = response.json().get("token")
+        if not token:
+            raise ApiError("Login response had no token")
+        self.token = token
+        self._save_token()
+        logger.info("Logged in to the API")
+
+    def list_classes(self, day_of_week):
+        """Return the classes on the next day_of_week (today counts) as dicts with id, name and start"""
+        day = next_date(day_of_week)
+        start = datetime.combine(day, datetime.min.time())
+        data = self._request("GET", "/2.0/events", params={
+            "branch_id": self.branch_id,
+            "start": int(start.timestamp()),
+            "end": int((start + timedelta(days=1)).timestamp()) - 1,
+        })
+        classes = []
+        for event in data.get("data", []):
+            classes.append({
+                "id": event["_id"],
+                "name": event.get("name", ""),
+                "start": datetime.fromtimestamp(event["time_start"]).strftime("%H:%M"),
+            })
+        return classes
+
+    def find_class(self, day_of_week, class_name, start_time=None):
+        """Return the id of the class, the first of that name on the day if no start time is given"""
+        for event in self.list_classes(day_of_week):
+            if event["name"] != class_name:
+                continue
+            if start_time is None or event["start"].lstrip("0") == start_time.lstrip("0"):
+                return event["id"]
+        raise ApiError(f"No {class_name} class{f' at {start_time}' if start_time else ''} on {day_of_week}")
+
+    @traced("api book")
+    def book(self, class_id):
+        data = self._request("POST", "/2.0/bookings", json={"model": "event", "model_id": class_id})
+        if not data.get("success", True):
+            raise ApiError(f"Booking rejected: {data.get('message', data)}")
+        logger.info(f"Booked class {class_id} through the API")
+        return data
+
+    def has_booking(self, class_id):
+        """Whether the member already holds a booking for the class"""
+        data = self._request("GET", "/2.0/bookings", params={"branch_id": self.branch_id, "model_id": class_id})
+        return any(booking.get("event_id") == class_id for booking in data.get("data", []))
+
+
+def next_date(day_of_week, today=None):
+    today = today or datetime.now().date()
+    return today + timedelta(days=(DAYS.index(day_of_week) - today.weekday()) % 7)
+
+
+def book_via_api(email, password, day_of_week, class_name, start_time, release_at=None,
+                 clock_offset=0.0, release_lead=0.0, **api_options):
+    """Try to book over the API; return False if it did not book, so the caller can use the app instead"""
+    try:
+        booker = GlofoxApiBooker(email, password, **api_options)
+        class_id = booker.find_class(day_of_week, class_name, start_time)
+    except Exception as e:
+        logger.error(f"API booking failed, falling back to the app: {str(e)}")
+        return False
+    try:
+        if release_at is None:
+            booker.book(class_id)
+        else:
+            from timed_trigger import fire_at
+
+            # Login and the class lookup are done, so only the booking request is left at release time
+            fire_at(release_at, lambda: booker.book(class_id), clock_offset=clock_offset, lead=release_lead)
+        return True
+    except Exception as e:
+        # A timeout or 5xx can come after the server took the booking; booking again in the app could double-book
+        logger.warning(f"Booking request failed ({str(e)}), checking whether it went through")
+    try:
+        if booker.has_booking(class_id):
+            logger.info(f"Class {class_id} was booked despite the error")
+            return True
+    except Exception as e:
+        logger.error(f"Could not check for the booking: {str(e)}")
+    logger.error("API booking failed, falling back to the app")
+    return False
@@ -0,0 +1,166 @@
+import logging
+import re
+from functools import lru_cache
+
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+from snapshot import SnapshotNode
+
+logger = logging.getLogger(__name__)
+
+# One XPath step: class (or *) with at most one [@attribute='value'] predicate
+XPATH_STEP = re.compile(r"([\w.]+|\*)(?:\[@([\w-]+)='([^']*)'\])?")
+# UiSelector methods for the attributes UiAutomator can match without dumping the hierarchy
+UISELECTOR_METHODS = {
+    "text": "text",
+    "content-desc": "description",
+    "resource-id": "resourceId",
+    "scrollable": "scrollable",
+    "clickable": "clickable",
+}
+BOOLEAN_ATTRIBUTES = ("scrollable", "clickable")
+# {compiled (by, value): locator it was compiled from}, so a found element can be looked up in a snapshot
+_ORIGINALS = {}
+
+
+class CompiledLocator:
+    """A locator rewritten to the cheapest strategy that finds the same element"""
+
+    def __init__(self, original, by, value, native):
+        self.original = original
+        self.by = by
+        self.value = value
+        # False when only a hierarchy dump can answer it (e.g. bounds), so it is resolved from a snapshot
+        self.native = native
+        _ORIGINALS[(by, value)] = original
+
+    @property
+    def locator(self):
+        return self.by, self.value
+
+    def __repr__(self):
+        return f"CompiledLocator({self.by}={self.value!r}, native={self.native})"
+
+
+def quote(value):
+    """Quote a string for use inside a UiSelector expression"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _uiselector(class_name, attribute, value):
+    selector = "new UiSelector()"
+    if class_name != "*":
+        selector += f".className({quote(class_name)})"
+    if attribute is not None:
+        method = UISELECTOR_METHODS[attribute]
+        argument = value if attribute in BOOLEAN_ATTRIBUTES else quote(value)
+        selector += f".{method}({argument})"
+    return selector
+
+
+def _parse_xpath(xpath):
+    """Split //a[@x='1']//b into steps, or None if it uses anything beyond that"""
+    if not xpath.startswith("//"):
+        return None
+    steps = []
+    # A single / only matches direct children, which childSelector cannot express, so it is left unparsed
+    for part in xpath[2:].split("//"):
+        match = XPATH_STEP.fullmatch(part)
+        if not match:
+            return None
+        steps.append(match.groups())
+    return steps
+
+
+@lru_cache(maxsize=None)
+def compile_locator(locator):
+    """Rewrite an XPath locator into accessibility id, resource id or UiSelector where possible"""
+    by, value = locator
+    if by != AppiumBy.XPATH:
+        return CompiledLocator(locator, by, value, native=True)
+
+    steps = _parse_xpath(value)
+    if steps is None or any(attribute is not None and attribute not in UISELECTOR_METHODS
+                            for _, attribute, _ in steps):
+        return CompiledLocator(locator, by, value, native=False)
+
+    if len(steps) == 1:
+        class_name, attribute, attribute_value = steps[0]
+        if class_name == "*" and attribute == "content-desc":
+            return CompiledLocator(locator, AppiumBy.ACCESSIBILITY_ID, attribute_value, native=True)
+        if class_name == "*" and attribute == "resource-id":
+            return CompiledLocator(locator, AppiumBy.ID, attribute_value, native=True)
+
+    # Later steps become nested childSelector calls, which UiAutomator matches as descendants like //
+    selector = None
+    for class_name, attribute, attribute_value in reversed(steps):
+        step = _uiselector(class_name, attribute, attribute_value)
+        selector = step if selector is None else f"{step}.childSelector({selector})"
+    return CompiledLocator(locator, AppiumBy.ANDROID_UIAUTOMATOR, selector, native=True)
+
+
+def original_locator(locator):
+    """The locator a compiled one was made from, which a snapshot can resolve; unknown ones come back as they are"""
+    return _ORIGINALS.get(tuple(locator), tuple(locator))
+
+
+class ElementFinder:
+    """Find elements with compiled locators and reuse handles while the screen is unchanged"""
+
+    def __init__(self, driver, snapshots):
+        self.driver = driver
+        self.snapshots = snapshots
+        self._handles = {}
+
+    def find(self, locator):
+        """Return a cached or freshly found element, or a snapshot node for locators the device can't run"""
+        if locator in self._handles:
+            return self._handles[locator]
+
+        compiled = compile_locator(locator)
+        if compiled.native:
+            target = self.driver.find_element(*compiled.locator)
+        else:
+            target = self.snapshots.snapshot(refresh=True).find(*locator)
+            if target is None:
+                raise NoSuchElementException(f"{locator[1]} not on screen")
+        self._handles[locator] = target
+        return target
+
+    def located(self, locator):
+        """StepWaiter condition that finds the locator with its cheapest strategy"""
+        def condition(driver):
+            self._handles.pop(locator, None)  # Each poll has to look at the device again
+            return self.find(locator)
+        return condition
+
+    def absent(self, locator):
+        """StepWaiter condition: the locator no longer matches anything"""
+        def condition(driver):
+            self.invalidate()
+            compiled = compile_locator(locator)
+            if compiled.native:
+                return not self.driver.find_elements(*compiled.locator)
+            return self.snapshots.snapshot(refresh=True).find(*locator) is None
+        return condition
+
+    def tap(self, target):
+        """Tap an element handle or snapshot node, then forget handles from the old screen"""
+        if isinstance(target, SnapshotNode):
+            self.snapshots.tap(target)
+        else:
+            target.click()
+            self.snapshots.invalidate()
+        self.invalidate()
+
+    def tap_locator(self, locator):
+        """Tap a locator through its cached handle, finding it again if the handle went stale"""
+        try:
+            self.tap(self.find(locator))
+        except StaleElementReferenceException:
+            self._handles.pop(locator, None)
+            self.tap(self.find(locator))
+
+    def invalidate(self):
+        self._handles.clear()
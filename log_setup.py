@@ -0,0 +1,164 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import shutil
+from datetime import date, datetime
+
+from tracing import current_run, current_span
+
+LOG_DIR = "logs"
+LOG_NAME = "booking_log"
+# Rolled over at this size or at midnight, whichever comes first; old files are gzipped
+LOG_MAX_BYTES = 10 * 1024 * 1024
+# Rolled files kept; a week of daily runs fits easily
+LOG_BACKUP_COUNT = 30
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_listener_pid = None
+_queue_handler = None
+_settings = None
+_device = None
+
+
+def set_device(serial):
+    """Tag later records with the device they are about"""
+    global _device
+    _device = serial
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Roll the file over when it reaches max_bytes or the date changes, gzipping the old one"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _gzip_rotator
+        self.day = self._file_day()
+
+    def _file_day(self):
+        try:
+            return date.fromtimestamp(os.path.getmtime(self.baseFilename))
+        except OSError:
+            return date.today()
+
+    def shouldRollover(self, record):
+        if date.today() != self.day and os.path.exists(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.day = date.today()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the run, device and step the record came from"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run": getattr(record, "run", None),
+            "device": getattr(record, "device", None),
+            "step": getattr(record, "step", None),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the writer thread, capturing the caller's run, device and step on the way"""
+
+    def prepare(self, record):
+        # Only the cheap parts happen on the caller's thread; formatting and disk writes do not
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.run = current_run()
+        record.device = _device
+        record.step = current_span()
+        return record
+
+
+def log_file(directory=LOG_DIR, worker=None):
+    # Pool workers each get their own file, so two processes never rotate the same one
+    if worker is None:
+        process = multiprocessing.current_process().name
+        worker = None if process == "MainProcess" else process
+    suffix = f"_{worker}" if worker else ""
+    return os.path.join(directory, f"{LOG_NAME}{suffix}.jsonl")
+
+
+def setup_logging(level=logging.INFO, directory=LOG_DIR, worker=None):
+    """Send records through a queue to a background thread that writes the console and the JSON log"""
+    global _listener, _listener_pid, _queue_handler, _settings
+    if _listener is not None and _listener_pid == os.getpid():
+        return _listener
+
+    os.makedirs(directory, exist_ok=True)
+    file_handler = DailyRotatingFileHandler(log_file(directory, worker))
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    _queue_handler = ContextQueueHandler(records)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(records, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    if _settings is None:
+        # Drains whatever is still queued before the process exits
+        atexit.register(stop_logging)
+    _settings = (level, directory)
+    return _listener
+
+
+def stop_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _queue_handler = None
+
+
+def _after_fork():
+    """A forked child (a pool worker) inherits the queue handler but not the thread that empties the queue"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    # The parent's handlers and its file are left as they are; the child gets its own of each
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = _queue_handler = None
+    # multiprocessing's names are not set yet at this point, so the file is named after the pid
+    setup_logging(*_settings, worker=f"pid{os.getpid()}")
+    # Workers leave through os._exit, which skips atexit; multiprocessing still runs its finalizers
+    multiprocessing.util.Finalize(None, stop_logging, exitpriority=0)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
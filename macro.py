@@ -0,0 +1,388 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shlex
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webelement import WebElement
+
+from adb_client import adb_client
+from booking_flow import BookingFlow
+from locators import original_locator
+from snapshot import PageSnapshot
+
+logger = logging.getLogger(__name__)
+
+MACRO_DIR = os.path.join("cache", "macros")
+# Longest pause kept between two inputs of a batch. Inputs in one batch stay on the same screen, so the
+# recorded gap beyond this is the flow's own Appium calls; a screen change is checked at the next segment
+MAX_SETTLE = 0.3
+# A segment's screen gets this multiple of the time it took to show when recorded, at least SEGMENT_MIN_TIMEOUT
+SEGMENT_TIMEOUT_FACTOR = 3
+SEGMENT_MIN_TIMEOUT = 5
+END_TIMEOUT = 5
+EDIT_TEXT = "android.widget.EditText"
+
+
+def fingerprint(snapshot):
+    """Identify a screen by its structure and labels, leaving out typed text and what is in scrolling lists"""
+    parts = []
+    in_list = set()
+    for element in snapshot.root.iter():
+        node = snapshot.nodes.get(element)
+        if node is None or element in in_list:
+            continue
+        if element.get("scrollable") == "true":
+            in_list.update(element.iter())
+        text = "" if node.class_name == EDIT_TEXT else node.text
+        parts.append((node.class_name, node.resource_id, node.content_desc, text))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def _node_at(snapshot, x, y):
+    hit = None
+    for node in snapshot.nodes.values():
+        # Nodes are in document order, so the last one containing the point is the innermost
+        if node.bounds and node.bounds[0] <= x <= node.bounds[2] and node.bounds[1] <= y <= node.bounds[3]:
+            hit = node
+    return hit
+
+
+def anchor_at(snapshot, x, y):
+    """Labels of what a tap at (x, y) lands on, and whether it is inside a scrolling list"""
+    hit = _node_at(snapshot, x, y)
+    if hit is None:
+        return [], False
+    enclosing = [hit] + list(snapshot.ancestors(hit))
+    target = next((node for node in enclosing if node.attrib.get("clickable") == "true"), hit)
+    labels = {hit.text, hit.content_desc, target.content_desc}
+    # The first text in a card names it, e.g. the class of a schedule slot
+    labels.add(next((node.text for node in snapshot.descendants(target) if node.text), ""))
+    in_list = any(node.attrib.get("scrollable") == "true" for node in enclosing)
+    return sorted(label for label in labels if label), in_list
+
+
+def _center(rect):
+    return rect["x"] + rect["width"] // 2, rect["y"] + rect["height"] // 2
+
+
+class MacroRecorder:
+    """Watch the commands a run sends to Appium and keep its inputs, with the screen each one landed on"""
+
+    def __init__(self, driver, secrets=None, snapshots=None, flow=None):
+        self.driver = driver
+        self.secrets = secrets or {}  # {placeholder: value}, so credentials are not written to disk
+        # The run's own snapshot cache usually holds the screen already, so recording costs no extra page_source
+        self.snapshots = snapshots
+        self.flow = flow  # Its checkpoint is kept with each input, so a failed replay knows where to carry on
+        self.actions = []
+        self.replayable = True
+        self._located = {}  # {element id: locator the run found it with}
+        self._rects = {}
+        self._execute = driver.execute
+        driver.execute = self._record
+
+    def stop(self):
+        """Stop recording and note the screen the run ended on"""
+        self.driver.execute = self._execute
+        self.finished_at = time.monotonic()
+        self.end = fingerprint(self._snapshot())
+
+    def _snapshot(self):
+        if self.snapshots is not None:
+            return self.snapshots.snapshot()
+        return PageSnapshot(self._execute(Command.GET_PAGE_SOURCE)["value"])
+
+    def _element_center(self, element_id, snapshot):
+        """Centre of an element, from the snapshot when its locator can be resolved there, else from Appium"""
+        if element_id in self._located:
+            try:
+                node = snapshot.find(*original_locator(self._located[element_id]))
+            except ValueError:
+                node = None
+            if node is not None and node.bounds is not None:
+                return node.center
+        # Clicking a field and typing into it is one element, so its rect is fetched once
+        if element_id not in self._rects:
+            self._rects[element_id] = self._execute(Command.GET_ELEMENT_RECT, {"id": element_id})["value"]
+        return _center(self._rects[element_id])
+
+    def _remember_elements(self, params, result):
+        """Note the locator each found element came from, so its position can be read off a snapshot"""
+        found = result.get("value") if isinstance(result, dict) else None
+        for element in found if isinstance(found, list) else [found]:
+            if isinstance(element, WebElement):
+                self._located[element.id] = (params.get("using"), params.get("value"))
+
+    def _record(self, driver_command, params=None):
+        action = None
+        if self.replayable:
+            try:
+                action = self._action(driver_command, params or {})
+            except Exception as e:
+                logger.warning(f"Could not record {driver_command}, not saving a macro: {str(e)}")
+                self.replayable = False
+            if action is not None:
+                action["at"] = time.monotonic()
+                if self.flow is not None:
+                    action["checkpoint"] = self.flow.checkpoint
+                self.actions.append(action)
+        result = self._execute(driver_command, params)
+        if driver_command in (Command.FIND_ELEMENT, Command.FIND_ELEMENTS):
+            self._remember_elements(params or {}, result)
+        if action is not None and action["kind"] != "text" and self.snapshots is not None:
+            # The input may have changed the screen, which the cached snapshot does not know about
+            self.snapshots.invalidate()
+        return result
+
+    def _action(self, driver_command, params):
+        """Turn an input command into a macro action; returns None for commands that only read the screen"""
+        if driver_command == Command.CLICK_ELEMENT:
+            return self._tap(element_id=params["id"])
+        if driver_command == Command.SEND_KEYS_TO_ELEMENT:
+            action = self._tap(element_id=params["id"])
+            text = params.get("text") or "".join(params.get("value", []))
+            for placeholder, secret in self.secrets.items():
+                if secret and text == secret:
+                    text = placeholder
+            action.update(kind="text", text=text)
+            return action
+        if driver_command == Command.GO_BACK:
+            return {"kind": "back", "fingerprint": fingerprint(self._snapshot()), "anchor": [], "in_list": False}
+        if driver_command == Command.W3C_EXECUTE_SCRIPT:
+            script, args = params.get("script"), (params.get("args") or [{}])[0]
+            if script == "mobile: clickGesture":
+                if "elementId" in args:
+                    return self._tap(element_id=args["elementId"])
+                return self._tap(args["x"], args["y"])
+            if script == "mobile: scrollGesture":
+                return {"kind": "scroll", "args": args, "fingerprint": fingerprint(self._snapshot()),
+                        "anchor": [], "in_list": False}
+            if script in ("mobile: terminateApp", "mobile: activateApp"):
+                raise ValueError(f"the run used {script}")
+            return None
+        if driver_command in (Command.FIND_ELEMENT, Command.FIND_ELEMENTS) and \
+                str(params.get("value", "")).startswith("new UiScrollable"):
+            raise ValueError("UiScrollable scrolls cannot be replayed exactly")
+        if driver_command == Command.W3C_ACTIONS:
+            raise ValueError("the run used W3C actions")
+        return None
+
+    def _tap(self, x=None, y=None, element_id=None):
+        snapshot = self._snapshot()
+        if element_id is not None:
+            x, y = self._element_center(element_id, snapshot)
+        anchor, in_list = anchor_at(snapshot, x, y)
+        return {"kind": "tap", "x": x, "y": y, "fingerprint": fingerprint(snapshot), "anchor": anchor,
+                "in_list": in_list}
+
+    def macro(self):
+        """Split the actions into segments that can each be sent in one go after one screen check"""
+        segments = []
+        previous = None
+        for index, action in enumerate(self.actions):
+            following = self.actions[index + 1]["at"] if index + 1 < len(self.actions) else self.finished_at
+            action["wait"] = round(min(following - action["at"], MAX_SETTLE), 3)
+            # A new screen, or a tap on list content that may have moved, needs a fresh look first
+            if previous is None or action["fingerprint"] != previous["fingerprint"] or action["in_list"]:
+                shown_after = action["at"] - previous["at"] if previous is not None else 0
+                segments.append({"fingerprint": action["fingerprint"], "shown_after": round(shown_after, 3),
+                                 "checkpoint": action.get("checkpoint"), "actions": []})
+            segments[-1]["actions"].append({key: value for key, value in action.items()
+                                            if key not in ("at", "checkpoint")})
+            previous = action
+        return {"segments": segments, "end": self.end, "recorded_at": time.time()}
+
+
+def _input_command(action, secrets, previous=None):
+    tap = f"input tap {action.get('x')} {action.get('y')}"
+    if action["kind"] == "tap":
+        return tap
+    if action["kind"] == "text":
+        text = secrets.get(action["text"], action["text"])
+        # input text reads %s as a space
+        typing = f"input text {shlex.quote(text.replace(' ', '%s'))}"
+        # send_keys focuses the field itself, which the tap just before it may already have done
+        if previous is not None and previous["kind"] == "tap" and (previous["x"], previous["y"]) == \
+                (action["x"], action["y"]):
+            return typing
+        return f"{tap}; {typing}"
+    if action["kind"] == "back":
+        return "input keyevent 4"
+    return None
+
+
+class MacroStore:
+    """Macros per job and device, each kept under the fingerprint of the screen it starts from"""
+
+    def __init__(self, directory=MACRO_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", key) + ".json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, key, start, macro):
+        macros = self.load(key)
+        macros[start] = macro
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(key), "w") as f:
+                json.dump(macros, f, indent=2)
+        except OSError as e:
+            logger.error(f"Error saving macro: {str(e)}")
+
+    def discard(self, key, start):
+        macros = self.load(key)
+        if macros.pop(start, None) is not None:
+            with open(self._path(key), "w") as f:
+                json.dump(macros, f, indent=2)
+
+
+class MacroMismatch(Exception):
+    def __init__(self, start, message, checkpoint=None):
+        super().__init__(message)
+        self.start = start
+        # The last checkpoint the recorded run had reached before the inputs that did not go as recorded
+        self.checkpoint = checkpoint
+
+
+class MacroReplayer:
+    """Send a recorded macro's inputs through adb in batches, checking the screen between segments"""
+
+    def __init__(self, booker, secrets=None, adb=None):
+        self.booker = booker
+        self.secrets = secrets or {}
+        self.adb = adb or adb_client()
+
+    def _wait_for(self, expected, timeout, step):
+        """Wait for one of the expected fingerprints; returns (fingerprint, snapshot) or (None, last snapshot)"""
+        seen = {}
+
+        def condition(driver):
+            snapshot = self.booker.snapshots.snapshot(refresh=True)
+            seen["snapshot"] = snapshot
+            current = fingerprint(snapshot)
+            return current if current in expected else None
+        try:
+            return self.booker.waiter.until(condition, step=step, timeout=timeout), seen["snapshot"]
+        except TimeoutException:
+            return None, seen.get("snapshot")
+
+    def _send(self, script):
+        if script:
+            sleeps = sum(float(command.split()[1]) for command in script if command.startswith("sleep"))
+            result = self.adb.shell(self.booker.device.serial, "; ".join(script), timeout=sleeps + self.adb.timeout)
+            if result.returncode != 0:
+                raise Exception(f"adb input failed: {result.stderr.strip()}")
+            script.clear()
+
+    def _run_segment(self, segment):
+        """Send a segment's inputs: runs of adb input in one shell call each, scrolls through Appium"""
+        script = []
+        previous = None
+        for action in segment["actions"]:
+            command = _input_command(action, self.secrets, previous)
+            previous = action
+            if command is not None:
+                script.append(command)
+                if action["wait"] > 0:
+                    script.append(f"sleep {action['wait']}")
+                continue
+            self._send(script)
+            # Scrolling through adb would fling; the same gesture as the recorded run lands the same way
+            self.booker.driver.execute_script("mobile: scrollGesture", action["args"])
+            time.sleep(action["wait"])
+        if script and script[-1].startswith("sleep"):
+            # The next segment's fingerprint check does the waiting
+            script.pop()
+        self._send(script)
+        self.booker.snapshots.invalidate()
+        self.booker.finder.invalidate()
+
+    def replay(self, macros):
+        """Replay the macro for the screen on show; return True if it reached the recorded end screen"""
+        start, _ = self._wait_for(set(macros), SEGMENT_MIN_TIMEOUT, "macro start")
+        if start is None:
+            return None
+        macro = macros[start]
+        for number, segment in enumerate(macro["segments"]):
+            timeout = max(SEGMENT_MIN_TIMEOUT, segment["shown_after"] * SEGMENT_TIMEOUT_FACTOR)
+            current, snapshot = self._wait_for({segment["fingerprint"]}, timeout, f"macro segment {number}")
+            if current is None:
+                raise MacroMismatch(start, f"segment {number} screen did not show", segment.get("checkpoint"))
+            first = segment["actions"][0]
+            if first["kind"] in ("tap", "text") and anchor_at(snapshot, first["x"], first["y"])[0] != first["anchor"]:
+                raise MacroMismatch(start, f"segment {number} tap would land on something else",
+                                    segment.get("checkpoint"))
+            self._run_segment(segment)
+
+        last = macro["segments"][-1]
+        current, _ = self._wait_for({macro["end"], last["fingerprint"]}, END_TIMEOUT, "macro end")
+        if current == last["fingerprint"] and current != macro["end"]:
+            # Like complete_booking: the last tap does not always register, so send it once more
+            self._run_segment(last)
+            current, _ = self._wait_for({macro["end"]}, END_TIMEOUT, "macro end")
+        if current != macro["end"]:
+            raise MacroMismatch(start, "run did not end on the recorded screen", last.get("checkpoint"))
+        return start
+
+
+def job_key(booker):
+    return (f"{booker.device.serial}-{booker.day_of_week}-{booker.class_name or booker.categories_to_skip}-"
+            f"{booker.start_time or booker.slot_number}")
+
+
+def run_with_macro(booker, secrets=None, store=None, adb=None):
+    """Replay the job's macro if there is one; otherwise, or on any mismatch, run and record the normal flow"""
+    store = store or MacroStore()
+    key = job_key(booker)
+    macros = store.load(key)
+    if macros:
+        start = time.monotonic()
+        try:
+            if MacroReplayer(booker, secrets, adb).replay(macros):
+                logger.info(f"Replayed booking macro in {time.monotonic() - start:.2f}s")
+                if booker.session_cache is not None and not booker.session_restored:
+                    # The replayed login skipped log_in, which is where the session is normally marked for saving
+                    booker.session_to_save = True
+                return True
+            logger.info("No macro for the screen on show, running the normal flow")
+        except MacroMismatch as e:
+            logger.warning(f"Macro mismatch ({str(e)}), finishing with the normal flow")
+            store.discard(key, e.start)
+            # Inputs up to the mismatch were sent, possibly the booking taps, so carry on from there
+            BookingFlow(booker).run(resume=e.checkpoint)
+            return True
+
+    flow = BookingFlow(booker)
+    recorder = MacroRecorder(booker.driver, secrets, snapshots=booker.snapshots, flow=flow)
+    try:
+        flow.run()
+    except Exception:
+        # The flow's own error is the one that matters; a failing stop must not replace it
+        try:
+            recorder.stop()
+        except Exception as e:
+            logger.warning(f"Could not stop the macro recorder: {str(e)}")
+        raise
+    try:
+        recorder.stop()
+    except Exception as e:
+        logger.warning(f"Could not stop the macro recorder, not saving a macro: {str(e)}")
+        return True
+    if flow.recoveries == 0 and recorder.replayable and recorder.actions:
+        # The first input goes to the screen the run started from, so its fingerprint is the macro's key
+        store.save(key, recorder.actions[0]["fingerprint"], recorder.macro())
+        logger.info(f"Recorded booking macro with {len(recorder.actions)} inputs")
+    return True
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from adb_client import AdbError, adb_client
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+EMULATOR_BOOT_TIMEOUT = 180
+APPIUM_START_TIMEOUT = 60
+BACKOFF_INITIAL = 0.1
+BACKOFF_MAX = 2.0
+
+_appium_session = None
+
+
+def appium_session():
+    """Shared keep-alive HTTP session for Appium status checks"""
+    global _appium_session
+    if _appium_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _appium_session = requests.Session()
+        _appium_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return _appium_session
+
+
+def appium_status(port=4723, timeout=5):
+    """Return True if Appium on port answers /status, raising on connection errors"""
+    response = appium_session().get(f"http://127.0.0.1:{port}/status", timeout=timeout)
+    return response.status_code == 200
+
+
+def _backoff(delay, deadline):
+    time.sleep(max(0, min(delay, deadline - time.monotonic())))
+    return min(delay * 2, BACKOFF_MAX)
+
+
+@traced("emulator ready")
+def wait_for_emulator(serial="emulator-5554", timeout=EMULATOR_BOOT_TIMEOUT, adb=None):
+    """Block until the device is attached and Android reports boot completed; return seconds taken or None"""
+    adb = adb or adb_client()
+    start = time.monotonic()
+    deadline = start + timeout
+    # The adb server pushes device changes, so this returns the moment the device shows up
+    if not adb.wait_for(serial, "device", timeout):
+        logger.error(f"{serial} did not attach within {timeout}s")
+        return None
+    attached = time.monotonic() - start
+
+    delay = BACKOFF_INITIAL
+    while time.monotonic() < deadline:
+        try:
+            result = adb.shell(serial, 'getprop sys.boot_completed; getprop init.svc.bootanim')
+            boot_completed, _, bootanim = result.stdout.strip().partition("\n")
+            if boot_completed.strip() == "1" and bootanim.strip() in ("stopped", ""):
+                elapsed = time.monotonic() - start
+                logger.info(f"{serial} ready in {elapsed:.1f}s (attached after {attached:.1f}s)")
+                return elapsed
+        except (AdbError, OSError) as e:
+            logger.warning(f"getprop on {serial} failed: {str(e)}")
+        delay = _backoff(delay, deadline)
+
+    logger.error(f"{serial} did not finish booting within {timeout}s")
+    return None
+
+
+@traced("appium ready")
+def wait_for_appium(port=4723, timeout=APPIUM_START_TIMEOUT):
+    """Poll Appium's /status with exponential backoff; return seconds until it answered or None"""
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = BACKOFF_INITIAL
+    attempts = 0
+    while time.monotonic() < deadline:
+        attempts += 1
+        try:
+            if appium_status(port, timeout=2):
+                elapsed = time.monotonic() - start
+                logger.info(f"Appium on port {port} ready in {elapsed:.1f}s ({attempts} checks)")
+                return elapsed
+        except Exception:
+            pass  # Not listening yet
+        delay = _backoff(delay, deadline)
+
+    logger.error(f"Appium on port {port} not ready after {timeout}s")
+    return None
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from adb_client import AdbError, adb_client
+from supervisor import supervisor as process_supervisor
+from tracing import load_spans, span_file
+
+logger = logging.getLogger(__name__)
+
+# Host processes are cheap to read; dumpsys runs on the device and takes a while, so it is asked less often
+SAMPLE_INTERVAL = 1.0
+DEVICE_INTERVAL = 10.0
+# Enough for a 20-minute run at the default interval; older samples make room for newer ones
+RING_SIZE = 1200
+RESOURCE_DIR = "logs"
+# Host processes to follow, found by these names when the supervisor did not start them
+PROCESS_NAMES = {"emulator": ("qemu-system", "emulator"), "appium": ("node",)}
+HOST_COLUMNS = ["host_cpu", "host_mem", "host_swap"]
+PROCESS_COLUMNS = ["cpu", "rss_mb", "io_mb_s"]
+DEVICE_COLUMNS = ["device_cpu", "device_load", "device_mem", "app_cpu"]
+
+
+def _psutil():
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def parse_cpuinfo(output, package=None):
+    """(total CPU %, 1-minute load, package CPU %) from `dumpsys cpuinfo`"""
+    total = re.search(r"([\d.]+)% TOTAL", output)
+    load = re.search(r"Load: ([\d.]+)", output)
+    app = re.search(rf"([\d.]+)% \d+/{re.escape(package)}:", output) if package else None
+    return (float(total.group(1)) if total else None, float(load.group(1)) if load else None,
+            float(app.group(1)) if app else None)
+
+
+def parse_meminfo(output):
+    """Used RAM % from the ram,total,free,used line of `dumpsys meminfo -c`"""
+    match = re.search(r"^ram,(\d+),(\d+),(\d+)", output, re.MULTILINE)
+    if not match or not int(match.group(1)):
+        return None
+    return round(100.0 * int(match.group(3)) / int(match.group(1)), 1)
+
+
+class ResourceSampler:
+    """Sample host, Appium, emulator and device load in the background into fixed-size ring buffers"""
+
+    def __init__(self, serial="emulator-5554", appium_port=4723, package=None, interval=SAMPLE_INTERVAL,
+                 device_interval=DEVICE_INTERVAL, size=RING_SIZE, adb=None, supervisor=None):
+        self.serial = serial
+        self.appium_port = appium_port
+        self.package = package
+        self.interval = interval
+        self.device_interval = device_interval
+        self.adb = adb or adb_client()
+        self.supervisor = supervisor or process_supervisor()
+        self.psutil = _psutil()
+        self.processes = ["python", "emulator", "appium"]
+        self.columns = HOST_COLUMNS + [f"{name}_{column}" for name in self.processes for column in PROCESS_COLUMNS]
+        self.host = deque(maxlen=size)  # (time, *columns)
+        self.device = deque(maxlen=size)  # (time, *DEVICE_COLUMNS)
+        self.host_count = 0
+        self.device_count = 0
+        self.started = None
+        self.stopped = None
+        self.overhead = {}  # sampler thread -> CPU seconds it spent
+        self._previous = {}  # process name -> (time, cpu seconds, io bytes)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.started = time.time()
+        if self.psutil is None:
+            logger.info("psutil not installed, sampling only the Python process on the host")
+        else:
+            self.psutil.cpu_percent(None)
+        for target, interval in ((self.sample_host, self.interval), (self.sample_device, self.device_interval)):
+            thread = threading.Thread(target=self._loop, args=(target, interval), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.stopped = time.time()
+
+    def _loop(self, sample, interval):
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            before = time.thread_time()
+            try:
+                sample()
+            except Exception as e:
+                logger.warning(f"Resource sample failed: {str(e)}")
+            self.overhead[sample.__name__] = self.overhead.get(sample.__name__, 0.0) + time.thread_time() - before
+            next_sample += interval
+            self._stop.wait(max(0.0, next_sample - time.monotonic()))
+
+    def _find(self, name):
+        """psutil.Process for one of the followed processes, or None if it is not running"""
+        if name == "python":
+            return self.psutil.Process()
+        record = self.supervisor.records.get(self.serial if name == "emulator" else f"appium-{self.appium_port}")
+        try:
+            if record is not None:
+                return self.psutil.Process(record["pid"])
+            for process in self.psutil.process_iter(["name", "cmdline"]):
+                process_name = (process.info["name"] or "").lower()
+                if any(process_name.startswith(prefix) for prefix in PROCESS_NAMES[name]):
+                    if name != "appium" or "appium" in " ".join(process.info["cmdline"] or []):
+                        return process
+        except self.psutil.Error:
+            pass
+        return None
+
+    def _usage(self, name):
+        """(CPU % of one core, RSS MB, I/O MB/s) of a process and its children, from the change since last time"""
+        now = time.monotonic()
+        if self.psutil is None:
+            if name != "python":
+                return None, None, None
+            times = os.times()
+            cpu, rss, io = times.user + times.system, None, None
+        else:
+            process = self._find(name)
+            if process is None:
+                self._previous.pop(name, None)
+                return None, None, None
+            cpu, rss, io = 0.0, 0, 0
+            try:
+                tree = [process] + (process.children(recursive=True) if name != "python" else [])
+            except self.psutil.Error:
+                tree = [process]
+            for member in tree:
+                try:
+                    with member.oneshot():
+                        times = member.cpu_times()
+                        cpu += times.user + times.system
+                        rss += member.memory_info().rss
+                        if hasattr(member, "io_counters"):
+                            counters = member.io_counters()
+                            io += counters.read_bytes + counters.write_bytes
+                except self.psutil.Error:
+                    continue
+            rss = round(rss / 2 ** 20, 1)
+            io = io if hasattr(process, "io_counters") else None
+        previous = self._previous.get(name)
+        self._previous[name] = (now, cpu, io)
+        if previous is None or now <= previous[0]:
+            return None, rss, None
+        elapsed = now - previous[0]
+        io_rate = None
+        if io is not None and previous[2] is not None:
+            io_rate = round(max(0, io - previous[2]) / 2 ** 20 / elapsed, 2)
+        return round(max(0.0, cpu - previous[1]) * 100 / elapsed, 1), rss, io_rate
+
+    def sample_host(self):
+        row = [time.time()]
+        if self.psutil is not None:
+            row += [self.psutil.cpu_percent(None), self.psutil.virtual_memory().percent,
+                    self.psutil.swap_memory().percent]
+        else:
+            row += [None] * len(HOST_COLUMNS)
+        for name in self.processes:
+            row += self._usage(name)
+        self.host.append(tuple(row))
+        self.host_count += 1
+
+    def sample_device(self):
+        try:
+            result = self.adb.shell(self.serial, "dumpsys cpuinfo; echo ---; dumpsys meminfo -c",
+                                    timeout=self.device_interval)
+        except (AdbError, OSError) as e:
+            logger.debug(f"No device sample from {self.serial}: {str(e)}")
+            return
+        cpuinfo, _, meminfo = result.stdout.partition("---")
+        cpu, load, app_cpu = parse_cpuinfo(cpuinfo, self.package)
+        self.device.append((time.time(), cpu, load, parse_meminfo(meminfo), app_cpu))
+        self.device_count += 1
+
+    def step_at(self, spans, moment):
+        """Innermost step of the run that was under way at moment"""
+        covering = [record for record in spans
+                    if record["start"] <= moment < record["start"] + record["duration"]]
+        return max(covering, key=lambda record: record["start"])["span"] if covering else "(outside steps)"
+
+    def summary(self, spans=None):
+        """Mean and peak of each column per booking step, for the samples still in the buffers"""
+        if spans is None:
+            try:
+                spans = load_spans([span_file()])
+            except FileNotFoundError:
+                spans = []
+        # Every span that overlaps the sampling window, whatever run id a queue or the pool gave its job.
+        # Appium calls are too short to hold a sample; the step around them is what explains the load
+        end = self.stopped or time.time()
+        spans = [record for record in spans if record["start"] <= end
+                 and record["start"] + record["duration"] >= self.started and not record["span"].startswith("rpc:")]
+        steps = {}
+        for buffer, columns in ((self.host, self.columns), (self.device, DEVICE_COLUMNS)):
+            for row in buffer:
+                values = steps.setdefault(self.step_at(spans, row[0]), {})
+                for column, value in zip(columns, row[1:]):
+                    if value is not None:
+                        values.setdefault(column, []).append(value)
+        return {
+            "started": self.started,
+            "duration": round((self.stopped or time.time()) - self.started, 1),
+            "interval": self.interval,
+            "device_interval": self.device_interval,
+            "samples": {"host": self.host_count, "device": self.device_count},
+            "dropped": {"host": self.host_count - len(self.host), "device": self.device_count - len(self.device)},
+            "sampler_cpu_s": round(sum(self.overhead.values()), 3),
+            "steps": {step: {column: {"mean": round(sum(values) / len(values), 2), "max": max(values),
+                                      "samples": len(values)}
+                             for column, values in columns.items()}
+                      for step, columns in steps.items()},
+        }
+
+    def dump(self, directory=RESOURCE_DIR, spans=None):
+        """Write the summary next to the logs and log its busiest steps; return the file's path"""
+        summary = self.summary(spans)
+        path = os.path.join(directory, f"resources_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+        except OSError as e:
+            logger.error(f"Error writing resource summary: {str(e)}")
+            return None
+        logger.info(f"Resource samples: {summary['samples']['host']} host, {summary['samples']['device']} device, "
+                     f"sampler used {summary['sampler_cpu_s']}s CPU; summary in {path}")
+        for line in format_summary(summary):
+            logger.info(line)
+        return path
+
+
+def format_summary(summary, columns=("host_cpu", "host_swap", "emulator_cpu", "appium_cpu", "python_cpu",
+                                     "device_cpu", "device_mem")):
+    """Table rows of mean/peak per step, busiest host first"""
+    def cell(values, column):
+        stats = values.get(column)
+        return f"{stats['mean']:>6.0f}/{stats['max']:<6.0f}" if stats else f"{'-':>6} {'':<6}"
+
+    def load(step):
+        values = summary["steps"][step]
+        return (values.get("host_cpu") or values.get("python_cpu") or {"mean": 0})["mean"]
+
+    steps = summary["steps"]
+    order = sorted(steps, key=load, reverse=True)
+    lines = [f"{'step (mean/max)':<32}" + "".join(f"{column:>14}" for column in columns)]
+    for step in order:
+        lines.append(f"{step[:32]:<32}" + "".join(f"{cell(steps[step], column):>14}" for column in columns))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show a run's resource summary per booking step")
+    parser.add_argument("file", nargs="?", help="Summary file (default: the latest logs/resources_*.json)")
+    args = parser.parse_args()
+
+    paths = [args.file] if args.file else sorted(glob.glob(os.path.join(RESOURCE_DIR, "resources_*.json")))
+    if not paths:
+        raise SystemExit(f"No resource summaries in {RESOURCE_DIR}")
+    with open(paths[-1]) as f:
+        summary = json.load(f)
+    print(f"{paths[-1]}: {summary['duration']}s, {summary['samples']['host']} host and "
+          f"{summary['samples']['device']} device samples, sampler CPU {summary['sampler_cpu_s']}s")
+    print("\n".join(format_summary(summary)))
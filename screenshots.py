@@ -0,0 +1,113 @@
+import glob
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_DIR = "screenshots"
+SCREENSHOT_BUFFER_SIZE = 10
+# Downscaling and JPEG need Pillow; without it frames are kept as the original PNG
+SCREENSHOT_SCALE = 0.5
+SCREENSHOT_QUALITY = 70
+# Oldest files beyond this are deleted whenever new ones are written
+MAX_SAVED_SCREENSHOTS = 200
+PERSIST_TIMEOUT = 10
+
+
+class ScreenshotBuffer:
+    """Take screenshots on a background thread and keep the last few in memory"""
+
+    def __init__(self, driver, capacity=SCREENSHOT_BUFFER_SIZE, scale=SCREENSHOT_SCALE,
+                 quality=SCREENSHOT_QUALITY):
+        self.driver = driver
+        self.scale = scale
+        self.quality = quality
+        self.frames = deque(maxlen=capacity)  # (label, taken at, image bytes, extension)
+        self._requests = queue.Queue(maxsize=capacity)
+        self._thread = threading.Thread(target=self._worker, name="screenshots", daemon=True)
+        self._thread.start()
+
+    def capture(self, label):
+        """Queue a screenshot and return immediately; the frame shows the screen when the worker gets to it"""
+        try:
+            self._requests.put_nowait((label, time_label()))
+        except queue.Full:
+            logger.warning(f"Screenshot queue full, skipping {label} screenshot")
+
+    def _worker(self):
+        while True:
+            request = self._requests.get()
+            try:
+                if request is None:
+                    return
+                label, taken_at = request
+                png = self.driver.get_screenshot_as_png()
+                image, extension = self._compress(png)
+                self.frames.append((label, taken_at, image, extension))
+            except Exception as e:
+                logger.error(f"Error taking screenshot: {str(e)}")
+            finally:
+                self._requests.task_done()
+
+    def _compress(self, png):
+        try:
+            from PIL import Image
+        except ImportError:
+            return png, "png"
+
+        image = Image.open(BytesIO(png)).convert("RGB")
+        if self.scale and self.scale != 1:
+            image = image.resize((int(image.width * self.scale), int(image.height * self.scale)))
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=self.quality)
+        return output.getvalue(), "jpg"
+
+    def flush(self, timeout=PERSIST_TIMEOUT):
+        """Wait for queued screenshots to be taken, up to timeout seconds"""
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._requests.join(), done.set()), daemon=True).start()
+        if not done.wait(timeout):
+            logger.warning("Timed out waiting for pending screenshots")
+
+    def persist(self, reason, directory=SCREENSHOT_DIR):
+        """Write the buffered frames to disk and return their paths"""
+        self.flush()
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for label, taken_at, image, extension in list(self.frames):
+            path = os.path.join(directory, f"booking_{taken_at}_{reason}_{label}.{extension}")
+            with open(path, "wb") as f:
+                f.write(image)
+            paths.append(path)
+        self.frames.clear()
+        logger.info(f"Saved {len(paths)} screenshots ({reason}) to {directory}")
+        prune_screenshots(directory)
+        return paths
+
+    def close(self):
+        """Stop the worker once it has finished what is queued"""
+        try:
+            self._requests.put(None, timeout=PERSIST_TIMEOUT)
+        except queue.Full:
+            logger.warning("Screenshot worker busy, leaving it to exit with the process")
+            return
+        self._thread.join(PERSIST_TIMEOUT)
+
+
+def time_label():
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+
+
+def prune_screenshots(directory=SCREENSHOT_DIR, keep=MAX_SAVED_SCREENSHOTS):
+    """Delete the oldest screenshots so the folder stays the same size over time"""
+    files = sorted(glob.glob(os.path.join(directory, "*.*")), key=os.path.getmtime)
+    for path in files[:-keep]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Error removing old screenshot {path}: {str(e)}")
@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import re
+import time
+
+from adb_client import adb_client
+
+logger = logging.getLogger(__name__)
+
+SESSION_DIR = os.path.join("cache", "sessions")
+# Glofox logins last for weeks, but refresh well before the token could expire
+SESSION_MAX_AGE = 7 * 24 * 3600
+DEVICE_TMP = "/data/local/tmp/session.tar"
+ADB_TIMEOUT = 60
+ROOT_RESTART_TIMEOUT = 10
+
+
+class SessionCache:
+    """Save the app's logged-in data directory after a login and put it back instead of clearing the app"""
+
+    def __init__(self, serial, package, directory=SESSION_DIR, max_age=SESSION_MAX_AGE):
+        self.serial = serial
+        self.package = package
+        self.max_age = max_age
+        name = re.sub(r"[^\w.-]", "_", serial)
+        self.archive = os.path.join(directory, f"{name}.tar")
+        self.meta_file = os.path.join(directory, f"{name}.json")
+
+    def _shell(self, command):
+        result = adb_client().shell(self.serial, command, timeout=ADB_TIMEOUT)
+        if result.returncode != 0:
+            raise Exception(f"'{command}' failed: {result.stderr.strip() or result.stdout.strip()}")
+        return result.stdout.strip()
+
+    def ensure_root(self):
+        """App data is only readable as root, which emulator images without Play Store allow"""
+        reply = adb_client().root(self.serial)
+        if "cannot" in reply:
+            return False
+        if "already running as root" not in reply:
+            # adbd restarts, so the device drops off briefly before it is usable again. The restart also drops
+            # UiAutomator2 and its port forwards, which is why this runs before the Appium session is created
+            adb_client().wait_for(self.serial, None, timeout=ROOT_RESTART_TIMEOUT)
+            adb_client().wait_for(self.serial, "device", timeout=ROOT_RESTART_TIMEOUT)
+        return self.is_root()
+
+    def app_version(self):
+        output = self._shell(f'dumpsys package {self.package} | grep versionName')
+        match = re.search(r"versionName=(\S+)", output)
+        return match.group(1) if match else None
+
+    def load_meta(self):
+        try:
+            with open(self.meta_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self):
+        """Return whether there is a saved session young enough and from the installed app version"""
+        meta = self.load_meta()
+        if meta is None or not os.path.exists(self.archive):
+            return False
+        age = time.time() - meta["saved_at"]
+        if age > self.max_age:
+            logger.info(f"Saved session is {age / 3600:.0f}h old, logging in again")
+            return False
+        if meta.get("version") != self.app_version():
+            logger.info(f"Saved session is from app version {meta.get('version')}, logging in again")
+            return False
+        return True
+
+    def is_root(self):
+        return self._shell('id -u') == "0"
+
+    def save(self):
+        """Pull the app's data directory; call this once the session that logged in is over"""
+        try:
+            # Rooting now would restart adbd under a live session, so this relies on ensure_root having run already
+            if not self.is_root():
+                logger.warning("adb is not running as root, not saving the login session")
+                return False
+            # exec keeps the tar stream binary-safe, unlike shell
+            archive = adb_client().exec_out(self.serial, f'tar -cf - -C /data/data '
+                                                         f'--exclude={self.package}/cache '
+                                                         f'--exclude={self.package}/code_cache {self.package}',
+                                            timeout=ADB_TIMEOUT)
+            if not archive:
+                raise Exception("empty archive")
+
+            os.makedirs(os.path.dirname(self.archive), exist_ok=True)
+            with open(self.archive, "wb") as f:
+                f.write(archive)
+            with open(self.meta_file, "w") as f:
+                json.dump({"saved_at": time.time(), "version": self.app_version()}, f)
+            logger.info(f"Saved login session ({len(archive) // 1024} KB)")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving login session: {str(e)}")
+            return False
+
+    def restore(self):
+        """Replace the app's data with the saved session; return False if the caller should clear it instead"""
+        try:
+            if not self.is_fresh():
+                return False
+            if not self.is_root():
+                logger.warning("adb is not running as root, cannot restore the login session")
+                return False
+
+            start = time.monotonic()
+            adb_client().push(self.serial, self.archive, DEVICE_TMP)
+            # pm clear leaves an empty data directory owned by the app, so its uid can be read back
+            self._shell(f'am force-stop {self.package}; pm clear {self.package}')
+            uid = self._shell(f'stat -c %u /data/data/{self.package}')
+            self._shell(f'tar -xf {DEVICE_TMP} -C /data/data && rm {DEVICE_TMP} && '
+                        f'chown -R {uid}:{uid} /data/data/{self.package} && '
+                        f'restorecon -R /data/data/{self.package}')
+            logger.info(f"Restored login session in {time.monotonic() - start:.1f}s")
+            return True
+        except Exception as e:
+            logger.error(f"Error restoring login session: {str(e)}")
+            return False
+
+    def invalidate(self):
+        """Forget the saved session, e.g. when the app rejected it"""
+        for path in (self.archive, self.meta_file):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import re
+
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import NoSuchElementException
+
+from locators import quote
+
+logger = logging.getLogger(__name__)
+
+SLOT_CACHE_FILE = os.path.join("cache", "slot_offsets.json")
+SCROLLABLE = (AppiumBy.XPATH, "//*[@scrollable='true']")
+TIME_PATTERN = re.compile(r"\d{1,2}:\d{2}")
+# Badges on a slot card that mean it cannot be booked right now
+FULL_BADGES = ("Full", "Waitlist", "Join waitlist")
+# Page by less than a full screen so a card cut off at the bottom is whole on the next page
+SWEEP_PERCENT = 0.8
+MAX_SWEEP_PAGES = 20
+# Lists keep their position across day taps and back presses; one gesture this long reaches the top of any of them
+TOP_PERCENT = MAX_SWEEP_PAGES * SWEEP_PERCENT
+
+
+class SlotFinder:
+    """Find a class slot on the schedule by class name and start time"""
+
+    def __init__(self, driver, snapshots, cache_file=SLOT_CACHE_FILE):
+        self.driver = driver
+        self.snapshots = snapshots
+        self.cache_file = cache_file
+        # {day: {"class name@start time": scroll pages from the top where that card shows}}
+        self.offsets = self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(self.cache_file, "w") as f:
+                json.dump(self.offsets, f, indent=2)
+        except OSError as e:
+            logger.error(f"Error saving slot offsets: {str(e)}")
+
+    def find(self, day_of_week, class_name, start_time):
+        """Return the node to tap for the slot, scrolling as few times as possible"""
+        slot = self._match(class_name, start_time)
+        if slot is not None:
+            logger.info(f"{class_name} at {start_time} is already on screen")
+            return slot
+
+        # Offsets count pages from the top, and the list may have been left scrolled
+        self.scroll_to_top()
+        pages = self.offsets.get(day_of_week, {}).get(_key(class_name, start_time))
+        if pages:
+            # UiObject2 scrolls multi-page distances in one gesture, so this is a single RPC
+            self._scroll(pages * SWEEP_PERCENT)
+            slot = self._match(class_name, start_time)
+            if slot is not None:
+                logger.info(f"Found {class_name} at {start_time} at cached offset ({pages} pages)")
+                return slot
+            logger.info(f"Cached offset for {class_name} on {day_of_week} is stale, searching again")
+            self.scroll_to_top()
+
+        slot = self._sweep(day_of_week, class_name, start_time)
+        if slot is not None:
+            return slot
+
+        # Last resort: let UiAutomator scroll until the time next to the class name shows up
+        logger.info(f"Sweep did not find {class_name} at {start_time}, trying scrollIntoView")
+        target = f'new UiSelector().text({quote(class_name)})'
+        if start_time is not None:
+            target += f'.fromParent(new UiSelector().textStartsWith({quote(start_time)}))'
+        self.driver.find_element(
+            AppiumBy.ANDROID_UIAUTOMATOR,
+            f'new UiScrollable(new UiSelector().scrollable(true)).setAsVerticalList().scrollIntoView({target})'
+        )
+        slot = self._match(class_name, start_time)
+        if slot is None:
+            raise NoSuchElementException(f"No {class_name} class at {start_time} on {day_of_week}")
+        return slot
+
+    def _sweep(self, day_of_week, class_name, start_time):
+        """Page down from the top (where find leaves the list) until the slot is visible, remembering the page"""
+        for page in range(MAX_SWEEP_PAGES + 1):
+            # Scrolling invalidates the snapshot, so this only fetches when the screen moved
+            self.snapshots.snapshot()
+            slot = self._match(class_name, start_time, refresh=False)
+            if slot is not None:
+                logger.info(f"Found {class_name} at {start_time} after {page} pages")
+                # Keyed by the card that matched: the same class later in the day is on another page
+                self.offsets.setdefault(day_of_week, {})[_key(class_name, start_time)] = page
+                self._save()
+                return slot
+            if not self._scroll(SWEEP_PERCENT):
+                break
+        return None
+
+    def scroll_to_top(self):
+        """Bring the schedule list back to its start, usually in one call"""
+        # The gesture reports whether the list could still go further up
+        for _ in range(MAX_SWEEP_PAGES):
+            if not self._scroll(TOP_PERCENT, direction="up"):
+                return
+
+    def _scroll(self, percent, direction="down"):
+        """Scroll the schedule list by percent of its height, returning whether it can scroll further"""
+        scrollable = self.snapshots.snapshot().find(*SCROLLABLE)
+        if scrollable is None:
+            raise NoSuchElementException("Schedule list is not on screen")
+        left, top, right, bottom = scrollable.bounds
+        can_scroll_more = self.driver.execute_script('mobile: scrollGesture', {
+            'left': left, 'top': top, 'width': right - left, 'height': bottom - top,
+            'direction': direction, 'percent': percent,
+        })
+        self.snapshots.invalidate()
+        return can_scroll_more
+
+    def _match(self, class_name, start_time, refresh=True):
+        """Return the start-time node of the matching slot if it is visible in the list"""
+        found = self._card(self.snapshots.snapshot(refresh=refresh), class_name, start_time)
+        return found[1] if found else None
+
+    def _card(self, snapshot, class_name, start_time):
+        """Return (card, start-time node) of the matching slot if it is visible in the list"""
+        scrollable = snapshot.find(*SCROLLABLE)
+        for name_node in snapshot.index["text"].get(class_name, []):
+            for card in snapshot.ancestors(name_node):
+                # The card is the innermost container that shows a time
+                times = [node for node in snapshot.descendants(card) if TIME_PATTERN.match(node.text)]
+                if not times:
+                    continue
+                # Without a start time the class is matched by name alone
+                time_node = next((node for node in times if start_time is None or node.text.startswith(start_time)),
+                                 None)
+                if time_node is not None and _inside(time_node, scrollable):
+                    return card, time_node
+                break
+        return None
+
+    def availability(self, snapshot, class_name, start_time):
+        """Return (node to tap, whether a spot is free) for a visible slot, or None if it is not on screen"""
+        found = self._card(snapshot, class_name, start_time)
+        if found is None:
+            return None
+        card, time_node = found
+        texts = [node.text for node in snapshot.descendants(card)]
+        return time_node, not any(text in FULL_BADGES for text in texts)
+
+
+def _key(class_name, start_time):
+    return f"{class_name}@{start_time}"
+
+
+def _inside(node, container):
+    if container is None or node.bounds is None:
+        return node.bounds is not None
+    x, y = node.center
+    left, top, right, bottom = container.bounds
+    return left <= x <= right and top <= y <= bottom
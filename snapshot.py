@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, defaultdict
+
+from appium.webdriver.common.appiumby import AppiumBy
+
+logger = logging.getLogger(__name__)
+
+BOUNDS_PATTERN = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+# //class[@attribute='value'] is answered straight from the index, anything else goes to ElementTree
+SIMPLE_XPATH = re.compile(r"^//([\w.]+|\*)\[@([\w-]+)='([^']*)'\]$")
+INDEXED_ATTRIBUTES = ("text", "content-desc", "resource-id", "bounds")
+# Screens the app flips between; keeping a few parsed trees avoids re-parsing on the way back
+PARSED_CACHE_SIZE = 8
+# A screen counts as settled once its hierarchy has not changed for this long
+SETTLE_TIME = 0.3
+
+
+class SnapshotNode:
+    """One element of a page_source dump"""
+
+    def __init__(self, element):
+        self.element = element
+        self.attrib = element.attrib
+        self.class_name = element.attrib.get("class", element.tag)
+        self.text = element.attrib.get("text", "")
+        self.content_desc = element.attrib.get("content-desc", "")
+        self.resource_id = element.attrib.get("resource-id", "")
+        match = BOUNDS_PATTERN.match(element.attrib.get("bounds", ""))
+        self.bounds = tuple(int(v) for v in match.groups()) if match else None
+
+    @property
+    def center(self):
+        left, top, right, bottom = self.bounds
+        return (left + right) // 2, (top + bottom) // 2
+
+    def __repr__(self):
+        return f"SnapshotNode({self.class_name}, text={self.text!r}, desc={self.content_desc!r})"
+
+
+class PageSnapshot:
+    """A parsed page_source with indexes on text, content-desc, resource-id, bounds and class"""
+
+    def __init__(self, xml, xml_hash=None):
+        self.xml_hash = xml_hash or hash_xml(xml)
+        self.root = ET.fromstring(xml)
+        self.nodes = {}
+        self.parents = {child: parent for parent in self.root.iter() for child in parent}
+        self.index = {attribute: defaultdict(list) for attribute in INDEXED_ATTRIBUTES + ("class",)}
+        for element in self.root.iter():
+            if element is self.root:
+                continue
+            node = SnapshotNode(element)
+            self.nodes[element] = node
+            self.index["class"][node.class_name].append(node)
+            for attribute in INDEXED_ATTRIBUTES:
+                value = element.attrib.get(attribute)
+                if value:
+                    self.index[attribute][value].append(node)
+
+    def find_all(self, by, value):
+        """Resolve an Appium locator against this snapshot without touching the device"""
+        if by == AppiumBy.ID:
+            return list(self.index["resource-id"].get(value, []))
+        if by == AppiumBy.ACCESSIBILITY_ID:
+            return list(self.index["content-desc"].get(value, []))
+        if by == AppiumBy.CLASS_NAME:
+            return list(self.index["class"].get(value, []))
+        if by == AppiumBy.XPATH:
+            return self._find_xpath(value)
+        raise ValueError(f"Locator strategy {by} cannot be resolved from a snapshot")
+
+    def find(self, by, value):
+        nodes = self.find_all(by, value)
+        return nodes[0] if nodes else None
+
+    def ancestors(self, node):
+        """Yield the nodes enclosing node, innermost first"""
+        element = self.parents.get(node.element)
+        while element is not None and element in self.nodes:
+            yield self.nodes[element]
+            element = self.parents.get(element)
+
+    def descendants(self, node):
+        return [self.nodes[element] for element in node.element.iter() if element is not node.element]
+
+    def resolve(self, locators):
+        """Resolve many locators at once, returning {locator: node or None}"""
+        return {locator: self.find(*locator) for locator in locators}
+
+    def _find_xpath(self, xpath):
+        match = SIMPLE_XPATH.match(xpath)
+        if match:
+            class_name, attribute, value = match.groups()
+            if attribute in self.index:
+                candidates = self.index[attribute].get(value, [])
+                return [node for node in candidates if class_name == "*" or node.class_name == class_name]
+        # ElementTree paths are relative, so anchor absolute ones at the root
+        return [self.nodes[element] for element in self.root.findall("." + xpath) if element in self.nodes]
+
+
+def hash_xml(xml):
+    return hashlib.sha1(xml.encode("utf-8")).hexdigest()
+
+
+class SnapshotCache:
+    """Fetch page_source once per screen and answer element checks locally"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.current = None
+        self._parsed = OrderedDict()
+        self.fetches = 0
+        self.parses = 0
+
+    def snapshot(self, refresh=False):
+        """Return the current snapshot, fetching page_source only if it may be out of date"""
+        if self.current is not None and not refresh:
+            return self.current
+
+        xml = self.driver.page_source
+        self.fetches += 1
+        xml_hash = hash_xml(xml)
+        snapshot = self._parsed.get(xml_hash)
+        if snapshot is None:
+            snapshot = PageSnapshot(xml, xml_hash)
+            self.parses += 1
+            self._parsed[xml_hash] = snapshot
+            if len(self._parsed) > PARSED_CACHE_SIZE:
+                self._parsed.popitem(last=False)
+        else:
+            self._parsed.move_to_end(xml_hash)
+        self.current = snapshot
+        return snapshot
+
+    def invalidate(self):
+        """Forget the current screen, e.g. after an interaction changed it"""
+        self.current = None
+
+    def located(self, *locators):
+        """StepWaiter condition: the first of the locators present on a freshly fetched screen"""
+        def condition(driver):
+            snapshot = self.snapshot(refresh=True)
+            for locator in locators:
+                node = snapshot.find(*locator)
+                if node is not None:
+                    return node
+            return None
+        return condition
+
+    def absent(self, *locators):
+        """StepWaiter condition: none of the locators present on a freshly fetched screen"""
+        def condition(driver):
+            snapshot = self.snapshot(refresh=True)
+            return all(snapshot.find(*locator) is None for locator in locators)
+        return condition
+
+    def settled(self, previous_hash=None, quiet=SETTLE_TIME, expected=None):
+        """StepWaiter condition: a new screen once it stops changing, or at once if expected() accepts it"""
+        latest = {}
+
+        def condition(driver):
+            snapshot = self.snapshot(refresh=True)
+            if snapshot.xml_hash == previous_hash:
+                return None
+            if expected is not None and expected(snapshot):
+                return snapshot
+            if latest.get("hash") != snapshot.xml_hash:
+                latest.update(hash=snapshot.xml_hash, since=time.monotonic())
+                return None
+            return snapshot if time.monotonic() - latest["since"] >= quiet else None
+        return condition
+
+    def tap(self, node):
+        """Tap the centre of a node, the only call that goes back to the device"""
+        x, y = node.center
+        self.driver.execute_script('mobile: clickGesture', {'x': x, 'y': y})
+        self.invalidate()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# PIDs and ports of what we started, so the next run can clean up after one that crashed
+STATE_FILE = os.path.join("cache", "supervisor.json")
+LOG_DIR = "logs"
+STOP_TIMEOUT = 10
+EXIT_POLL_INITIAL = 0.01
+EXIT_POLL_MAX = 0.25
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def supervisor():
+    """Process-wide supervisor, shared by the Appium and emulator helpers"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = ProcessSupervisor()
+        return _supervisor
+
+
+def _psutil():
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def pid_alive(pid, started_at=None):
+    """Whether pid is still running; with psutil, a recycled pid started later than started_at does not count"""
+    psutil = _psutil()
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return False
+            return started_at is None or process.create_time() <= started_at + 1
+        except psutil.Error:
+            return False
+    if os.name == "nt":
+        result = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"], capture_output=True, text=True)
+        return str(pid) in result.stdout
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        # Reaped children are gone; an unreaped one of ours still shows up until waited for
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+def port_open(port, host="127.0.0.1"):
+    with socket.socket() as sock:
+        sock.settimeout(0.2)
+        return sock.connect_ex((host, port)) == 0
+
+
+class ProcessSupervisor:
+    """Start child processes in their own process group, remember them, and stop only those"""
+
+    def __init__(self, state_file=STATE_FILE, log_dir=LOG_DIR):
+        self.state_file = state_file
+        self.log_dir = log_dir
+        self.processes = {}  # name -> Popen, for the processes this run started
+        self.records = self._load()  # name -> {"pid", "port", "command", "started_at"}, across runs
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, name, record):
+        """Write one entry (None removes it), keeping what other runs sharing the file have recorded since"""
+        records = self._load()
+        if record is None:
+            records.pop(name, None)
+        else:
+            records[name] = record
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(self.state_file + ".tmp", "w") as f:
+                json.dump(records, f, indent=2)
+            os.replace(self.state_file + ".tmp", self.state_file)
+        except OSError as e:
+            logger.error(f"Error saving supervisor state: {str(e)}")
+        self.records = records
+
+    def start(self, name, command, port=None, env=None):
+        """Launch command as a tracked child in its own process group, with its output in logs/<name>.log"""
+        with self._lock:
+            if name in self.records and pid_alive(self.records[name]["pid"], self.records[name]["started_at"]):
+                raise Exception(f"{name} is already running as pid {self.records[name]['pid']}")
+            os.makedirs(self.log_dir, exist_ok=True)
+            log = open(os.path.join(self.log_dir, f"{name}.log"), "ab")
+            if os.name == "nt":
+                group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+            else:
+                group = {"start_new_session": True}
+            process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                       env=env, **group)
+            log.close()
+            self.processes[name] = process
+            self._save(name, {"pid": process.pid, "port": port, "command": command, "started_at": time.time()})
+        logger.info(f"Started {name} as pid {process.pid}" + (f" on port {port}" if port else ""))
+        return process
+
+    def is_running(self, name):
+        record = self.records.get(name)
+        return record is not None and pid_alive(record["pid"], record["started_at"])
+
+    def _signal(self, name, pid, forced):
+        process = self.processes.get(name)
+        if os.name == "nt":
+            if not forced and process is not None:
+                # Reaches every console process in the child's group, like Ctrl+Break in its window
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                # The child's tree only, not every process with the same image name
+                subprocess.run(["taskkill", "/T"] + (["/F"] if forced else []) + ["/PID", str(pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            try:
+                os.killpg(pid, signal.SIGKILL if forced else signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def _wait_exit(self, name, record, timeout):
+        """Wait for the process to exit, polling quickly at first; return whether it did"""
+        process = self.processes.get(name)
+        if process is not None:
+            try:
+                process.wait(timeout)
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+        deadline = time.monotonic() + timeout
+        delay = EXIT_POLL_INITIAL
+        while pid_alive(record["pid"], record["started_at"]):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, EXIT_POLL_MAX)
+        return True
+
+    def stop(self, name, timeout=STOP_TIMEOUT):
+        """Ask the process (group) to exit, force it after timeout, and return once it is gone"""
+        # Another process sharing the state file, e.g. a pool worker, may have started it
+        self.records = self._load()
+        record = self.records.get(name)
+        if record is None:
+            return False
+        start = time.monotonic()
+        if self.is_running(name):
+            self._signal(name, record["pid"], forced=False)
+            if not self._wait_exit(name, record, timeout):
+                logger.warning(f"{name} (pid {record['pid']}) did not exit in {timeout}s, killing it")
+                self._signal(name, record["pid"], forced=True)
+                self._wait_exit(name, record, timeout)
+        elif name in self.processes:
+            self.processes[name].wait()
+        with self._lock:
+            self.processes.pop(name, None)
+            self._save(name, None)
+        logger.info(f"Stopped {name} in {(time.monotonic() - start) * 1000:.0f} ms")
+        return True
+
+    def stop_all(self, timeout=STOP_TIMEOUT):
+        """Stop everything recorded, in parallel, including what a crashed earlier run left behind"""
+        threads = [threading.Thread(target=self.stop, args=(name, timeout)) for name in list(self._load())]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def status(self):
+        return {name: dict(record, running=pid_alive(record["pid"], record["started_at"]),
+                           listening=bool(record["port"]) and port_open(record["port"]))
+                for name, record in self.records.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or stop the processes the booking runs started")
+    parser.add_argument("command", choices=["status", "stop"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "stop":
+        supervisor().stop_all()
+    for name, state in supervisor().status().items():
+        print(f"{name:<20} pid {state['pid']:<7} port {state['port'] or '-':<6} "
+              f"{'running' if state['running'] else 'gone'}{', listening' if state['listening'] else ''}")
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules sit at the repo root, where the benchmarks import them from too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in its own directory, so cache/ and logs/ never land in the repo"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+
+
+@pytest.fixture
+def server():
+    server = FakeAdbServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return AdbClient(port=server.port, timeout=5)
+
+
+def test_shell_returns_output_and_exit_code(server, client):
+    serial = server.add_emulator()
+    result = client.shell(serial, "echo hello; getprop sys.boot_completed")
+    assert (result.stdout, result.returncode) == ("hello\n1\n", 0)
+    assert client.shell(serial, "false").returncode == 1
+
+
+def test_devices_lists_serials_and_states(server, client):
+    serial = server.add_emulator()
+    assert client.devices() == {serial: "device"}
+
+
+def test_wait_for_follows_a_booting_emulator(server, client):
+    serial = server.add_emulator(boot_time=0.2)
+    assert client.devices()[serial] == "offline"
+    assert client.wait_for(serial, "device", timeout=5)
+
+
+def test_wait_for_sees_a_device_go_away(server, client):
+    serial = server.add_emulator()
+    assert client.wait_for(serial, timeout=5)
+    threading.Timer(0.1, server.remove_device, (serial,)).start()
+    assert client.wait_for(serial, None, timeout=5)
+
+
+def test_wait_for_times_out(server, client):
+    assert not client.wait_for("emulator-5554", timeout=0.2)
+
+
+def test_one_tracker_serves_every_wait(server, client):
+    first = server.add_emulator()
+    client.wait_for(first, timeout=5)
+    tracker = client.tracker()
+    second = server.add_emulator()
+    assert client.wait_for(second, timeout=5)
+    assert client.tracker() is tracker
+
+
+def test_emu_sends_console_commands(server, client):
+    serial = server.add_emulator()
+    client.emu(serial, "kill")
+    assert client.wait_for(serial, None, timeout=5)
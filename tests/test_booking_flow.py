@@ -0,0 +1,124 @@
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+from booking_flow import BOOKED, DAY_SELECTED, LOGGED_IN, PERMISSION, SEARCHED, SLOT_OPENED, START, BookingFlow
+
+# The screen each successful step leaves the app on
+SCREEN_AFTER = {
+    "handle_permission_popup": "search",
+    "search_studio": "login",
+    "log_in": "home",
+    "select_day": "schedule",
+    "open_slot": None,
+    "complete_booking": None,
+}
+
+
+class FakeBooker:
+    """Steps fail as many times as asked; recoveries land on the screen given for them or raise the error given"""
+
+    def __init__(self, screen="permission", failures=None, recovered_screens=None, recover_errors=None):
+        self.screen = screen
+        self.failures = dict(failures or {})
+        self.recovered_screens = recovered_screens or {}
+        self.recover_errors = recover_errors or {}
+        self.calls = []
+
+    def detect_screen(self, timeout=None):
+        return self.screen
+
+    def __getattr__(self, name):
+        if name.startswith("recover_"):
+            action = name[len("recover_"):]
+
+            def recover():
+                self.calls.append(f"recover {action}")
+                if action in self.recover_errors:
+                    raise self.recover_errors[action]
+                self.screen = self.recovered_screens.get(action, "schedule")
+            return recover
+        if name in SCREEN_AFTER:
+            def step():
+                self.calls.append(name)
+                if self.failures.get(name):
+                    self.failures[name] -= 1
+                    raise Exception(f"{name} failed")
+                self.screen = SCREEN_AFTER[name]
+            return step
+        raise AttributeError(name)
+
+
+def checkpoints(history):
+    return [checkpoint for checkpoint, _ in history]
+
+
+def test_clean_run_reaches_every_checkpoint():
+    booker = FakeBooker()
+    history = BookingFlow(booker).run()
+    assert checkpoints(history) == [START, PERMISSION, SEARCHED, LOGGED_IN, DAY_SELECTED, SLOT_OPENED, BOOKED]
+
+
+def test_starts_after_the_checkpoint_of_the_screen_on_show():
+    booker = FakeBooker(screen="home")
+    BookingFlow(booker).run()
+    assert booker.calls == ["select_day", "open_slot", "complete_booking"]
+
+
+def test_a_step_that_keeps_failing_escalates_through_the_recoveries():
+    booker = FakeBooker(screen="home", failures={"open_slot": 3})
+    flow = BookingFlow(booker)
+    history = flow.run()
+    assert [call for call in booker.calls if call.startswith("recover")] == [
+        "recover refind", "recover back", "recover relaunch"]
+    # Each recovery resumes from the schedule, so the day is picked again before the slot is retried
+    assert booker.calls[:5] == ["select_day", "open_slot", "recover refind", "select_day", "open_slot"]
+    assert checkpoints(history)[-1] == BOOKED
+    assert flow.recoveries == 3
+
+
+def test_a_recovery_that_lands_nowhere_moves_on_to_the_next():
+    booker = FakeBooker(screen="home", failures={"open_slot": 1}, recovered_screens={"refind": None, "back": None})
+    BookingFlow(booker).run()
+    assert [call for call in booker.calls if call.startswith("recover")] == [
+        "recover refind", "recover back", "recover relaunch"]
+
+
+def test_an_unknown_start_screen_begins_with_back():
+    booker = FakeBooker(screen=None, recovered_screens={"back": "home"})
+    BookingFlow(booker).run()
+    assert booker.calls[:2] == ["recover back", "select_day"]
+
+
+def test_success_resets_the_escalation_for_that_step():
+    booker = FakeBooker(screen="home", failures={"select_day": 1, "open_slot": 1})
+    BookingFlow(booker).run()
+    assert [call for call in booker.calls if call.startswith("recover")] == ["recover refind", "recover refind"]
+
+
+def test_gives_up_after_max_recoveries():
+    booker = FakeBooker(screen="home", failures={"open_slot": 10})
+    with pytest.raises(Exception, match="Giving up after 2 recoveries"):
+        BookingFlow(booker, max_recoveries=2).run()
+
+
+def test_a_recovery_that_raises_moves_on_to_the_next():
+    booker = FakeBooker(screen="home", failures={"open_slot": 1},
+                        recover_errors={"refind": WebDriverException("element went stale")})
+    history = BookingFlow(booker).run()
+    assert [call for call in booker.calls if call.startswith("recover")] == ["recover refind", "recover back"]
+    assert checkpoints(history)[-1] == BOOKED
+
+
+def test_a_dead_session_goes_straight_to_reset():
+    booker = FakeBooker(screen="home", failures={"open_slot": 1},
+                        recover_errors={"refind": InvalidSessionIdException("invalid session id")})
+    history = BookingFlow(booker).run()
+    assert [call for call in booker.calls if call.startswith("recover")] == ["recover refind", "recover reset"]
+    assert checkpoints(history)[-1] == BOOKED
+
+
+def test_gives_up_when_every_recovery_raises():
+    errors = {action: WebDriverException("no such element") for action in ["refind", "back", "relaunch", "reset"]}
+    booker = FakeBooker(screen="home", failures={"open_slot": 1}, recover_errors=errors)
+    with pytest.raises(Exception, match="Could not recover from failed open_slot step"):
+        BookingFlow(booker).run()
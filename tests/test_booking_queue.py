@@ -0,0 +1,37 @@
+import json
+
+from booking_queue import load_jobs, parse_job
+
+
+def test_parse_job_by_slot():
+    assert parse_job("Sat:0:3") == {"day_of_week": "Sat", "categories_to_skip": 0, "slot_number": 3}
+
+
+def test_parse_job_by_class_keeps_the_colon_in_the_time():
+    assert parse_job("Sat:Yoga Flow:15:00") == {"day_of_week": "Sat", "categories_to_skip": 0, "slot_number": 1,
+                                                "class_name": "Yoga Flow", "start_time": "15:00"}
+
+
+def test_parse_job_by_class_name_alone():
+    assert parse_job("Sat:Yoga Flow")["start_time"] is None
+
+
+def test_load_jobs_text_skips_comments_and_blank_lines(tmp_path):
+    path = tmp_path / "jobs.txt"
+    path.write_text("# weekend\nSat:0:3\n\nSun:Reformer Pilates:09:30\n")
+    assert load_jobs(str(path)) == [
+        {"day_of_week": "Sat", "categories_to_skip": 0, "slot_number": 3},
+        {"day_of_week": "Sun", "categories_to_skip": 0, "slot_number": 1,
+         "class_name": "Reformer Pilates", "start_time": "09:30"},
+    ]
+
+
+def test_load_jobs_json_fills_in_defaults(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps([{"day_of_week": "Sat", "class_name": "Barre", "start_time": "12:00"},
+                                {"day_of_week": "Sun", "slot_number": 2}]))
+    assert load_jobs(str(path)) == [
+        {"day_of_week": "Sat", "categories_to_skip": 0, "slot_number": 1, "class_name": "Barre",
+         "start_time": "12:00"},
+        {"day_of_week": "Sun", "categories_to_skip": 0, "slot_number": 2},
+    ]
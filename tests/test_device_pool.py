@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+from supervisor import pid_alive
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+class FakeBooker:
+    def __init__(self, device, **job):
+        self.job = job
+
+    def run_booking_flow(self):
+        return True
+
+
+class ReusedEmulator:
+    def __init__(self, serial, avd=None):
+        pass
+
+    def start(self):
+        return "reused"
+
+
+@pytest.fixture
+def device_pool(workdir, monkeypatch):
+    # Imported here because demo sets up logging into the working directory on import
+    import device_pool
+    monkeypatch.setattr(device_pool, "EmulatorManager", ReusedEmulator)
+    return device_pool
+
+
+def test_jobs_accept_class_names(device_pool):
+    assert device_pool.parse_job("Sat:Yoga Flow:15:00")["class_name"] == "Yoga Flow"
+
+
+def test_devices_get_their_own_ports_and_avds(device_pool):
+    first, second = device_pool.make_devices(2, ["Pixel_A"])
+    assert (first.serial, first.appium_port, first.system_port, first.avd) == ("emulator-5554", 4723, 8200, "Pixel_A")
+    assert (second.serial, second.appium_port, second.system_port, second.avd) == ("emulator-5556", 4724, 8201, None)
+
+
+def test_appium_servers_the_workers_started_are_stopped(device_pool, monkeypatch, workdir):
+    from supervisor import supervisor
+
+    def start_appium(port):
+        process = supervisor().start(device_pool.appium_name(port), SLEEPER, port=port)
+        (workdir / f"appium-{port}.pid").write_text(str(process.pid))
+        return True
+    monkeypatch.setattr(device_pool, "is_appium_running", lambda port: False)
+    monkeypatch.setattr(device_pool, "start_appium", start_appium)
+
+    jobs = [device_pool.parse_job("Sat:0:3"), device_pool.parse_job("Sun:Barre:12:00")]
+    results = device_pool.run_pool(jobs, device_pool.make_devices(2), booker_factory=FakeBooker)
+    assert all(result["ok"] for result in results)
+    pids = [int(path.read_text()) for path in workdir.glob("appium-*.pid")]
+    assert len(pids) == 2
+    assert not any(pid_alive(pid) for pid in pids)
+    assert supervisor().status() == {}
@@ -0,0 +1,130 @@
+import os
+import socket
+import sys
+
+import pytest
+
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+from emulator import PROFILES, EmulatorManager, boot_time_report, record_boot_time
+from supervisor import ProcessSupervisor
+
+# Stands in for the emulator process; the fake server's console plays its adb side
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+# Stands in for the emulator binary: serves a console, boots in scripted time and registers with adb
+FAKE_EMULATOR = [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                              "benchmarks", "fake_emulator.py")]
+AVD = "Test_API_35"
+
+
+@pytest.fixture
+def server():
+    server = FakeAdbServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def supervisor(workdir):
+    supervisor = ProcessSupervisor(state_file=str(workdir / "supervisor.json"), log_dir=str(workdir / "logs"))
+    yield supervisor
+    supervisor.stop_all(timeout=1)
+
+
+@pytest.fixture
+def avd_home(workdir, server, monkeypatch):
+    home = workdir / "avd"
+    (home / f"{AVD}.avd").mkdir(parents=True)
+    # Inherited by the stand-in binary, which registers with the fake server and boots at 1% of its scripted times
+    monkeypatch.setenv("ANDROID_ADB_SERVER_PORT", str(server.port))
+    monkeypatch.setenv("ANDROID_AVD_HOME", str(home))
+    monkeypatch.setenv("FAKE_EMULATOR_SCALE", "0.01")
+    return home
+
+
+def free_serial():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"emulator-{sock.getsockname()[1]}"
+
+
+def manager(server, supervisor, serial, **options):
+    return EmulatorManager(serial, adb=AdbClient(port=server.port, timeout=5), supervisor=supervisor, **options)
+
+
+def fake_manager(server, supervisor, avd_home, workdir, **options):
+    return manager(server, supervisor, free_serial(), avd=AVD, command=FAKE_EMULATOR, avd_home=str(avd_home),
+                   boot_times_file=str(workdir / "boot_times.jsonl"), **options)
+
+
+def test_boots_cold_then_from_the_snapshot_then_reuses_it(server, supervisor, avd_home, workdir):
+    emulator = fake_manager(server, supervisor, avd_home, workdir)
+    assert emulator.start(snapshot=False, reuse=False, timeout=30) == "cold"
+    emulator.save_snapshot()
+    assert emulator.stop(timeout=5)
+    assert emulator.start(timeout=30) == "snapshot"
+    assert emulator.start(timeout=30) == "reused"
+    assert supervisor.is_running(emulator.serial)
+    assert [(mode, count) for _, mode, count, _, _ in boot_time_report(str(workdir / "boot_times.jsonl"))] == [
+        ("cold", 1), ("reused", 1), ("snapshot", 1)]
+
+
+def test_boot_command_uses_the_snapshot_only_when_there_is_one(server, supervisor, avd_home, workdir):
+    emulator = fake_manager(server, supervisor, avd_home, workdir)
+    assert "-snapshot" not in emulator.boot_command() and "-no-snapshot-load" not in emulator.boot_command()
+    (avd_home / f"{AVD}.avd" / "snapshots" / "booking_home").mkdir(parents=True)
+    assert emulator.boot_command()[-3:] == ["-snapshot", "booking_home", "-no-snapshot-save"]
+    assert emulator.boot_command(snapshot=False)[-1] == "-no-snapshot-load"
+
+
+def test_profiles_add_their_flags(server, supervisor, avd_home, workdir):
+    for profile, flags in PROFILES.items():
+        command = fake_manager(server, supervisor, avd_home, workdir, profile=profile).boot_command()
+        assert command[len(FAKE_EMULATOR) + 4:] == flags
+    with pytest.raises(ValueError, match="Unknown emulator profile"):
+        fake_manager(server, supervisor, avd_home, workdir, profile="fast")
+
+
+def test_boot_time_report_groups_by_profile_and_mode(workdir):
+    path = str(workdir / "boot_times.jsonl")
+    for seconds in (10, 30, 20):
+        record_boot_time(AVD, "window", "cold", seconds, path)
+    record_boot_time(AVD, "headless", "snapshot", 4, path)
+    assert boot_time_report(path) == [("headless", "snapshot", 1, 4, 4), ("window", "cold", 3, 20, 10)]
+    assert boot_time_report(str(workdir / "missing.jsonl")) == []
+
+
+def test_reuses_a_healthy_emulator_it_did_not_start(server, supervisor, workdir):
+    serial = server.add_emulator()
+    emulator = manager(server, supervisor, serial, boot_times_file=str(workdir / "boot_times.jsonl"))
+    assert emulator.start() == "reused"
+    assert serial in server.devices
+
+
+def test_start_refuses_an_emulator_it_did_not_start_and_cannot_use(server, supervisor):
+    serial = server.add_emulator(boot_time=30)
+    with pytest.raises(Exception, match=f"{serial} is taken by an emulator this script did not start"):
+        manager(server, supervisor, serial).start(timeout=1)
+    assert serial in server.devices
+
+
+def test_stop_leaves_an_emulator_it_did_not_start_running(server, supervisor):
+    serial = server.add_emulator()
+    assert not manager(server, supervisor, serial).stop(timeout=1)
+    assert serial in server.devices
+
+
+def test_stop_shuts_down_an_emulator_it_started(server, supervisor):
+    serial = server.add_emulator()
+    process = supervisor.start(serial, SLEEPER)
+    assert manager(server, supervisor, serial).stop(timeout=5)
+    assert serial not in server.devices
+    assert process.poll() is not None
+    assert not supervisor.is_running(serial)
+
+
+def test_stop_drops_the_record_of_an_emulator_that_already_exited(server, supervisor):
+    serial = "emulator-5554"
+    supervisor.start(serial, [sys.executable, "-c", "pass"]).wait(5)
+    assert manager(server, supervisor, serial).stop(timeout=1)
+    assert serial not in supervisor.records
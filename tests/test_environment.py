@@ -0,0 +1,92 @@
+import threading
+import time
+
+from environment import Environment
+
+
+def counting_environment(ttls=None):
+    env = Environment(ttls)
+    calls = []
+
+    def probe(*args):
+        calls.append(args)
+        return len(calls)
+    env.probes = {name: probe for name in env.probes}
+    return env, calls
+
+
+def test_answers_are_cached_for_their_ttl():
+    env, calls = counting_environment({"devices": 0.05})
+    assert env.get("devices") == 1
+    assert env.get("devices") == 1
+    time.sleep(0.06)
+    assert env.get("devices") == 2
+    assert env.probe_counts["devices"] == 2
+
+
+def test_arguments_are_cached_separately():
+    env, calls = counting_environment()
+    env.get("appium", 4723)
+    env.get("appium", 4724)
+    env.get("appium", 4723)
+    assert calls == [(4723,), (4724,)]
+
+
+def test_fresh_skips_the_cache():
+    env, calls = counting_environment()
+    env.get("wifi")
+    assert env.get("wifi", fresh=True) == 2
+
+
+def test_invalidate_drops_only_the_named_probes():
+    env, calls = counting_environment()
+    env.get("wifi")
+    env.get("devices")
+    env.invalidate("devices")
+    assert env.get("wifi") == 1
+    assert env.get("devices") == 3
+
+
+def test_invalidate_with_no_names_drops_everything():
+    env, calls = counting_environment()
+    env.get("wifi")
+    env.get("devices")
+    env.invalidate()
+    env.get("wifi")
+    env.get("devices")
+    assert len(calls) == 4
+
+
+def test_an_answer_from_before_an_invalidate_is_not_cached():
+    env = Environment()
+    started, release = threading.Event(), threading.Event()
+    answers = iter(["stale", "fresh"])
+
+    def probe():
+        started.set()
+        release.wait(5)
+        return next(answers)
+    env.probes["devices"] = probe
+
+    thread = threading.Thread(target=env.get, args=("devices",))
+    thread.start()
+    started.wait(5)
+    env.invalidate("devices")
+    release.set()
+    thread.join(5)
+    assert env.get("devices") == "fresh"
+
+
+def test_concurrent_callers_share_one_probe():
+    env = Environment()
+    calls = []
+
+    def probe():
+        calls.append(1)
+        time.sleep(0.05)
+        return "answer"
+    env.probes["avds"] = probe
+
+    results = env.gather(("avds",), ("avds",), ("avds",))
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
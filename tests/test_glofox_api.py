@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from benchmarks.fake_glofox_api import FakeGlofoxApi
+from glofox_api import GlofoxApiBooker, book_via_api, next_date
+
+EMAIL = "[EMAIL]"
+PASSWORD = "[PASSWORD]"
+
+
+@pytest.fixture
+def api():
+    server = FakeGlofoxApi(latency=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def book(api, workdir, class_name="Reformer Pilates", start_time="07:00", password=PASSWORD, **options):
+    return book_via_api(EMAIL, password, "Sat", class_name, start_time, base_url=api.url,
+                        token_file=str(workdir / "api_token.json"), **options)
+
+
+def test_books_the_class_at_that_time(api, workdir):
+    assert book(api, workdir, start_time="18:00")
+    assert api.bookings == [f"{next_date('Sat'):%Y%m%d}-1800"]
+
+
+def test_without_a_start_time_books_the_first_class_of_that_name(api, workdir):
+    assert book(api, workdir, start_time=None)
+    assert api.bookings == [f"{next_date('Sat'):%Y%m%d}-0700"]
+
+
+def test_cached_token_skips_the_login(api, workdir):
+    assert book(api, workdir)
+    requests = api.requests
+    assert book(api, workdir)
+    # Listing and booking only
+    assert api.requests - requests == 2
+
+
+def test_expired_token_logs_in_again(api, workdir):
+    assert book(api, workdir)
+    api.expire_token()
+    assert book(api, workdir)
+    assert len(api.bookings) == 2
+
+
+def test_falls_back_when_the_class_is_not_on(api, workdir):
+    assert not book(api, workdir, class_name="Spin")
+    assert api.bookings == []
+
+
+def test_falls_back_when_the_login_is_rejected(api, workdir):
+    assert not book(api, workdir, password="wrong")
+
+
+def test_falls_back_when_the_booking_failed(api, workdir):
+    api.booking_status = 502
+    assert not book(api, workdir)
+    assert api.bookings == []
+
+
+def test_an_error_after_the_server_booked_does_not_fall_back(api, workdir):
+    api.booking_status = 502
+    api.books_on_error = True
+    assert book(api, workdir)
+    assert len(api.bookings) == 1
+
+
+def test_has_booking_only_counts_that_class(api, workdir):
+    booker = GlofoxApiBooker(EMAIL, PASSWORD, base_url=api.url, token_file=str(workdir / "api_token.json"))
+    class_id = booker.find_class("Sat", "Barre", "12:00")
+    assert not booker.has_booking(class_id)
+    booker.book(booker.find_class("Sat", "Stretch", "19:00"))
+    assert not booker.has_booking(class_id)
+    booker.book(class_id)
+    assert booker.has_booking(class_id)
+
+
+def test_books_at_the_release_time(api, workdir):
+    release_at = datetime.now() + timedelta(seconds=0.2)
+    assert book(api, workdir, release_at=release_at)
+    assert len(api.bookings) == 1
+    assert datetime.now() >= release_at
+
+
+def test_next_date_counts_today():
+    sunday = date(2026, 10, 18)
+    assert next_date("Sun", sunday) == sunday
+    assert next_date("Mon", sunday) == date(2026, 10, 19)
+    assert next_date("Sat", sunday) == date(2026, 10, 24)
@@ -0,0 +1,65 @@
+from appium.webdriver.common.appiumby import AppiumBy
+
+from locators import compile_locator, quote
+from snapshot import PageSnapshot
+
+# The slot card's View is both a direct child of the button and a grandchild inside its frame
+HIERARCHY = """<hierarchy>
+  <android.widget.Button content-desc="Tap here to boo" bounds="[0,0][100,100]">
+    <android.view.View text="direct" bounds="[0,0][50,50]"/>
+    <android.widget.FrameLayout bounds="[50,50][100,100]">
+      <android.view.View text="nested" bounds="[50,50][100,100]"/>
+    </android.widget.FrameLayout>
+  </android.widget.Button>
+</hierarchy>"""
+
+
+def test_content_desc_becomes_accessibility_id():
+    compiled = compile_locator((AppiumBy.XPATH, "//*[@content-desc='Book']"))
+    assert compiled.locator == (AppiumBy.ACCESSIBILITY_ID, "Book")
+    assert compiled.native
+
+
+def test_resource_id_becomes_id():
+    compiled = compile_locator((AppiumBy.XPATH, "//*[@resource-id='com.glofox.app:id/book']"))
+    assert compiled.locator == (AppiumBy.ID, "com.glofox.app:id/book")
+
+
+def test_class_and_text_become_uiselector():
+    compiled = compile_locator((AppiumBy.XPATH, "//android.widget.TextView[@text='Sat']"))
+    assert compiled.locator == (AppiumBy.ANDROID_UIAUTOMATOR,
+                                'new UiSelector().className("android.widget.TextView").text("Sat")')
+
+
+def test_boolean_attributes_are_not_quoted():
+    compiled = compile_locator((AppiumBy.XPATH, "//*[@scrollable='true']"))
+    assert compiled.value == "new UiSelector().scrollable(true)"
+
+
+def test_descendant_steps_become_child_selectors():
+    compiled = compile_locator((AppiumBy.XPATH, "//android.widget.Button[@content-desc='Go']//android.view.View"))
+    assert compiled.native
+    assert compiled.value == ('new UiSelector().className("android.widget.Button").description("Go")'
+                              '.childSelector(new UiSelector().className("android.view.View"))')
+
+
+def test_direct_child_step_is_left_to_the_snapshot():
+    locator = (AppiumBy.XPATH, "//android.widget.Button[@content-desc='Tap here to boo']/android.view.View")
+    compiled = compile_locator(locator)
+    assert not compiled.native
+    # childSelector would also have matched the nested View
+    assert [node.text for node in PageSnapshot(HIERARCHY).find_all(*locator)] == ["direct"]
+
+
+def test_attributes_uiselector_cannot_match_are_left_to_the_snapshot():
+    assert not compile_locator((AppiumBy.XPATH, "//android.view.View[@bounds='[0,0][50,50]']")).native
+
+
+def test_other_strategies_pass_through():
+    compiled = compile_locator((AppiumBy.ID, "com.glofox.app:id/book"))
+    assert compiled.locator == (AppiumBy.ID, "com.glofox.app:id/book")
+    assert compiled.native
+
+
+def test_quote_escapes_quotes_and_backslashes():
+    assert quote('say "hi" \\o/') == '"say \\"hi\\" \\\\o/"'
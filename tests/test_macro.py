@@ -0,0 +1,97 @@
+import json
+import logging
+
+import pytest
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+from adb_client import AdbClient
+from benchmarks.fake_adb import FakeAdbServer
+from benchmarks.fake_appium import FakeAppium
+from booking_flow import SLOT_OPENED
+
+SECRETS = {"{EMAIL}": "[EMAIL]", "{PASSWORD}": "[PASSWORD]"}
+
+
+@pytest.fixture
+def app(workdir):
+    """Start a fresh app for each run, with adb input reaching it like on a real device"""
+    # Imported here because demo sets up logging into the working directory on import
+    from demo import Device, GlofoxBooker
+    from macro import MacroStore
+
+    adb_server = FakeAdbServer().start()
+    serial = adb_server.add_emulator()
+    servers = []
+
+    def start():
+        server = FakeAppium(latency=0, dump_latency=0, load_time=0.05).start()
+        servers.append(server)
+        adb_server.devices[serial].on_input = server.device_input
+        options = UiAutomator2Options()
+        options.platform_name = 'Android'
+        options.automation_name = 'UiAutomator2'
+        booker = GlofoxBooker(driver=webdriver.Remote(server.url, options=options), device=Device(serial),
+                              check_wifi=False, reuse_session=False, day_of_week="Sat", categories_to_skip=0,
+                              slot_number=3)
+        return booker, server
+
+    start.store = MacroStore(str(workdir / "macros"))
+    start.adb = AdbClient(port=adb_server.port)
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    adb_server.stop()
+
+
+def run(app):
+    from macro import run_with_macro
+
+    booker, server = app()
+    assert run_with_macro(booker, SECRETS, store=app.store, adb=app.adb)
+    return booker, server
+
+
+def stored_macros(app, booker):
+    from macro import job_key
+
+    return job_key(booker), app.store.load(job_key(booker))
+
+
+def screen(server):
+    return next(iter(server.sessions.values()))["state"].screen
+
+
+def test_recorded_run_is_replayed_with_fewer_appium_calls(app):
+    _, server = run(app)
+    recorded = server.calls
+    assert screen(server) == "booked"
+    _, server = run(app)
+    assert screen(server) == "booked"
+    assert server.calls < recorded / 2
+
+
+def test_segments_know_the_checkpoint_they_start_from(app):
+    booker, _ = run(app)
+    _, macros = stored_macros(app, booker)
+    assert SLOT_OPENED in [segment["checkpoint"] for macro in macros.values() for segment in macro["segments"]]
+
+
+def test_a_mismatch_carries_on_from_the_macro_checkpoint(app, caplog):
+    booker, _ = run(app)
+    key, macros = stored_macros(app, booker)
+    for macro in macros.values():
+        for segment in macro["segments"]:
+            if segment["checkpoint"] == SLOT_OPENED:
+                segment["actions"][0]["anchor"] = ["Somewhere else"]
+    with open(app.store._path(key), "w") as f:
+        json.dump(macros, f)
+
+    caplog.set_level(logging.INFO)
+    booker, server = run(app)
+    assert screen(server) == "booked"
+    assert f"resuming after checkpoint '{SLOT_OPENED}'" in caplog.text
+    # The replay got as far as the class screen, so the day and slot are not picked again
+    assert "Checkpoint 'logged in'" not in caplog.text.split("Macro mismatch")[1]
+    assert app.store.load(key) == {}
@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+
+from benchmarks.fake_appium import FakeAppium
+from slot_finder import SWEEP_PERCENT, SlotFinder, _key
+from snapshot import SnapshotCache
+
+
+@pytest.fixture
+def driver():
+    server = FakeAppium(latency=0, dump_latency=0, load_time=0, start_screen="schedule").start()
+    options = UiAutomator2Options()
+    options.platform_name = 'Android'
+    options.automation_name = 'UiAutomator2'
+    driver = webdriver.Remote(server.url, options=options)
+    yield driver
+    driver.quit()
+    server.shutdown()
+    server.server_close()
+
+
+def finder(driver, workdir):
+    return SlotFinder(driver, SnapshotCache(driver), cache_file=str(workdir / "slot_offsets.json"))
+
+
+def cached_page(workdir, driver, class_name, start_time):
+    return finder(driver, workdir).offsets["Sat"][_key(class_name, start_time)]
+
+
+def test_finds_the_card_at_that_time(driver, workdir):
+    slot = finder(driver, workdir).find("Sat", "Yoga Flow", "15:00")
+    assert slot.text.startswith("15:00")
+
+
+def test_without_a_start_time_finds_the_first_card_of_that_name(driver, workdir):
+    slot = finder(driver, workdir).find("Sat", "Yoga Flow", None)
+    assert slot.text.startswith("07:00")
+
+
+def test_only_the_matched_card_is_cached(driver, workdir):
+    slots = finder(driver, workdir)
+    assert slots.find("Sat", "Yoga Flow", "07:00").text.startswith("07:00")
+    # Yoga Flow at 15:00 is further down, so the page it was seen on says nothing about where it starts
+    assert set(slots.offsets["Sat"]) == {"Yoga Flow@07:00"}
+
+
+def test_sweep_counts_pages_from_the_top_when_the_list_was_left_scrolled(driver, workdir):
+    finder(driver, workdir).find("Sat", "Yoga Flow", "15:00")
+    from_top = cached_page(workdir, driver, "Yoga Flow", "15:00")
+    (workdir / "slot_offsets.json").unlink()
+
+    slots = finder(driver, workdir)
+    slots._scroll(3 * SWEEP_PERCENT)
+    slots._scroll(3 * SWEEP_PERCENT)
+    assert slots.find("Sat", "Yoga Flow", "15:00").text.startswith("15:00")
+    assert cached_page(workdir, driver, "Yoga Flow", "15:00") == from_top
+
+
+def test_cached_offset_applies_from_the_top_when_the_list_was_left_scrolled(driver, workdir, caplog):
+    finder(driver, workdir).find("Sat", "Yoga Flow", "15:00")
+    from_top = cached_page(workdir, driver, "Yoga Flow", "15:00")
+
+    slots = finder(driver, workdir)
+    slots._scroll(3 * SWEEP_PERCENT)
+    with caplog.at_level(logging.INFO, logger="slot_finder"):
+        assert slots.find("Sat", "Yoga Flow", "15:00").text.startswith("15:00")
+    assert "at cached offset" in caplog.text
+    assert "stale" not in caplog.text
+    assert cached_page(workdir, driver, "Yoga Flow", "15:00") == from_top
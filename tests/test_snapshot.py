@@ -0,0 +1,78 @@
+from appium.webdriver.common.appiumby import AppiumBy
+
+from snapshot import SnapshotCache
+
+HOME = """<hierarchy>
+  <android.widget.FrameLayout bounds="[0,0][1080,1920]">
+    <android.widget.Button content-desc="Tap here to book" resource-id="com.glofox.app:id/book"
+                           bounds="[100,200][300,400]"/>
+    <android.widget.TextView text="Sat" bounds="[0,500][100,600]"/>
+  </android.widget.FrameLayout>
+</hierarchy>"""
+SCHEDULE = HOME.replace('text="Sat"', 'text="Sun"')
+
+
+class FakeDriver:
+    def __init__(self, page_source):
+        self.page_source_value = page_source
+        self.taps = []
+
+    @property
+    def page_source(self):
+        return self.page_source_value
+
+    def execute_script(self, script, args):
+        self.taps.append((script, args))
+
+
+def test_snapshot_is_reused_until_invalidated():
+    cache = SnapshotCache(FakeDriver(HOME))
+    first = cache.snapshot()
+    assert cache.snapshot() is first
+    assert cache.fetches == 1
+
+    cache.invalidate()
+    cache.snapshot()
+    assert cache.fetches == 2
+
+
+def test_refresh_fetches_again_but_reuses_the_parse_of_an_unchanged_screen():
+    cache = SnapshotCache(FakeDriver(HOME))
+    first = cache.snapshot()
+    assert cache.snapshot(refresh=True) is first
+    assert (cache.fetches, cache.parses) == (2, 1)
+
+
+def test_a_changed_screen_is_parsed_and_the_old_one_kept():
+    driver = FakeDriver(HOME)
+    cache = SnapshotCache(driver)
+    home = cache.snapshot()
+    driver.page_source_value = SCHEDULE
+    assert cache.snapshot(refresh=True).find(AppiumBy.XPATH, "//android.widget.TextView[@text='Sun']") is not None
+    driver.page_source_value = HOME
+    assert cache.snapshot(refresh=True) is home
+    assert cache.parses == 2
+
+
+def test_locators_resolve_from_the_indexes():
+    snapshot = SnapshotCache(FakeDriver(HOME)).snapshot()
+    by_desc = snapshot.find(AppiumBy.ACCESSIBILITY_ID, "Tap here to book")
+    assert by_desc is snapshot.find(AppiumBy.ID, "com.glofox.app:id/book")
+    assert by_desc.center == (200, 300)
+    assert snapshot.find(AppiumBy.XPATH, "//*[@text='Mon']") is None
+
+
+def test_located_refreshes_on_every_poll():
+    driver = FakeDriver(HOME)
+    cache = SnapshotCache(driver)
+    condition = cache.located((AppiumBy.XPATH, "//*[@text='Sun']"), (AppiumBy.XPATH, "//*[@text='Sat']"))
+    assert condition(driver).text == "Sat"
+    driver.page_source_value = SCHEDULE
+    assert condition(driver).text == "Sun"
+
+
+def test_tap_taps_the_node_centre():
+    driver = FakeDriver(HOME)
+    cache = SnapshotCache(driver)
+    cache.tap(cache.snapshot().find(AppiumBy.ID, "com.glofox.app:id/book"))
+    assert driver.taps == [('mobile: clickGesture', {'x': 200, 'y': 300})]
@@ -0,0 +1,63 @@
+import json
+import sys
+import time
+
+import pytest
+
+from supervisor import ProcessSupervisor, pid_alive
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+# Ignores SIGTERM, so only the forced kill stops it
+STUBBORN = [sys.executable, "-c", "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                                  "print('ready', flush=True); time.sleep(30)"]
+
+
+@pytest.fixture
+def supervisor(workdir):
+    supervisor = ProcessSupervisor(state_file=str(workdir / "supervisor.json"), log_dir=str(workdir / "logs"))
+    yield supervisor
+    supervisor.stop_all(timeout=1)
+
+
+def test_start_records_the_process(supervisor, workdir):
+    process = supervisor.start("appium-4723", SLEEPER, port=4723)
+    assert supervisor.is_running("appium-4723")
+    record = json.loads((workdir / "supervisor.json").read_text())["appium-4723"]
+    assert (record["pid"], record["port"]) == (process.pid, 4723)
+
+
+def test_stop_ends_the_process_and_drops_its_record(supervisor, workdir):
+    process = supervisor.start("appium-4723", SLEEPER)
+    assert supervisor.stop("appium-4723")
+    assert process.poll() is not None
+    assert json.loads((workdir / "supervisor.json").read_text()) == {}
+
+
+def test_a_later_run_can_stop_what_an_earlier_one_started(supervisor, workdir):
+    process = supervisor.start("emulator-5554", SLEEPER)
+    later = ProcessSupervisor(state_file=supervisor.state_file, log_dir=supervisor.log_dir)
+    assert later.is_running("emulator-5554")
+    assert later.stop("emulator-5554", timeout=5)
+    process.wait(5)
+    assert not pid_alive(process.pid)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGTERM cannot be ignored on Windows")
+def test_a_process_that_ignores_the_signal_is_killed(supervisor, workdir):
+    process = supervisor.start("appium-4723", STUBBORN)
+    # Wait until the handler is installed, or SIGTERM could land before it is
+    deadline = time.monotonic() + 5
+    while "ready" not in (workdir / "logs" / "appium-4723.log").read_text() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert supervisor.stop("appium-4723", timeout=0.5)
+    assert process.poll() is not None
+
+
+def test_starting_twice_is_refused(supervisor):
+    supervisor.start("appium-4723", SLEEPER)
+    with pytest.raises(Exception, match="already running"):
+        supervisor.start("appium-4723", SLEEPER)
+
+
+def test_stopping_something_never_started_does_nothing(supervisor):
+    assert not supervisor.stop("appium-4723")
@@ -0,0 +1,47 @@
+import time
+from datetime import datetime
+
+from timed_trigger import fire_at, wait_until
+
+
+def in_seconds(seconds):
+    return datetime.fromtimestamp(time.time() + seconds)
+
+
+def test_wait_until_returns_at_the_target():
+    target = in_seconds(0.2)
+    wait_until(target)
+    assert 0 <= time.time() - target.timestamp() < 0.05
+
+
+def test_a_fast_local_clock_fires_early_by_the_offset():
+    # The reference clock is 0.15 s ahead of ours, so its target comes 0.15 s sooner on the local clock
+    target = in_seconds(0.2)
+    wait_until(target, clock_offset=0.15)
+    assert 0.1 < target.timestamp() - time.time() < 0.2
+
+
+def test_a_slow_local_clock_fires_late_by_the_offset():
+    target = in_seconds(0.05)
+    wait_until(target, clock_offset=-0.15)
+    assert 0.1 < time.time() - target.timestamp() < 0.2
+
+
+def test_a_past_target_returns_at_once():
+    start = time.monotonic()
+    wait_until(in_seconds(-5))
+    assert time.monotonic() - start < 0.05
+
+
+def test_keepalive_runs_while_parked():
+    calls = []
+    wait_until(in_seconds(1.5), keepalive=lambda: calls.append(time.monotonic()), keepalive_interval=0.5)
+    assert calls
+
+
+def test_fire_at_runs_the_action_lead_seconds_early_and_returns_its_result():
+    target = in_seconds(0.3)
+    fired = []
+    result = fire_at(target, lambda: fired.append(time.time()) or "booked", lead=0.1)
+    assert result == "booked"
+    assert 0.05 < target.timestamp() - fired[0] < 0.15
@@ -0,0 +1,115 @@
+import argparse
+import logging
+import socket
+import struct
+import sys
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+NTP_SERVER = "pool.ntp.org"
+NTP_EPOCH_DELTA = 2208988800  # Seconds between 1900-01-01 and 1970-01-01
+# Sleep until this close to the target, then busy-wait so the OS timer granularity doesn't matter
+SPIN_WINDOW = 0.05
+# Appium ends sessions idle for 60s by default, so touch the session while parked
+KEEPALIVE_INTERVAL = 20
+
+
+def _ntp_timestamp(data, offset):
+    seconds, fraction = struct.unpack("!II", data[offset:offset + 8])
+    return seconds - NTP_EPOCH_DELTA + fraction / 2 ** 32
+
+
+def measure_clock_offset(server=NTP_SERVER, samples=4, timeout=2):
+    """Return how many seconds the local clock is behind the time server (SNTP, best of a few samples)"""
+    best = None
+    for _ in range(samples):
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(timeout)
+                sent = time.time()
+                sock.sendto(b"\x1b" + 47 * b"\0", (server, 123))
+                data, _ = sock.recvfrom(48)
+                received = time.time()
+        except OSError as e:
+            logger.warning(f"Time server {server} did not answer: {str(e)}")
+            continue
+
+        server_received = _ntp_timestamp(data, 32)
+        server_sent = _ntp_timestamp(data, 40)
+        delay = (received - sent) - (server_sent - server_received)
+        offset = ((server_received - sent) + (server_sent - received)) / 2
+        # The sample with the shortest round trip has the least uncertainty
+        if best is None or delay < best[1]:
+            best = (offset, delay)
+
+    if best is None:
+        logger.warning("Could not measure clock skew, trusting the local clock")
+        return 0.0
+    logger.info(f"Local clock is {best[0] * 1000:+.1f} ms off {server} (round trip {best[1] * 1000:.1f} ms)")
+    return best[0]
+
+
+def wait_until(target, clock_offset=0.0, keepalive=None, keepalive_interval=KEEPALIVE_INTERVAL):
+    """Block until the skew-corrected clock reaches target, calling keepalive while parked"""
+    target_ts = target.timestamp()
+    last_keepalive = time.monotonic()
+
+    while True:
+        remaining = target_ts - (time.time() + clock_offset)
+        if remaining <= SPIN_WINDOW:
+            break
+        if keepalive is not None and time.monotonic() - last_keepalive >= keepalive_interval:
+            keepalive()
+            last_keepalive = time.monotonic()
+        time.sleep(min(remaining - SPIN_WINDOW, 1.0))
+
+    while time.time() + clock_offset < target_ts:
+        pass
+
+
+def fire_at(target, action, clock_offset=0.0, lead=0.0, keepalive=None):
+    """Run action at target (minus lead) and log how far from the target it actually fired"""
+    logger.info(f"Parked until {target.isoformat()} (lead {lead * 1000:.0f} ms)")
+    wait_until(datetime.fromtimestamp(target.timestamp() - lead), clock_offset, keepalive)
+
+    fired = time.time() + clock_offset
+    result = action()
+    done = time.time() + clock_offset
+
+    target_ts = target.timestamp()
+    logger.info(
+        f"Fired {(fired - target_ts) * 1000:+.1f} ms from target, "
+        f"click returned {(done - target_ts) * 1000:+.1f} ms from target"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    from demo import main
+
+    parser = argparse.ArgumentParser(description="Stage the booking early and tap at the class release time")
+    parser.add_argument("--at", required=True, help="Release time, e.g. 2026-10-18T07:00:00")
+    parser.add_argument("--day", default="Sat")
+    parser.add_argument("--skip", type=int, default=0, help="Categories to scroll past")
+    parser.add_argument("--slot", type=int, default=3)
+    parser.add_argument("--class-name", help="Find the slot by class name instead of --skip/--slot")
+    parser.add_argument("--start-time", help="Start time of the class, e.g. 07:00")
+    parser.add_argument("--lead-ms", type=float, default=0, help="Send the tap this early to cover RPC latency")
+    parser.add_argument("--ntp-server", default=NTP_SERVER)
+    parser.add_argument("--api", action="store_true", help="Book over the Glofox API, using the app only if that fails")
+    args = parser.parse_args()
+
+    booked = main(
+        day_of_week=args.day,
+        categories_to_skip=args.skip,
+        slot_number=args.slot,
+        class_name=args.class_name,
+        start_time=args.start_time,
+        release_at=datetime.fromisoformat(args.at),
+        release_lead=args.lead_ms / 1000,
+        clock_offset=measure_clock_offset(args.ntp_server),
+        use_api=args.api,
+    )
+    sys.exit(0 if booked else 1)
@@ -0,0 +1,229 @@
+import argparse
+import atexit
+import functools
+import glob
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SPAN_DIR = "logs"
+_run_id = uuid.uuid4().hex[:8]
+_local = threading.local()
+# Spans go through a queue to one writer thread, so no Appium call waits on the disk
+_records = queue.SimpleQueue()
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+FLUSH_TIMEOUT = 5
+
+
+def span_file():
+    return os.path.join(SPAN_DIR, f"spans_{datetime.now().strftime('%Y%m%d')}.jsonl")
+
+
+def new_run():
+    """Start a new run id so spans from separate bookings can be told apart"""
+    global _run_id
+    _run_id = uuid.uuid4().hex[:8]
+    return _run_id
+
+
+def current_run():
+    return _run_id
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def _drain():
+    """Writer thread: append queued spans to the day's file, keeping it open until the day or SPAN_DIR changes"""
+    path, handle = None, None
+    while True:
+        batch = [_records.get()]
+        while True:
+            try:
+                batch.append(_records.get_nowait())
+            except queue.Empty:
+                break
+        lines = [json.dumps(item) + "\n" for item in batch if isinstance(item, dict)]
+        try:
+            if lines:
+                if span_file() != path:
+                    if handle is not None:
+                        handle.close()
+                    path = span_file()
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    handle = open(path, "a")
+                # One write per batch keeps lines whole when several processes append to the same file
+                handle.write("".join(lines))
+                handle.flush()
+        except OSError as e:
+            logger.error(f"Error writing span: {str(e)}")
+            handle = path = None
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+
+def _ensure_writer():
+    global _records, _writer, _writer_pid
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            return
+        if _writer is not None:
+            # A forked child inherits the queue but not the thread that empties it
+            _records = queue.SimpleQueue()
+        else:
+            atexit.register(flush_spans)
+        _writer_pid = os.getpid()
+        _writer = threading.Thread(target=_drain, name="span-writer", daemon=True)
+        _writer.start()
+
+
+def _write(record):
+    if _writer_pid != os.getpid():
+        _ensure_writer()
+    _records.put(record)
+
+
+def flush_spans(timeout=FLUSH_TIMEOUT):
+    """Wait until every span recorded so far is in the file"""
+    if _writer is None or _writer_pid != os.getpid():
+        return True
+    done = threading.Event()
+    _records.put(done)
+    return done.wait(timeout)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block and append it as one JSON line to the day's span file"""
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    started = time.time()
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        record = {"run": _run_id, "span": name, "parent": parent, "start": round(started, 3),
+                  "duration": round(duration, 4), "ok": ok}
+        record.update(attributes)
+        _write(record)
+
+
+def traced(name):
+    """Decorator that wraps each call in a span"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_driver(driver):
+    """Record every WebDriver command sent to Appium as an rpc span under the current step"""
+    execute = driver.execute
+
+    @functools.wraps(execute)
+    def traced_execute(driver_command, params=None):
+        with span(f"rpc:{driver_command}"):
+            return execute(driver_command, params)
+
+    driver.execute = traced_execute
+    return driver
+
+
+def load_spans(paths):
+    flush_spans()
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        spans.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping bad span line in {path}")
+    return spans
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def report(spans, include_rpc=True, last=None):
+    """Print p50/p95/max per step across runs, flagging steps where the latest run beat the earlier p95"""
+    runs = []
+    for record in spans:
+        if record["run"] not in runs:
+            runs.append(record["run"])
+    if last:
+        runs = runs[-last:]
+    keep = set(runs)
+
+    durations = defaultdict(list)
+    previous = defaultdict(list)
+    latest = defaultdict(float)
+    for record in spans:
+        if record["run"] not in keep:
+            continue
+        if not include_rpc and record["span"].startswith("rpc:"):
+            continue
+        durations[record["span"]].append(record["duration"])
+        if record["run"] == runs[-1]:
+            latest[record["span"]] = max(latest[record["span"]], record["duration"])
+        else:
+            previous[record["span"]].append(record["duration"])
+
+    print(f"{len(runs)} runs, {sum(len(v) for v in durations.values())} spans")
+    print(f"{'step':<40} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8} {'latest':>8}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        p95 = percentile(values, 0.95)
+        earlier = previous.get(name)
+        flag = "  slow" if earlier and latest.get(name, 0) > percentile(earlier, 0.95) else ""
+        print(f"{name:<40} {len(values):>6} {percentile(values, 0.5):>8.3f} {p95:>8.3f} "
+              f"{max(values):>8.3f} {latest.get(name, 0):>8.3f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency report across booking runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Aggregate p50/p95/max per step")
+    report_parser.add_argument("files", nargs="*", help="Span files (default: logs/spans_*.jsonl)")
+    report_parser.add_argument("--last", type=int, help="Only the last N runs")
+    report_parser.add_argument("--no-rpc", action="store_true", help="Leave out individual Appium calls")
+    args = parser.parse_args()
+
+    paths = args.files or sorted(glob.glob(os.path.join(SPAN_DIR, "spans_*.jsonl")))
+    report(load_spans(paths), include_rpc=not args.no_rpc, last=args.last)
@@ -0,0 +1,81 @@
+import time
+import logging
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+
+logger = logging.getLogger(__name__)
+
+# Polling starts fast and backs off while the screen is still changing
+POLL_INITIAL = 0.05
+POLL_MAX = 1.0
+POLL_FACTOR = 1.5
+
+IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+
+class StepWaiter:
+    """Wait for the next UI condition instead of sleeping a fixed time"""
+
+    def __init__(self, driver, default_timeout=10, initial_interval=POLL_INITIAL,
+                 max_interval=POLL_MAX, factor=POLL_FACTOR):
+        self.driver = driver
+        self.default_timeout = default_timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.timings = []  # (step, seconds waited, polls, succeeded)
+
+    def until(self, condition, step, timeout=None):
+        """Poll condition(driver) until it returns something truthy or the step deadline passes"""
+        timeout = self.default_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        interval = self.initial_interval
+        polls = 0
+        last_error = None
+
+        while True:
+            polls += 1
+            try:
+                value = condition(self.driver)
+                if value:
+                    self._record(step, start, polls, True)
+                    return value
+            except IGNORED_EXCEPTIONS as e:
+                last_error = e
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._record(step, start, polls, False)
+                message = f"Timed out after {timeout}s waiting for {step}"
+                if last_error is not None:
+                    message += f" (last error: {type(last_error).__name__})"
+                raise TimeoutException(message)
+
+            time.sleep(min(interval, remaining))
+            interval = min(interval * self.factor, self.max_interval)
+
+    def _record(self, step, start, polls, succeeded):
+        elapsed = time.monotonic() - start
+        self.timings.append((step, elapsed, polls, succeeded))
+        if succeeded:
+            logger.info(f"Waited {elapsed:.2f}s for {step} ({polls} polls)")
+        else:
+            logger.warning(f"Gave up on {step} after {elapsed:.2f}s ({polls} polls)")
+
+    def total_wait(self):
+        """Total seconds spent waiting across all recorded steps"""
+        return sum(elapsed for _, elapsed, _, _ in self.timings)
+
+    def log_summary(self):
+        """Log how long each wait took, slowest first"""
+        if not self.timings:
+            return
+        logger.info(f"Wait summary: {len(self.timings)} waits, {self.total_wait():.2f}s total")
+        for step, elapsed, polls, succeeded in sorted(self.timings, key=lambda t: t[1], reverse=True):
+            status = "ok" if succeeded else "timeout"
+            logger.info(f"  {step}: {elapsed:.2f}s, {polls} polls, {status}")
@@ -0,0 +1,152 @@
+import logging
+import time
+
+from booking_flow import DAY_SELECTED, BookingFlow
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# A freed spot is noticed within one poll plus one page_source call
+POLL_INTERVAL = 0.5
+# The app does not always update the list by itself, so reload the day now and then
+REFRESH_INTERVAL = 60
+# How often a long watch logs that it is still going
+HEARTBEAT_INTERVAL = 600
+# Polls in a row without the slot on screen before it is looked for again
+MAX_MISSING_POLLS = 4
+
+
+class AvailabilityWatcher:
+    """Keep the session on the day's schedule and book the class as soon as a spot frees up"""
+
+    def __init__(self, booker, poll_interval=POLL_INTERVAL, refresh_interval=REFRESH_INTERVAL, compact=True):
+        self.booker = booker
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.compact = compact
+        self.polls = 0
+        self.changes = 0
+        self.last_hash = None
+        self.slot = None
+
+    def _set_compact(self, enabled):
+        """Ask UiAutomator2 to leave layout-only views out of page_source, which makes each poll smaller"""
+        if not self.compact:
+            return
+        try:
+            self.booker.driver.update_settings({"ignoreUnimportantViews": enabled})
+        except Exception as e:
+            logger.warning(f"Could not change ignoreUnimportantViews: {str(e)}")
+            self.compact = False
+
+    def go_to_slot(self):
+        """Get onto the day's schedule with the slot in view, logging in if needed"""
+        booker = self.booker
+        BookingFlow(booker).run(until=DAY_SELECTED)
+        booker.slot_finder.find(booker.day_of_week, booker.class_name, booker.start_time)
+        self.last_hash = None
+
+    def refresh(self):
+        """Reload the day's schedule by tapping its tab again, then bring the slot back into view"""
+        booker = self.booker
+        booker.select_day()
+        booker.slot_finder.find(booker.day_of_week, booker.class_name, booker.start_time)
+        self.last_hash = None
+
+    def poll(self):
+        """Fetch the hierarchy once; return True if the slot has a free spot, None if it is not on screen"""
+        booker = self.booker
+        snapshot = booker.snapshots.snapshot(refresh=True)
+        self.polls += 1
+        if snapshot.xml_hash == self.last_hash:
+            # Nothing on screen changed since the last poll, so the answer has not either
+            return self.slot and self.slot[1]
+        self.last_hash = snapshot.xml_hash
+        self.changes += 1
+        self.slot = booker.slot_finder.availability(snapshot, booker.class_name, booker.start_time)
+        return self.slot and self.slot[1]
+
+    def book(self):
+        """Open the freed slot and book it; return whether the booking went through"""
+        booker = self.booker
+        self._set_compact(False)
+        try:
+            booker.snapshots.tap(self.slot[0])
+            booker.complete_booking()
+            return True
+        except Exception as e:
+            # Someone else may have taken the spot first; go back to watching
+            logger.error(f"Booking the freed spot failed: {str(e)}")
+            booker.screenshots.persist("watch-failure")
+            booker.return_to_schedule()
+            self.go_to_slot()
+            return False
+        finally:
+            self._set_compact(True)
+
+    def watch(self, max_duration=None):
+        """Poll until a spot frees up and book it; return False if max_duration seconds pass first"""
+        booker = self.booker
+        if not booker.class_name or not booker.start_time:
+            raise ValueError("Watching needs the class_name and start_time of the class")
+
+        start = time.monotonic()
+        with span("watch", day=booker.day_of_week, class_name=booker.class_name):
+            self.go_to_slot()
+            self._set_compact(True)
+            logger.info(f"Watching {booker.class_name} at {booker.start_time} on {booker.day_of_week}")
+            last_refresh = last_heartbeat = time.monotonic()
+            missing = 0
+            while max_duration is None or time.monotonic() - start < max_duration:
+                poll_start = time.monotonic()
+                try:
+                    available = self.poll()
+                except Exception as e:
+                    # Over hours the session can drop; the flow recovers it and puts the slot back in view
+                    logger.warning(f"Poll failed, getting back to the schedule: {str(e)}")
+                    self.go_to_slot()
+                    continue
+                if available:
+                    logger.info(f"Spot opened in {booker.class_name} at {booker.start_time}, booking it")
+                    if self.book():
+                        logger.info(f"Booked after watching for {time.monotonic() - start:.0f}s "
+                                    f"({self.polls} polls)")
+                        return True
+                    last_refresh = time.monotonic()
+                elif available is None:
+                    missing += 1
+                    if missing >= MAX_MISSING_POLLS:
+                        logger.warning("Slot is no longer on screen, finding it again")
+                        self.go_to_slot()
+                        missing = 0
+                else:
+                    missing = 0
+
+                now = time.monotonic()
+                if self.refresh_interval and now - last_refresh >= self.refresh_interval:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        logger.warning(f"Refreshing the schedule failed: {str(e)}")
+                        self.go_to_slot()
+                    last_refresh = now
+                if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    logger.info(f"Still watching after {now - start:.0f}s: {self.polls} polls, "
+                                f"{self.changes} screen changes")
+                    last_heartbeat = now
+                time.sleep(max(0.0, self.poll_interval - (time.monotonic() - poll_start)))
+
+        logger.info(f"No spot opened in {max_duration:.0f}s of watching")
+        return False
+
+
+def watch_availability(booker, max_duration=None, **options):
+    """Watch for a spot on the booker's job and book it, ending the session afterwards"""
+    try:
+        return AvailabilityWatcher(booker, **options).watch(max_duration)
+    except Exception as e:
+        logger.error(f"Watching failed: {str(e)}")
+        booker.screenshots.persist("failure")
+        return False
+    finally:
+        booker.end_session()